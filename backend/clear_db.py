@@ -20,10 +20,12 @@ def clear_data():
             # Truncate tables with CASCADE to handle foreign keys if any
             # We preserve 'daily_plans' and 'custom_exercises' typically, but here we focus on session history.
             
-            conn.execute(text("TRUNCATE TABLE session_metrics, exercise_sessions, sessions RESTART IDENTITY CASCADE"))
+            conn.execute(text("TRUNCATE TABLE session_metrics, session_telemetry, telemetry_summaries, exercise_sessions, sessions, daily_activity RESTART IDENTITY CASCADE"))
+            # Ids restart: invalidate every client's cached history (ETags) in the same transaction
+            conn.execute(text("UPDATE data_versions SET version = version + 1 WHERE scope = 'sessions'"))
             conn.commit()
             
-            logger.info("✅ Successfully cleared: session_metrics, exercise_sessions, sessions")
+            logger.info("✅ Successfully cleared: session_metrics, session_telemetry, telemetry_summaries, exercise_sessions, sessions, daily_activity")
             
         except Exception as e:
             logger.error(f"Cleanup Failed: {e}")
@@ -7,3 +7,93 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not found in environment variables.")
+
+# Speculative report drafting (services/report_drafter.py)
+# A draft is refreshed every N ingested chunks, or after M idle seconds with unseen chunks.
+REPORT_DRAFT_EVERY_N_CHUNKS = int(os.getenv("REPORT_DRAFT_EVERY_N_CHUNKS", "3"))
+REPORT_DRAFT_IDLE_SECONDS = float(os.getenv("REPORT_DRAFT_IDLE_SECONDS", "15"))
+# Cost ceiling: max speculative drafts per session (0 disables drafting)
+REPORT_DRAFT_MAX_PER_SESSION = int(os.getenv("REPORT_DRAFT_MAX_PER_SESSION", "5"))
+
+# Rolling context compaction for the drafter chat
+# Every K ingested chunks, the chat history is replaced by a state summary + the last few chunks.
+REPORT_COMPACT_EVERY_N_CHUNKS = int(os.getenv("REPORT_COMPACT_EVERY_N_CHUNKS", "12"))
+REPORT_COMPACT_KEEP_RECENT = int(os.getenv("REPORT_COMPACT_KEEP_RECENT", "3"))
+# Total tokens (ingest + compaction + drafts) one session may spend before ingestion pauses (0 = unlimited)
+REPORT_SESSION_TOKEN_BUDGET = int(os.getenv("REPORT_SESSION_TOKEN_BUDGET", "400000"))
+
+# Global Gemini REST scheduler (services/gemini_scheduler.py)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Token bucket: sustained requests/second and burst size (rate 0 = no rate limit)
+GEMINI_RATE_PER_SEC = float(os.getenv("GEMINI_RATE_PER_SEC", "4"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "8"))
+
+# Model usage accounting (services/usage_tracker.py)
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "50"))
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "10"))
+
+# Daily plan precomputation (services/plan_scheduler.py)
+# Tomorrow's plan is generated once no session has completed for QUIET_MINUTES,
+# and again at the off-peak time (HH:MM, server local time; empty disables it).
+PLAN_PRECOMPUTE_ENABLED = os.getenv("PLAN_PRECOMPUTE_ENABLED", "true").lower() == "true"
+PLAN_PRECOMPUTE_QUIET_MINUTES = float(os.getenv("PLAN_PRECOMPUTE_QUIET_MINUTES", "45"))
+PLAN_PRECOMPUTE_AT = os.getenv("PLAN_PRECOMPUTE_AT", "23:00")
+PLAN_PRECOMPUTE_JITTER_SECONDS = float(os.getenv("PLAN_PRECOMPUTE_JITTER_SECONDS", "300"))
+PLAN_PRECOMPUTE_CONCURRENCY = int(os.getenv("PLAN_PRECOMPUTE_CONCURRENCY", "2"))
+
+# Shared GenAI client (services/genai_client.py)
+GENAI_MAX_CONNECTIONS = int(os.getenv("GENAI_MAX_CONNECTIONS", "32"))
+GENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GENAI_MAX_KEEPALIVE_CONNECTIONS", "16"))
+GENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("GENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+GENAI_HTTP_TIMEOUT_SECONDS = float(os.getenv("GENAI_HTTP_TIMEOUT_SECONDS", "120"))
+
+# Exercise schema generation cache (LRU bound, persisted in the DB)
+EXERCISE_CACHE_MAX_ENTRIES = int(os.getenv("EXERCISE_CACHE_MAX_ENTRIES", "500"))
+EXERCISE_CACHE_TOUCH_FLUSH_SECONDS = float(os.getenv("EXERCISE_CACHE_TOUCH_FLUSH_SECONDS", "30")) # hits/last_used batching
+EXERCISE_TEMPLATES_ENABLED = os.getenv("EXERCISE_TEMPLATES_ENABLED", "true").lower() == "true" # Local templates before the LLM
+
+# Exercise catalog cache (drills, emotions, custom exercises, planner menu), per worker
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "2000")) # (patient, view) lists kept
+
+# Batch exercise generation (/exercises/generate/batch)
+EXERCISE_BATCH_CONCURRENCY = int(os.getenv("EXERCISE_BATCH_CONCURRENCY", "4"))
+EXERCISE_BATCH_MAX_ITEMS = int(os.getenv("EXERCISE_BATCH_MAX_ITEMS", "20"))
+
+# Database engines (database.py)
+# Every worker process holds two pools: async (request handlers) and sync (worker threads, scripts).
+# Unless DB_POOL_SIZE / DB_MAX_OVERFLOW are set, each worker gets DB_MAX_CONNECTIONS / WEB_CONCURRENCY
+# connections, 3/4 of them for the async pool; half of each share is kept open, half is overflow.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1"))) # uvicorn --workers reads the same variable
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "80")) # Keep below the server's max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) # 0 = derive from DB_MAX_CONNECTIONS
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "-1")) # -1 = derive from DB_MAX_CONNECTIONS
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true" # Server databases only
+
+# SQLite fallback (single-node clinic deployments): WAL lets readers and one writer run concurrently
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL") # WAL + NORMAL: never corrupts, a power cut may lose the last commits
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "32"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+# Session telemetry storage (services/telemetry_store.py): each /session/chunk is kept as one
+# compressed segment of float32 columns (t, val, vel, x/y per landmark)
+TELEMETRY_STORE_ENABLED = os.getenv("TELEMETRY_STORE_ENABLED", "true").lower() == "true"
+TELEMETRY_COMPRESSION_LEVEL = int(os.getenv("TELEMETRY_COMPRESSION_LEVEL", "6")) # zlib 1 (fast) - 9 (small)
+
+# Telemetry retention tiers (services/telemetry_retention.py), by age of the stored segments:
+#   raw          full-fidelity segments, for RAW_RETENTION_DAYS
+#   downsampled  one DOWNSAMPLE_HZ segment per session + whole-session and per-rep summaries,
+#                until DOWNSAMPLED_RETENTION_DAYS
+#   aggregate    the summaries only (plus daily_activity), kept indefinitely
+# 0 keeps that tier forever.
+TELEMETRY_RAW_RETENTION_DAYS = int(os.getenv("TELEMETRY_RAW_RETENTION_DAYS", "14"))
+TELEMETRY_DOWNSAMPLED_RETENTION_DAYS = int(os.getenv("TELEMETRY_DOWNSAMPLED_RETENTION_DAYS", "180"))
+TELEMETRY_DOWNSAMPLE_HZ = float(os.getenv("TELEMETRY_DOWNSAMPLE_HZ", "1"))
+# Background compaction: every INTERVAL minutes (0 disables), at most MAX_BATCHES batches of
+# BATCH_SIZE sessions (or rows), each in short transactions, with PAUSE between batches
+TELEMETRY_COMPACTION_INTERVAL_MINUTES = float(os.getenv("TELEMETRY_COMPACTION_INTERVAL_MINUTES", "60"))
+TELEMETRY_COMPACTION_BATCH_SIZE = int(os.getenv("TELEMETRY_COMPACTION_BATCH_SIZE", "50"))
+TELEMETRY_COMPACTION_MAX_BATCHES = int(os.getenv("TELEMETRY_COMPACTION_MAX_BATCHES", "100"))
+TELEMETRY_COMPACTION_PAUSE_SECONDS = float(os.getenv("TELEMETRY_COMPACTION_PAUSE_SECONDS", "0.5"))
@@ -1,40 +1,140 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime, Date
+from fastapi import Header
+from sqlalchemy import create_engine, event, Column, Integer, Float, String, JSON, DateTime, Date, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
 import datetime
+try:
+    from config import (
+        WEB_CONCURRENCY, DB_MAX_CONNECTIONS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS,
+        DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, SQLITE_BUSY_TIMEOUT_MS, SQLITE_SYNCHRONOUS,
+        SQLITE_CACHE_SIZE_MB, SQLITE_MMAP_SIZE_MB,
+    )
+    from utils.db_pool import monitored_pool, sync_pool_monitor, async_pool_monitor
+except ImportError:
+    from backend.config import (
+        WEB_CONCURRENCY, DB_MAX_CONNECTIONS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS,
+        DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, SQLITE_BUSY_TIMEOUT_MS, SQLITE_SYNCHRONOUS,
+        SQLITE_CACHE_SIZE_MB, SQLITE_MMAP_SIZE_MB,
+    )
+    from backend.utils.db_pool import monitored_pool, sync_pool_monitor, async_pool_monitor
 
 # Get DB URL from Environment (set in docker-compose)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./local_history.db") # Fallback to SQLite for non-docker local dev
 
-engine = create_engine(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+def _pool_options(share: float, pool_class, monitor) -> dict:
+    """Engine pool settings: `share` of this worker's slice of DB_MAX_CONNECTIONS (see config.py)."""
+    if IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/").endswith(":")):
+        return {} # In-memory SQLite lives in a single connection: keep SQLAlchemy's default pool
+    budget = max(2, int(DB_MAX_CONNECTIONS / WEB_CONCURRENCY * share))
+    pool_size = DB_POOL_SIZE or max(1, budget // 2)
+    return {
+        "poolclass": monitored_pool(pool_class, monitor),
+        "pool_size": pool_size,
+        "max_overflow": DB_MAX_OVERFLOW if DB_MAX_OVERFLOW >= 0 else max(0, budget - pool_size),
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        # A file-backed SQLite connection can't go stale; server connections can (restarts, idle kills)
+        "pool_pre_ping": DB_POOL_PRE_PING and not IS_SQLITE,
+    }
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL", # Readers don't block the writer (or each other)
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS, # Wait for the write lock instead of failing with "database is locked"
+    "cache_size": -SQLITE_CACHE_SIZE_MB * 1024, # Negative = KiB
+    "mmap_size": SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Sync engine: migrations, scripts and worker-thread jobs (usage flush, schema cache)
+engine = create_engine(DATABASE_URL, **_pool_options(0.25, QueuePool, sync_pool_monitor))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_url(url: str) -> str:
+    """Same database through an asyncio driver: aiosqlite (local) / asyncpg (Postgres)."""
+    for prefix, driver in (("sqlite", "sqlite+aiosqlite"), ("postgresql+psycopg2", "postgresql+asyncpg"),
+                           ("postgresql", "postgresql+asyncpg"), ("postgres", "postgresql+asyncpg")):
+        if url.startswith(prefix + ":"):
+            return driver + url[len(prefix):]
+    return url
+
+# Async engine: request handlers, so DB round trips never block the event loop
+async_engine = create_async_engine(_async_url(DATABASE_URL), **_pool_options(0.75, AsyncAdaptedQueuePool, async_pool_monitor))
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
+# Tenant key. Rows written before partitioning (and requests without X-Patient-Id) use this.
+DEFAULT_PATIENT_ID = "default"
+
 class SessionReport(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_patient_timestamp_id", "patient_id", "timestamp", "id"), # Keyset pagination order
+        Index("ix_sessions_timestamp", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     session_id = Column(String, index=True) # "demo_session_1"
     transcript = Column(String)
     clinical_notes = Column(JSON) # List of strings
     report_json = Column(JSON) # The full Gemini 3 analysis
+    # Summary columns materialized at write time (services/session_summary.py) for list views
+    activity_name = Column(String, nullable=True)
+    duration_seconds = Column(Integer, nullable=True)
+    rep_count = Column(Integer, nullable=True)
+    safety_flag_count = Column(Integer, nullable=True)
+    summary = Column(String, nullable=True)
 
 class DailyPlan(Base):
     __tablename__ = "daily_plans"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "date", name="uq_daily_plans_patient_date"), # One plan per patient per day
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, unique=True, index=True) # One plan per day
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
+    date = Column(Date, index=True)
     plan_json = Column(JSON) # The generated plan (Routine, Thoughts)
     completion_status = Column(JSON, default={}) # {"0": true, "1": false}
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class PlanPrecomputeClaim(Base):
+    """Held by the worker precomputing a patient's plan for a day (services/plan_scheduler.py)."""
+    __tablename__ = "plan_precompute_claims"
+
+    patient_id = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    claimed_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
 class ExerciseSession(Base):
     __tablename__ = "exercise_sessions"
+    __table_args__ = (
+        Index("ix_exercise_sessions_patient_start", "patient_id", "start_time"),
+        Index("ix_exercise_sessions_patient_domain_start", "patient_id", "domain", "start_time"),
+        Index("ix_exercise_sessions_start_patient", "start_time", "patient_id"),
+        Index("ix_exercise_sessions_domain_start", "domain", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
     session_uuid = Column(String, unique=True, index=True)
     exercise_id = Column(String, index=True)
     exercise_name = Column(String, default="Unknown Exercise") # [FIX] Add name for history
@@ -44,6 +144,37 @@ class ExerciseSession(Base):
     status = Column(String, default="started")
     metrics = Column(JSON, default={})
 
+class DailyActivity(Base):
+    """Per patient/day/exercise rollup of completed sessions (services/activity_rollup.py)."""
+    __tablename__ = "daily_activity"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "date", "domain", "exercise_id", name="uq_daily_activity_key"), # Upsert key + trend range scans
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
+    date = Column(Date, nullable=False) # Session start date (UTC)
+    domain = Column(String, nullable=False)
+    exercise_id = Column(String, nullable=False)
+    exercise_name = Column(String, nullable=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    reps = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Integer, nullable=False, default=0)
+    # Range of motion (degrees): sessions that reported one, their sum (for the mean) and the best
+    rom_sessions = Column(Integer, nullable=False, default=0)
+    rom_total = Column(Float, nullable=False, default=0)
+    rom_best = Column(Float, nullable=True)
+    safety_events = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class DataVersion(Base):
+    """Change counter per (scope, patient): bumped with every write, read for ETags (services/data_versions.py)."""
+    __tablename__ = "data_versions"
+
+    scope = Column(String, primary_key=True) # catalog, sessions, plan
+    patient_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 class SessionMetrics(Base):
     __tablename__ = "session_metrics"
     
@@ -53,18 +184,92 @@ class SessionMetrics(Base):
     metric_type = Column(String)
     value = Column(JSON)
 
+class TelemetrySegment(Base):
+    """One /session/chunk of telemetry as compressed float32 columns (services/telemetry_store.py)."""
+    __tablename__ = "session_telemetry"
+    __table_args__ = (
+        Index("ix_session_telemetry_session_start", "session_uuid", "t_start"),
+        Index("ix_session_telemetry_tier_created", "tier", "created_at"), # Retention sweeps
+    )
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
+    session_uuid = Column(String, nullable=False)
+    tier = Column(String, nullable=False, default="raw") # raw, downsampled (services/telemetry_retention.py)
+    t_start = Column(Float, nullable=False) # Seconds since session start
+    t_end = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False)
+    format = Column(Integer, nullable=False, default=1) # Codec version of `data`
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class TelemetrySummary(Base):
+    """Whole-session and per-rep figures from the raw telemetry, kept after its segments are compacted."""
+    __tablename__ = "telemetry_summaries"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "session_uuid", name="uq_telemetry_summaries_patient_session"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
+    session_uuid = Column(String, nullable=False)
+    summary = Column(JSON, nullable=False) # summarize_telemetry() of the raw samples
+    reps = Column(JSON, nullable=False, default=list) # rep_summaries()
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class CustomExercise(Base):
     __tablename__ = "custom_exercises"
+    __table_args__ = (
+        Index("ix_custom_exercises_patient_created", "patient_id", "created_at"),
+        Index("ix_custom_exercises_patient_module_domain_created", "patient_id", "module", "domain", "created_at"),
+        Index("ix_custom_exercises_patient_domain_created", "patient_id", "domain", "created_at"),
+    )
 
     id = Column(String, primary_key=True, index=True)
+    patient_id = Column(String, nullable=False, default=DEFAULT_PATIENT_ID)
     name = Column(String)
     domain = Column(String) # BODY, FACE, HAND (Target Area)
     module = Column(String, default="RECONNECT") # RECONNECT, HARMONY, ASL (App Module)
     config_json = Column(JSON)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class ModelUsage(Base):
+    __tablename__ = "model_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    session_id = Column(String, index=True, nullable=True) # None for session-less calls (plan, generator)
+    mode = Column(String, index=True) # RECONNECT, HARMONY, ASL, BODY, FACE, PLAN, GENERATOR
+    call_type = Column(String) # live, ingest, compaction, draft, fold_in, finalize, planner, generator, analyze
+    model = Column(String)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    latency_ms = Column(Integer, nullable=True) # None for live sessions (no single request latency)
+
+class ExerciseSchemaCache(Base):
+    __tablename__ = "exercise_schema_cache"
+
+    key = Column(String, primary_key=True) # sha256(model | prompt version | normalized description)
+    description = Column(String) # Normalized description (for inspection)
+    model = Column(String)
+    prompt_version = Column(String)
+    schema_json = Column(JSON)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow, index=True) # LRU eviction order
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # Create missing tables, then bring existing databases up to the current schema
+    # (versioned, idempotent), under one lock so workers starting together don't race
+    try:
+        from migrate_db import run_migrations
+    except ImportError:
+        from backend.migrate_db import run_migrations
+    run_migrations(engine, metadata=Base.metadata)
+
+def get_patient_id(x_patient_id: str = Header(None)) -> str:
+    """Tenant of the current request (X-Patient-Id header)."""
+    return x_patient_id or DEFAULT_PATIENT_ID
 
 def get_db():
     db = SessionLocal()
@@ -72,3 +277,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,7 +1,9 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from database import init_db
+from database import init_db, engine, async_engine
+from services.session_search import ensure_search_index
 from utils.logging import logger 
 import os
 
@@ -10,9 +12,35 @@ load_dotenv(override=True)
 
 # Initialize Database
 init_db()
+ensure_search_index(engine) # Full-text index for /session/logs?search=
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: one pooled GenAI client for every router/service
+    from config import PLAN_PRECOMPUTE_ENABLED, TELEMETRY_COMPACTION_INTERVAL_MINUTES
+    from services.genai_client import genai_provider
+    from services.plan_scheduler import plan_precomputer
+    from services.usage_tracker import usage_tracker
+    from services.schema_cache import schema_cache
+    from services.telemetry_retention import telemetry_compactor
+    genai_provider.start()
+    # Precompute tomorrow's plan in the background (needs the planner / API key)
+    if PLAN_PRECOMPUTE_ENABLED and plan.planner:
+        plan_precomputer.start(plan.planner)
+    # Move aging telemetry down the retention tiers (raw -> downsampled -> summaries only)
+    if TELEMETRY_COMPACTION_INTERVAL_MINUTES > 0:
+        telemetry_compactor.start()
+    yield
+    # Shutdown: stop background work, write buffered usage rows / cache hits, then release connections
+    plan_precomputer.stop()
+    telemetry_compactor.stop()
+    await usage_tracker.flush()
+    await schema_cache.flush()
+    await genai_provider.close()
+    await async_engine.dispose()
 
 # Create App
-app = FastAPI(title="StorySign Gemini API", version="2.0")
+app = FastAPI(title="StorySign Gemini API", version="2.0", lifespan=lifespan)
 
 # CORS Setup
 app.add_middleware(
@@ -25,7 +53,7 @@ app.add_middleware(
 
 # --- IMPORT ROUTERS ---
 # --- IMPORT ROUTERS ---
-from routers import session, history, tools, websocket, exercises, plan, harmony, reconnect
+from routers import session, history, tools, websocket, exercises, plan, harmony, reconnect, metrics
 
 # --- INCLUDE ROUTERS ---
 app.include_router(session.router)
@@ -37,6 +65,7 @@ app.include_router(websocket.router)
 app.include_router(plan.router)
 app.include_router(harmony.router)
 app.include_router(reconnect.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def health_check():
@@ -1,18 +1,44 @@
-from fastapi import APIRouter, Request, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal, CustomExercise, get_db
+from fastapi import APIRouter, Request, Response, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, CustomExercise, get_async_db, get_patient_id
+from services.data_versions import data_version
+from services.catalog_cache import cached_catalog, catalog_cache
+from utils.etag import conditional_get
+from config import EXERCISE_BATCH_CONCURRENCY, EXERCISE_BATCH_MAX_ITEMS
+from typing import List
+import asyncio
+import json
 import uuid
 import logging
 from pydantic import BaseModel
-from services.exercise_generator import generate_exercise_schema
+from services.exercise_generator import generate_exercise_schema, validate_schema
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/exercises", tags=["exercises"])
 
 
+async def _save_custom_exercise(db: AsyncSession, patient_id: str, name: str, domain: str, config: dict, module: str = None) -> CustomExercise:
+    new_exercise = CustomExercise(
+        id=str(uuid.uuid4()),
+        patient_id=patient_id,
+        name=name,
+        domain=domain,
+        config_json=config
+    )
+    if module:
+        new_exercise.module = module
+
+    db.add(new_exercise)
+    await db.commit()
+    catalog_cache.invalidate(patient_id)
+    await db.refresh(new_exercise)
+    return new_exercise
+
 @router.post("/custom")
-async def create_custom_exercise(request: Request, db: Session = Depends(get_db)):
+async def create_custom_exercise(request: Request, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     try:
         data = await request.json()
         
@@ -20,18 +46,8 @@ async def create_custom_exercise(request: Request, db: Session = Depends(get_db)
         if not data.get("name") or not data.get("config"):
             raise HTTPException(status_code=400, detail="Missing name or config")
 
-        exercise_id = str(uuid.uuid4())
-        
-        new_exercise = CustomExercise(
-            id=exercise_id,
-            name=data["name"],
-            domain=data.get("domain", "BODY"),
-            config_json=data["config"]
-        )
-        
-        db.add(new_exercise)
-        db.commit()
-        db.refresh(new_exercise)
+        new_exercise = await _save_custom_exercise(db, patient_id, data["name"], data.get("domain", "BODY"), data["config"])
+        exercise_id = new_exercise.id
         
         return {"id": exercise_id, "status": "created", "exercise": {
             "id": new_exercise.id,
@@ -62,13 +78,85 @@ async def generate_exercise(request: GenerateRequest):
         logger.error(f"Error generating exercise: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class BatchGenerateRequest(BaseModel):
+    descriptions: List[str]
+    save: bool = False # Persist each generated schema as a CustomExercise
+    module: str = None # RECONNECT, HARMONY, ASL (when saving)
+
+@router.post("/generate/batch")
+async def generate_exercise_batch(request: BatchGenerateRequest, patient_id: str = Depends(get_patient_id)):
+    """
+    Generates many drills concurrently (bounded) and streams NDJSON, one line per item
+    in completion order: {"index", "description", "status": "ok"|"error", "schema"|"error", "id"?}.
+    A failed item never fails the batch; the last line is {"status": "done", "ok", "errors"}.
+    """
+    descriptions = request.descriptions
+    if not descriptions:
+        raise HTTPException(status_code=400, detail="At least one description is required")
+    if len(descriptions) > EXERCISE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {EXERCISE_BATCH_MAX_ITEMS} descriptions per batch")
+
+    semaphore = asyncio.Semaphore(EXERCISE_BATCH_CONCURRENCY)
+
+    async def save(schema: dict) -> str:
+        # The stream outlives the request, so persistence uses its own session
+        async with AsyncSessionLocal() as db:
+            new_exercise = await _save_custom_exercise(
+                db, patient_id, schema.get("name", "Custom Exercise"), schema.get("domain", "BODY"),
+                schema, module=request.module
+            )
+            return new_exercise.id
+
+    async def run_item(index: int, description: str) -> dict:
+        item = {"index": index, "description": description}
+        try:
+            if not description or not description.strip():
+                raise ValueError("Description is required")
+            async with semaphore:
+                schema = await generate_exercise_schema(description)
+            if "error" in schema:
+                raise ValueError(schema["error"])
+            schema = validate_schema(schema)
+            if request.save:
+                item["id"] = await save(schema)
+            item.update(status="ok", schema=schema)
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            item.update(status="error", error=str(e))
+        return item
+
+    async def ndjson_stream():
+        tasks = [asyncio.create_task(run_item(i, d)) for i, d in enumerate(descriptions)]
+        ok = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                ok += item["status"] == "ok"
+                yield json.dumps(item) + "\n"
+            yield json.dumps({"status": "done", "ok": ok, "errors": len(tasks) - ok}) + "\n"
+        finally:
+            # Client went away: don't keep generating for nobody
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/custom")
-async def get_custom_exercises(domain: str = "BODY", db: Session = Depends(get_db)):
-    try:
-        query = db.query(CustomExercise)
+async def get_custom_exercises(request: Request, response: Response, domain: str = "BODY", db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
+    version = await data_version(db, "catalog", patient_id)
+    not_modified = conditional_get(request, response, patient_id, version)
+    if not_modified:
+        return not_modified
+
+    async def load():
+        query = select(CustomExercise).where(CustomExercise.patient_id == patient_id)
         if domain:
-            query = query.filter(CustomExercise.domain == domain)
-        exercises = query.order_by(CustomExercise.created_at.desc()).all()
+            query = query.where(CustomExercise.domain == domain)
+        exercises = (await db.execute(query.order_by(CustomExercise.created_at.desc()))).scalars().all()
         return [{
             "id": ex.id,
             "name": ex.name,
@@ -76,14 +164,20 @@ async def get_custom_exercises(domain: str = "BODY", db: Session = Depends(get_d
             "config": ex.config_json,
             "created_at": ex.created_at.isoformat()
         } for ex in exercises]
+
+    try:
+        return await cached_catalog(db, patient_id, f"custom:{domain or 'ALL'}", load, version)
     except Exception as e:
         logger.error(f"Error fetching exercises: {e}")
+        del response.headers["ETag"] # Failed read: don't let the client pin an empty list
         return []
 
 @router.get("/custom/{exercise_id}")
-async def get_custom_exercise(exercise_id: str, db: Session = Depends(get_db)):
+async def get_custom_exercise(exercise_id: str, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     try:
-        ex = db.query(CustomExercise).filter(CustomExercise.id == exercise_id).first()
+        ex = (await db.execute(select(CustomExercise).where(
+            CustomExercise.patient_id == patient_id, CustomExercise.id == exercise_id
+        ))).scalar_one_or_none()
         if not ex:
             raise HTTPException(status_code=404, detail="Exercise not found")
         
@@ -99,14 +193,17 @@ async def get_custom_exercise(exercise_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/custom/{exercise_id}")
-async def delete_custom_exercise(exercise_id: str, db: Session = Depends(get_db)):
+async def delete_custom_exercise(exercise_id: str, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     try:
-        ex = db.query(CustomExercise).filter(CustomExercise.id == exercise_id).first()
+        ex = (await db.execute(select(CustomExercise).where(
+            CustomExercise.patient_id == patient_id, CustomExercise.id == exercise_id
+        ))).scalar_one_or_none()
         if not ex:
             raise HTTPException(status_code=404, detail="Exercise not found")
         
-        db.delete(ex)
-        db.commit()
+        await db.delete(ex)
+        await db.commit()
+        catalog_cache.invalidate(patient_id)
         return {"status": "deleted", "id": exercise_id}
     except Exception as e:
         logger.error(f"Error deleting exercise: {e}")
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from database import get_db, CustomExercise, ExerciseSession, SessionReport
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_patient_id, CustomExercise, ExerciseSession, SessionReport
+from services.session_summary import summary_columns, summary_fields
+from services.data_versions import data_version
+from services.catalog_cache import cached_catalog, catalog_cache
+from utils.pagination import keyset_page
+from utils.etag import conditional_get
 from pydantic import BaseModel
 import uuid
 import logging
@@ -12,24 +18,30 @@ router = APIRouter(prefix="/harmony", tags=["harmony"])
 
 # --- EMOTIONS ---
 
+STANDARD_EMOTIONS = [
+    {"id": "HAPPY", "name": "Happy", "type": "STANDARD"},
+    {"id": "SAD", "name": "Sad", "type": "STANDARD"},
+    {"id": "ANGRY", "name": "Angry", "type": "STANDARD"},
+    {"id": "SURPRISED", "name": "Surprised", "type": "STANDARD"},
+    {"id": "FEAR", "name": "Fear", "type": "STANDARD"},
+    {"id": "DISGUST", "name": "Disgust", "type": "STANDARD"},
+]
+
 @router.get("/emotions")
-async def get_emotions(db: Session = Depends(get_db)):
+async def get_emotions(request: Request, response: Response, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """
     Returns both standard HARDCODED emotions and CUSTOM user-created emotions.
     """
-    standard_emotions = [
-        {"id": "HAPPY", "name": "Happy", "type": "STANDARD"},
-        {"id": "SAD", "name": "Sad", "type": "STANDARD"},
-        {"id": "ANGRY", "name": "Angry", "type": "STANDARD"},
-        {"id": "SURPRISED", "name": "Surprised", "type": "STANDARD"},
-        {"id": "FEAR", "name": "Fear", "type": "STANDARD"},
-        {"id": "DISGUST", "name": "Disgust", "type": "STANDARD"},
-    ]
-    
-    try:
-        custom_exercises = db.query(CustomExercise).filter(
+    version = await data_version(db, "catalog", patient_id)
+    not_modified = conditional_get(request, response, patient_id, version)
+    if not_modified:
+        return not_modified
+
+    async def load():
+        custom_exercises = (await db.execute(select(CustomExercise).where(
+            CustomExercise.patient_id == patient_id,
             (CustomExercise.module == "HARMONY") | (CustomExercise.domain == "FACE")
-        ).order_by(CustomExercise.created_at.desc()).all()
+        ).order_by(CustomExercise.created_at.desc()))).scalars().all()
         
         custom_list = [{
             "id": ex.id,
@@ -38,17 +50,21 @@ async def get_emotions(db: Session = Depends(get_db)):
             "config": ex.config_json
         } for ex in custom_exercises]
         
-        return standard_emotions + custom_list
+        return STANDARD_EMOTIONS + custom_list
+
+    try:
+        return await cached_catalog(db, patient_id, "emotions", load, version)
     except Exception as e:
         logger.error(f"Error fetching emotions: {e}")
-        return standard_emotions
+        del response.headers["ETag"] # Partial list: don't let the client pin it
+        return STANDARD_EMOTIONS
 
 class CreateEmotionRequest(BaseModel):
     name: str
     target_emotion: str # e.g. "Frustrated" maps to "Angry" internally or new
 
 @router.post("/emotions/generate")
-async def generate_emotion(request: CreateEmotionRequest, db: Session = Depends(get_db)):
+async def generate_emotion(request: CreateEmotionRequest, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """
     Creates a new custom emotion.
     In the future, this could use AI to generate landmarks for complex emotions.
@@ -58,14 +74,15 @@ async def generate_emotion(request: CreateEmotionRequest, db: Session = Depends(
         exercise_id = str(uuid.uuid4())
         new_exercise = CustomExercise(
             id=exercise_id,
+            patient_id=patient_id,
             name=request.name,
             domain="FACE",
             module="HARMONY",
             config_json={"target_emotion": request.target_emotion}
         )
         db.add(new_exercise)
-        db.commit()
-        db.refresh(new_exercise)
+        await db.commit()
+        catalog_cache.invalidate(patient_id)
         return {"status": "created", "id": exercise_id, "name": new_exercise.name}
     except Exception as e:
         logger.error(f"Error creating emotion: {e}")
@@ -74,30 +91,50 @@ async def generate_emotion(request: CreateEmotionRequest, db: Session = Depends(
 # --- HISTORY ---
 
 @router.get("/history")
-async def get_harmony_history(db: Session = Depends(get_db)):
+async def get_harmony_history(
+    request: Request,
+    response: Response,
+    limit: int = 50,
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id)
+):
     """
     Returns session logs strictly for Harmony (FACE).
     """
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "sessions", patient_id))
+    if not_modified:
+        return not_modified
     try:
-        # Join SessionReport and ExerciseSession
-        results = db.query(SessionReport, ExerciseSession).join(
+        # Join SessionReport and ExerciseSession (list columns only; full report via /session/logs/{id})
+        query = select(
+            SessionReport.id, SessionReport.timestamp, *summary_columns(SessionReport),
+            ExerciseSession.session_uuid, ExerciseSession.exercise_id, ExerciseSession.exercise_name,
+            ExerciseSession.status, ExerciseSession.metrics
+        ).join(
             ExerciseSession, SessionReport.session_id == ExerciseSession.session_uuid
-        ).filter(
+        ).where(
+            SessionReport.patient_id == patient_id,
+            ExerciseSession.patient_id == patient_id,
             ExerciseSession.domain == "FACE"
-        ).order_by(SessionReport.timestamp.desc()).limit(50).all()
+        )
+        results, next_cursor = await keyset_page(db, query, SessionReport.timestamp, SessionReport.id, cursor, limit)
         
         history = []
-        for report, session in results:
+        for row in results:
              history.append({
-                 "id": session.session_uuid, # UUID
+                 "id": row.session_uuid, # UUID
                  "domain": "FACE",
-                 "timestamp": report.timestamp.isoformat() if report.timestamp else None,
-                 "title": session.exercise_id, # This should be the Name (e.g. "Happy")
-                 "status": session.status,
-                 "report_summary": report.report_json, # Full report for details
-                 "metrics": session.metrics
+                 "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                 "title": row.exercise_id, # This should be the Name (e.g. "Happy")
+                 "status": row.status,
+                 "metrics": row.metrics,
+                 **summary_fields(row)
              })
-        return history
+        return {"items": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Harmony History Error: {e}")
-        return []
+        # Not an empty page: that would carry the ETag and the client would keep it as current
+        raise HTTPException(status_code=500, detail="Could not load history")
@@ -1,69 +1,118 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Response, Depends
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import SessionLocal, SessionReport, get_db
-from services.plan_generator import PlanGenerator
-from google import genai
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from database import SessionReport, get_async_db, get_patient_id
+from services.session_summary import summarize_report, summary_columns, summary_fields
+from services.session_search import index_report_async
+from services.activity_rollup import activity_trends
+from services.data_versions import data_version
+from utils.pagination import keyset_page
+from utils.etag import conditional_get
+from services.gemini_scheduler import scheduler, Priority
+from services.usage_tracker import usage_tracker
+from services.genai_client import get_genai_client
 from google.genai import types
-import os
+import datetime
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["history"])
 
-# Configuration
-api_key = os.getenv("GEMINI_API_KEY")
-
-# Initialize Clients
-planner = PlanGenerator(api_key=api_key) if api_key else None
-client = genai.Client(api_key=api_key, http_options={"api_version": "v1alpha"}) if api_key else None
 
 
 @router.get("/history")
-async def get_history(db: Session = Depends(get_db)):
+async def get_history(
+    request: Request,
+    response: Response,
+    limit: int = 20,
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id)
+):
+    """Report list: summary columns only. The full report is at /history/{id}."""
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "sessions", patient_id))
+    if not_modified:
+        return not_modified
     try:
-        reports = db.query(SessionReport).order_by(SessionReport.timestamp.desc()).limit(20).all()
-        history = []
-        for r in reports:
-            # Parse metrics/JSON safely
-            try:
-                report_data = r.report_json if isinstance(r.report_json, dict) else json.loads(r.report_json)
-            except:
-                report_data = {}
-            
-            # Extract Exercise Name (Try multiple paths)
-            activity_name = "Unknown Exercise"
-            if isinstance(report_data, dict):
-                # Path 1: Top-level (some versions)
-                if "activity_name" in report_data:
-                    activity_name = report_data["activity_name"]
-                # Path 2: Session Overview (older versions)
-                elif "session_overview" in report_data and isinstance(report_data["session_overview"], dict):
-                    activity_name = report_data["session_overview"].get("activity", "Unknown Exercise")
-                # Path 3: Session Overview text (if string)
-                elif "session_overview" in report_data and isinstance(report_data["session_overview"], list):
-                     for line in report_data["session_overview"]:
-                         if "Activity:" in line:
-                             activity_name = line.split(":", 1)[1].strip()
-                             break
-
-            history.append({
-                "id": r.id,
-                "timestamp": r.timestamp.isoformat(),
-                "transcript": r.transcript,
-                "clinical_notes": r.clinical_notes, 
-                "activity_name": activity_name, # Added field
-                "report_json": report_data
-            })
-        return history
+        query = select(
+            SessionReport.id, SessionReport.timestamp, SessionReport.session_id, *summary_columns(SessionReport)
+        ).where(SessionReport.patient_id == patient_id)
+        reports, next_cursor = await keyset_page(db, query, SessionReport.timestamp, SessionReport.id, cursor, limit)
+        history = [{
+            "id": r.id,
+            "timestamp": r.timestamp.isoformat(),
+            "session_id": r.session_id,
+            **summary_fields(r)
+        } for r in reports]
+        return {"items": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"History Fetch Error: {e}")
-        return []
+        # Not an empty page: that would carry the ETag and the client would keep it as current
+        raise HTTPException(status_code=500, detail="Could not load history")
+
+TREND_MAX_PERIODS = {"week": 104, "month": 24}
+
+# Declared before /history/{report_id} so "trends" isn't parsed as a report id
+@router.get("/history/trends")
+async def get_activity_trends(
+    request: Request,
+    response: Response,
+    period: str = "week",
+    count: int = 12,
+    domain: str = None,
+    exercise_id: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id)
+):
+    """Weekly or monthly totals (sessions, reps, duration, ROM, safety events) from the daily_activity rollup."""
+    if period not in TREND_MAX_PERIODS:
+        raise HTTPException(status_code=400, detail="period must be 'week' or 'month'")
+    count = max(1, min(count, TREND_MAX_PERIODS[period]))
+    # Periods are relative to today, so the tag rolls over at midnight too
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "sessions", patient_id), datetime.datetime.utcnow().date())
+    if not_modified:
+        return not_modified
+    trends = await activity_trends(db, patient_id, period, count, domain if domain != "ALL" else None, exercise_id)
+    return {"period": period, "items": trends}
+
+@router.get("/history/{report_id}")
+async def get_history_report(report_id: int, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
+    r = (await db.execute(select(SessionReport).where(
+        SessionReport.patient_id == patient_id, SessionReport.id == report_id
+    ))).scalar_one_or_none()
+    if not r:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    # Parse metrics/JSON safely
+    try:
+        report_data = r.report_json if isinstance(r.report_json, dict) else json.loads(r.report_json)
+    except:
+        report_data = {}
+
+    return {
+        "id": r.id,
+        "timestamp": r.timestamp.isoformat(),
+        "session_id": r.session_id,
+        "transcript": r.transcript,
+        "clinical_notes": r.clinical_notes,
+        "report_json": report_data,
+        **summary_fields(r)
+    }
 
 @router.post("/analyze_session")
-async def analyze_session(request: Request, db: Session = Depends(get_db)):
+async def analyze_session(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id),
+    client = Depends(get_genai_client)
+):
     if not client: return JSONResponse(status_code=503, content={"error": "Gemini Client not available"})
     
     try:
@@ -107,11 +156,16 @@ async def analyze_session(request: Request, db: Session = Depends(get_db)):
         }}
         """
 
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview", # Using standard stable model
-            contents=prompt,
-            config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
+        async with scheduler.slot(Priority.INTERACTIVE):
+            started = time.time()
+            response = await client.aio.models.generate_content(
+                model="gemini-3-flash-preview", # Using standard stable model
+                contents=prompt,
+                config=types.GenerateContentConfig(response_mime_type="application/json")
+            )
+        usage_tracker.record("analyze", usage=response.usage_metadata, started=started,
+                             session_id=data.get("session_id"), mode=data.get("domain", "BODY"),
+                             model="gemini-3-flash-preview")
         
         try:
             result = json.loads(response.text)
@@ -119,13 +173,16 @@ async def analyze_session(request: Request, db: Session = Depends(get_db)):
             # Persist to Database
             try:
                 db_report = SessionReport(
+                    patient_id=patient_id,
                     session_id=data.get("session_id", "unknown"),
                     transcript=str(transcript),
                     clinical_notes=clinical_notes,
-                    report_json=result
+                    report_json=result,
+                    **summarize_report(result, clinical_notes)
                 )
                 db.add(db_report)
-                db.commit()
+                await db.commit()
+                await index_report_async(db, db_report)
             except Exception as db_e:
                 logger.error(f"Failed to save to DB: {db_e}")
 
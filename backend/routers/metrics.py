@@ -0,0 +1,72 @@
+import asyncio
+from fastapi import APIRouter
+from database import SessionLocal
+from services.gemini_scheduler import scheduler
+from services.usage_tracker import summarize_usage, usage_tracker
+from services.schema_cache import schema_cache
+from services.catalog_cache import catalog_cache
+from services.exercise_templates import template_matcher
+from utils.db_pool import pool_stats
+from utils.etag import etag_stats
+from services.telemetry_retention import telemetry_compactor
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+def _summarize_usage(days: int):
+    db = SessionLocal()
+    try:
+        return summarize_usage(db, days=days)
+    finally:
+        db.close()
+
+@router.get("/gemini/scheduler")
+async def get_scheduler_metrics():
+    """Live concurrency, rate-limit and per-priority queue wait stats for Gemini REST calls."""
+    return scheduler.stats()
+
+@router.get("/usage")
+async def get_usage_metrics(days: int = 7):
+    """
+    Token and latency accounting for every model call.
+    Per day and mode: calls, tokens, p50/p95 latency, tokens per session-minute.
+    """
+    await usage_tracker.flush() # Include rows still buffered in this worker
+    # GROUP BY queries plus one latency scan on the sync engine: run them off the event loop
+    return await asyncio.to_thread(_summarize_usage, max(1, min(days, 90)))
+
+@router.get("/exercise-cache")
+async def get_exercise_cache_metrics():
+    """Hit/miss, store and eviction counts for the exercise schema generation cache."""
+    return schema_cache.stats()
+
+@router.get("/catalog-cache")
+async def get_catalog_cache_metrics():
+    """Hit/miss/stale counts for this worker's drill, emotion and custom exercise list cache."""
+    return catalog_cache.stats()
+
+@router.get("/exercise-templates")
+async def get_exercise_template_metrics():
+    """Local template match rate (vs LLM fallback) and matcher latency in microseconds."""
+    return template_matcher.stats()
+
+@router.get("/db-pool")
+async def get_db_pool_metrics():
+    """Connection pool saturation, checkout wait (ms) and timeouts for the async and sync engines."""
+    return pool_stats()
+
+@router.get("/etag")
+async def get_etag_metrics():
+    """Per-route conditional GET counts: full responses vs 304 Not Modified, and the hit rate."""
+    return etag_stats.stats()
+
+@router.get("/telemetry-retention")
+async def get_telemetry_retention_metrics(sizes: bool = False):
+    """
+    Compaction job counters (sessions downsampled, segments expired, bytes before/after).
+    sizes=true adds segments/samples/bytes per tier (scans session_telemetry).
+    """
+    stats = telemetry_compactor.stats()
+    if sizes:
+        stats["tiers"] = await asyncio.to_thread(telemetry_compactor.tier_sizes)
+    return stats
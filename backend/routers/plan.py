@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, Response, HTTPException
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_patient_id
 from services.plan_generator import PlanGenerator
+from services.data_versions import data_version
+from utils.etag import conditional_get
+from services.genai_client import genai_provider
 from utils.logging import logger
-import os
+import datetime
 
 router = APIRouter(
     prefix="/plan",
@@ -12,25 +15,29 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Initialize PlanGenerator
-api_key = os.getenv("GEMINI_API_KEY")
-planner = PlanGenerator(api_key=api_key) if api_key else None
+# Initialize PlanGenerator (shared client; also used by /reconnect/plan)
+planner = PlanGenerator(genai_provider) if genai_provider.available else None
 
 @router.get("/daily")
-async def get_daily_plan(db: Session = Depends(get_db)):
+async def get_daily_plan(request: Request, response: Response, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """Generates or retrieves today's AI recovery plan."""
     if not planner:
         return JSONResponse({"error": "Planner service not available (Missing API Key)"}, status_code=503)
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "plan", patient_id), datetime.date.today())
+    if not_modified:
+        return not_modified
     
     try:
-        plan = planner.generate_daily_plan(db)
+        plan = await planner.generate_daily_plan(db, patient_id)
+        if not plan:
+            del response.headers["ETag"] # Nothing stored yet: don't let the client pin an empty plan
         return plan
     except Exception as e:
         logger.error(f"Error generating daily plan: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @router.post("/complete")
-async def complete_exercise(request: Request, db: Session = Depends(get_db)):
+async def complete_exercise(request: Request, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """Marks an exercise in the daily plan as complete."""
     if not planner:
         return JSONResponse({"error": "Planner service not available"}, status_code=503)
@@ -42,7 +49,7 @@ async def complete_exercise(request: Request, db: Session = Depends(get_db)):
         if index is None:
              return JSONResponse(status_code=400, content={"error": "Missing exercise_index"})
 
-        result = planner.mark_exercise_complete(db, index)
+        result = await planner.mark_exercise_complete(db, index, patient_id)
         return result
     except Exception as e:
         logger.error(f"Error marking exercise complete: {e}")
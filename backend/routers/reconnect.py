@@ -1,30 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import get_db, CustomExercise, ExerciseSession, SessionReport
-from services.plan_generator import PlanGenerator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_patient_id, CustomExercise, ExerciseSession, SessionReport
+from services.session_summary import summary_columns, summary_fields
+from services.data_versions import data_version
+from services.catalog_cache import cached_catalog, catalog_cache
+from utils.pagination import keyset_page
+from utils.etag import conditional_get
+from routers.plan import planner
 from services.exercise_generator import generate_exercise_schema
 from pydantic import BaseModel
 import uuid
+import datetime
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/reconnect", tags=["reconnect"])
 
-# Initialize Planner Service
-api_key = os.getenv("GEMINI_API_KEY")
-planner = PlanGenerator(api_key=api_key) if api_key else None
+# Planner Service: same instance as /plan (single-flight and client are shared)
 
 # --- AI RECOVERY PLAN ---
 
 @router.get("/plan")
-async def get_daily_plan(db: Session = Depends(get_db)):
+async def get_daily_plan(request: Request, response: Response, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """Generates or retrieves today's AI recovery plan."""
     if not planner: return JSONResponse({"error": "Planner unavailable"}, status_code=503)
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "plan", patient_id), datetime.date.today())
+    if not_modified:
+        return not_modified
     try:
-        return planner.generate_daily_plan(db)
+        plan = await planner.generate_daily_plan(db, patient_id)
+        if not plan:
+            del response.headers["ETag"] # Nothing stored yet: don't let the client pin an empty plan
+        return plan
     except Exception as e:
         logger.error(f"Error generating plan: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -33,30 +43,37 @@ class CompleteExerciseRequest(BaseModel):
     exercise_index: int
 
 @router.post("/plan/complete")
-async def complete_plan_item(request: CompleteExerciseRequest, db: Session = Depends(get_db)):
+async def complete_plan_item(request: CompleteExerciseRequest, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """Marks a plan item as complete."""
     if not planner: return JSONResponse(status_code=503)
     try:
-        return planner.mark_exercise_complete(db, request.exercise_index)
+        return await planner.mark_exercise_complete(db, request.exercise_index, patient_id)
     except Exception as e:
         logger.error(f"Error completing plan item: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 # --- DRILLS (Custom & Standard) ---
 
+STANDARD_DRILLS = [
+    {"id": "elbow-flexion", "name": "Elbow Flexion", "type": "STANDARD"},
+    {"id": "shoulder-abduction", "name": "Shoulder Abduction", "type": "STANDARD"},
+]
+
 @router.get("/drills")
-async def get_drills(db: Session = Depends(get_db)):
+async def get_drills(request: Request, response: Response, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """
     Returns standard PT drills + custom user created drills.
     """
-    standard_drills = [
-        {"id": "elbow-flexion", "name": "Elbow Flexion", "type": "STANDARD"},
-        {"id": "shoulder-abduction", "name": "Shoulder Abduction", "type": "STANDARD"},
-    ]
-    try:
-        custom_drills = db.query(CustomExercise).filter(
+    version = await data_version(db, "catalog", patient_id)
+    not_modified = conditional_get(request, response, patient_id, version)
+    if not_modified:
+        return not_modified
+
+    async def load():
+        custom_drills = (await db.execute(select(CustomExercise).where(
+            CustomExercise.patient_id == patient_id,
             (CustomExercise.module == "RECONNECT") | (CustomExercise.domain == "BODY")
-        ).order_by(CustomExercise.created_at.desc()).all()
+        ).order_by(CustomExercise.created_at.desc()))).scalars().all()
         
         custom_list = [{
             "id": ex.id,
@@ -65,16 +82,20 @@ async def get_drills(db: Session = Depends(get_db)):
             "config": ex.config_json
         } for ex in custom_drills]
         
-        return standard_drills + custom_list
+        return STANDARD_DRILLS + custom_list
+
+    try:
+        return await cached_catalog(db, patient_id, "drills", load, version)
     except Exception as e:
         logger.error(f"Error fetching drills: {e}")
-        return standard_drills
+        del response.headers["ETag"] # Partial list: don't let the client pin it
+        return STANDARD_DRILLS
 
 class CreateDrillRequest(BaseModel):
     description: str
 
 @router.post("/drills/generate")
-async def generate_drill_schema(request: CreateDrillRequest, db: Session = Depends(get_db)):
+async def generate_drill_schema(request: CreateDrillRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Uses AI to generate a drill schema from a description (Previously /exercises/generate).
     """
@@ -95,19 +116,21 @@ class SaveDrillRequest(BaseModel):
     config: dict
 
 @router.post("/drills/save")
-async def save_drill(request: SaveDrillRequest, db: Session = Depends(get_db)):
+async def save_drill(request: SaveDrillRequest, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     """Saves a confirmed drill schema."""
     try:
         exercise_id = str(uuid.uuid4())
         new_exercise = CustomExercise(
             id=exercise_id,
+            patient_id=patient_id,
             name=request.name,
             domain="BODY",
             module="RECONNECT",
             config_json=request.config
         )
         db.add(new_exercise)
-        db.commit()
+        await db.commit()
+        catalog_cache.invalidate(patient_id)
         return {"status": "created", "id": exercise_id}
     except Exception as e:
         logger.error(f"Error saving drill: {e}")
@@ -116,29 +139,50 @@ async def save_drill(request: SaveDrillRequest, db: Session = Depends(get_db)):
 # --- HISTORY ---
 
 @router.get("/history")
-async def get_reconnect_history(db: Session = Depends(get_db)):
+async def get_reconnect_history(
+    request: Request,
+    response: Response,
+    limit: int = 50,
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id)
+):
     """
     Returns session logs strictly for Reconnect (BODY).
     """
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "sessions", patient_id))
+    if not_modified:
+        return not_modified
     try:
-        results = db.query(SessionReport, ExerciseSession).join(
+        # List columns only; the full report is at /session/logs/{id}
+        query = select(
+            SessionReport.id, SessionReport.timestamp, *summary_columns(SessionReport),
+            ExerciseSession.session_uuid, ExerciseSession.exercise_id, ExerciseSession.exercise_name,
+            ExerciseSession.status, ExerciseSession.metrics
+        ).join(
             ExerciseSession, SessionReport.session_id == ExerciseSession.session_uuid
-        ).filter(
-            (ExerciseSession.domain == "BODY")
-        ).order_by(SessionReport.timestamp.desc()).limit(50).all()
+        ).where(
+            SessionReport.patient_id == patient_id,
+            ExerciseSession.patient_id == patient_id,
+            ExerciseSession.domain == "BODY"
+        )
+        results, next_cursor = await keyset_page(db, query, SessionReport.timestamp, SessionReport.id, cursor, limit)
         
         history = []
-        for report, session in results:
+        for row in results:
              history.append({
-                 "id": session.session_uuid,
+                 "id": row.session_uuid,
                  "domain": "BODY",
-                 "timestamp": report.timestamp.isoformat() if report.timestamp else None,
-                 "title": session.exercise_name or session.exercise_id, # [FIX] Use Name
-                 "status": session.status,
-                 "report_summary": report.report_json,
-                 "metrics": session.metrics
+                 "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                 "title": row.exercise_name or row.exercise_id, # [FIX] Use Name
+                 "status": row.status,
+                 "metrics": row.metrics,
+                 **summary_fields(row)
              })
-        return history
+        return {"items": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Reconnect History Error: {e}")
-        return []
+        # Not an empty page: that would carry the ETag and the client would keep it as current
+        raise HTTPException(status_code=500, detail="Could not load history")
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Request, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import SessionLocal, ExerciseSession, SessionReport, get_db
+from fastapi import APIRouter, Request, Response, Depends, BackgroundTasks, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, ExerciseSession, SessionReport, get_async_db, get_patient_id
 from services.report_drafter import ReportDrafter
+from services.genai_client import genai_provider
+from services.plan_scheduler import plan_precomputer
+from services.session_summary import summarize_report, summary_columns, summary_fields
+from services.session_search import search_enabled, search_matches, index_report_async
+from services.activity_rollup import activity_facts, record_session_activity
+from services.telemetry_store import store_telemetry_chunk, session_telemetry_summary
+from services.data_versions import data_version
+from utils.pagination import keyset_page, ranked_page
+from utils.etag import conditional_get
 from datetime import datetime
-import os
+import asyncio
+import json
 import logging
 
 # Setup Logger
@@ -13,8 +24,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/session", tags=["session"])
 
 # Initialize Services
-api_key = os.getenv("GEMINI_API_KEY")
-drafter = ReportDrafter(api_key=api_key) if api_key else None
+drafter = ReportDrafter(genai_provider) if genai_provider.available else None
 
 if not drafter:
     logger.warning("ReportDrafter could not be initialized (Missing API Key).")
@@ -22,7 +32,7 @@ if not drafter:
 # Dependency
 
 @router.post("/start")
-async def start_session_draft(request: Request, db: Session = Depends(get_db)):
+async def start_session_draft(request: Request, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
     if not drafter: return JSONResponse(status_code=503, content={"error": "Drafter not initialized"})
     
     data = await request.json()
@@ -42,6 +52,7 @@ async def start_session_draft(request: Request, db: Session = Depends(get_db)):
     # 2. Create Persistent Record
     try:
         new_session = ExerciseSession(
+            patient_id=patient_id,
             session_uuid=session_id,
             exercise_id=exercise_id,
             exercise_name=exercise_name, # [FIX] Persist Name
@@ -49,83 +60,168 @@ async def start_session_draft(request: Request, db: Session = Depends(get_db)):
             status="started"
         )
         db.add(new_session)
-        db.commit()
+        await db.commit()
     except Exception as e:
         logger.error(f"Failed to persist session start: {e}")
 
     return {"status": "started" if success else "error", "session_id": session_id}
 
 @router.post("/chunk")
-async def ingest_session_chunk(request: Request, background_tasks: BackgroundTasks):
+async def ingest_session_chunk(request: Request, background_tasks: BackgroundTasks, patient_id: str = Depends(get_patient_id)):
     if not drafter: return JSONResponse(status_code=503, content={"error": "Drafter not initialized"})
     data = await request.json()
     session_id = data.get("session_id")
     
     # [OPTIMIZATION] Non-Blocking Ingestion
     background_tasks.add_task(drafter.ingest_chunk, session_id, data)
+    # Keep the raw samples (columnar segment) for analytics after the session
+    background_tasks.add_task(store_telemetry_chunk, patient_id, session_id, data.get("telemetry"))
     
     return JSONResponse(status_code=202, content={"status": "queued"})
 
-@router.post("/end")
-async def finalize_session_draft(request: Request, db: Session = Depends(get_db)):
-    if not drafter: return JSONResponse(status_code=503, content={"error": "Drafter not initialized"})
-    data = await request.json()
-    session_id = data.get("session_id")
-    
-    # 1. Get Final Report from Shadow Brain
-    result = await drafter.finalize_report(session_id)
-    
-    # 2. Update Persisted Record (ExerciseSession)
+async def _persist_session_end(db: AsyncSession, session_id: str, result: dict, patient_id: str):
+    """Marks the ExerciseSession completed and stores the final SessionReport."""
+    # 1. Update Persisted Record (ExerciseSession)
+    session_record = None
     try:
-        session_record = db.query(ExerciseSession).filter(ExerciseSession.session_uuid == session_id).first()
+        session_record = (await db.execute(select(ExerciseSession).where(
+            ExerciseSession.patient_id == patient_id,
+            ExerciseSession.session_uuid == session_id
+        ).limit(1))).scalar_one_or_none()
         if session_record:
+            first_end = session_record.status != "completed" # A retried /end must not count twice
             session_record.end_time = datetime.utcnow()
             session_record.status = "completed"
-            db.commit()
+            if first_end:
+                # Same transaction as the status change: the rollup counts each session exactly once
+                summary = summarize_report(result, result.get("clinical_notes", []), session_record)
+                await record_session_activity(db, activity_facts(session_record, summary, result))
+            await db.commit()
+            # New activity changes tomorrow's plan: re-arm the precompute
+            plan_precomputer.notify_session_completed(patient_id)
     except Exception as e:
         logger.error(f"Failed to update session end: {e}")
 
-    # 3. Save Report (SessionReport - Legacy/Detail)
+    # 2. Save Report (SessionReport - Legacy/Detail)
     if "report_markdown" in result:
         try:
              db_report = SessionReport(
+                 patient_id=patient_id,
                  session_id=session_id,
                  transcript="[Incremental Session]", 
                  clinical_notes=result.get("clinical_notes", []), 
-                 report_json=result
+                 report_json=result,
+                 **summarize_report(result, result.get("clinical_notes", []), session_record)
              )
              db.add(db_report)
-             db.commit()
+             # Index in the same transaction: the "sessions" version bump (on flush) must not
+             # become visible before the search row does, or a search poll caches a stale ETag
+             await db.flush()
+             await index_report_async(db, db_report, session_record, commit=False)
+             await db.commit()
         except Exception as e:
             logger.error(f"DB Save Error: {e}")
 
+@router.post("/end")
+async def finalize_session_draft(request: Request, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
+    if not drafter: return JSONResponse(status_code=503, content={"error": "Drafter not initialized"})
+    data = await request.json()
+    session_id = data.get("session_id")
+    
+    # 1. Get Final Report from Shadow Brain
+    result = await drafter.finalize_report(session_id)
+    
+    # 2. Persist
+    await _persist_session_end(db, session_id, result, patient_id)
+
     return result
 
+_finalizing = set() # Running finalize tasks (keeps them referenced until done)
+
+async def _finalize_and_persist(session_id: str, patient_id: str, events: asyncio.Queue):
+    """Streams the final report into `events` (None when done) and persists it, listener or not."""
+    try:
+        async for kind, payload in drafter.finalize_report_stream(session_id):
+            if kind == "final":
+                # Own session: the request-scoped one is closed once the response starts
+                async with AsyncSessionLocal() as db:
+                    await _persist_session_end(db, session_id, payload, patient_id)
+            events.put_nowait((kind, payload))
+    except Exception as e:
+        logger.error(f"Streaming finalize failed for {session_id}: {e}")
+    finally:
+        events.put_nowait(None)
+
+@router.post("/end/stream")
+async def finalize_session_draft_stream(request: Request, patient_id: str = Depends(get_patient_id)):
+    """
+    Server-Sent Events variant of /end.
+    Emits `token` events with report markdown as it is generated, then one `final`
+    event carrying the full payload (report, chart, notes) once it is persisted.
+    """
+    if not drafter: return JSONResponse(status_code=503, content={"error": "Drafter not initialized"})
+    data = await request.json()
+    session_id = data.get("session_id")
+
+    # Generation + persistence run in their own task: a client that disconnects mid-stream
+    # only stops the event stream below, the report is still stored
+    events = asyncio.Queue()
+    task = asyncio.create_task(_finalize_and_persist(session_id, patient_id, events))
+    _finalizing.add(task)
+    task.add_done_callback(_finalizing.discard)
+
+    async def event_stream():
+        while (event := await events.get()) is not None:
+            kind, payload = event
+            payload = json.dumps(payload if kind == "final" else {"text": payload})
+            yield f"event: {kind}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so the first token reaches the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/history")
 @router.get("/logs")
 async def get_session_logs(
+    request: Request,
+    response: Response,
     search: str = None, 
     domain: str = None, 
     start_date: str = None, 
     end_date: str = None, 
     limit: int = 50, 
-    db: Session = Depends(get_db)
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    patient_id: str = Depends(get_patient_id)
 ):
+    not_modified = conditional_get(request, response, patient_id, await data_version(db, "sessions", patient_id))
+    if not_modified:
+        return not_modified
     try:
-        # Join SessionReport and ExerciseSession
-        query = db.query(SessionReport, ExerciseSession).join(
+        # Join SessionReport and ExerciseSession (list columns only; full report via /logs/{session_id})
+        query = select(
+            SessionReport.id, SessionReport.timestamp, *summary_columns(SessionReport),
+            ExerciseSession.session_uuid, ExerciseSession.exercise_id, ExerciseSession.exercise_name,
+            ExerciseSession.status, ExerciseSession.domain
+        ).join(
             ExerciseSession, SessionReport.session_id == ExerciseSession.session_uuid
-        ).order_by(SessionReport.timestamp.desc())
+        ).where(
+            SessionReport.patient_id == patient_id,
+            ExerciseSession.patient_id == patient_id
+        )
         
         # [FILTER] Domain
         if domain and domain != "ALL":
-             query = query.filter(ExerciseSession.domain == domain)
+             query = query.where(ExerciseSession.domain == domain)
 
         # [FILTER] Date Range
         if start_date:
             try:
                 start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(SessionReport.timestamp >= start_dt)
+                query = query.where(SessionReport.timestamp >= start_dt)
             except ValueError:
                 pass # Ignore invalid dates
         
@@ -138,35 +234,87 @@ async def get_session_logs(
                 # Let's assume the UI sends YYYY-MM-DD and we want inclusive.
                 if len(end_date) == 10: 
                     end_dt = end_dt.replace(hour=23, minute=59, second=59)
-                query = query.filter(SessionReport.timestamp <= end_dt)
+                query = query.where(SessionReport.timestamp <= end_dt)
             except ValueError:
                 pass
 
-        # [FILTER] Search
-        if search:
+        # [FILTER] Search (full-text index, ranked by relevance)
+        ranked = False
+        if search and search_enabled(db):
+            matches = search_matches(db, search, patient_id)
+            if matches is not None:
+                query = query.join(matches, matches.c.report_id == SessionReport.id).add_columns(matches.c.score)
+                ranked = True
+        elif search:
+            # No full-text index on this database: substring scan
             search_query = f"%{search}%"
-            query = query.filter(
+            query = query.where(
                 (ExerciseSession.exercise_name.ilike(search_query)) | 
                 (ExerciseSession.exercise_id.ilike(search_query)) | 
                 (SessionReport.transcript.ilike(search_query))
             )
         
-        results = query.limit(limit).all()
+        if ranked:
+            results, next_cursor = await ranked_page(db, query, (matches.c.score.desc(), SessionReport.id.desc()), cursor, limit)
+        else:
+            results, next_cursor = await keyset_page(db, query, SessionReport.timestamp, SessionReport.id, cursor, limit)
         
         history = []
-        for report, session in results:
+        for row in results:
              history.append({
-                 "id": session.session_uuid,
-                 "session_id": session.session_uuid,
-                 "exercise_id": session.exercise_id,
-                 "title": session.exercise_name or session.exercise_id, 
-                 "timestamp": report.timestamp.isoformat() if report.timestamp else None,
-                 "report_summary": report.report_json, 
-                 "status": session.status,
-                 "domain": session.domain
+                 "id": row.session_uuid,
+                 "session_id": row.session_uuid,
+                 "exercise_id": row.exercise_id,
+                 "title": row.exercise_name or row.exercise_id, 
+                 "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                 "status": row.status,
+                 "domain": row.domain,
+                 **summary_fields(row),
+                 **({"score": round(row.score, 4)} if ranked else {})
              })
              
-        return history
+        return {"items": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"History Fetch Error: {e}")
-        return []
+        # Not an empty page: that would carry the ETag and the client would keep it as current
+        raise HTTPException(status_code=500, detail="Could not load history")
+
+@router.get("/logs/{session_id}/telemetry")
+async def get_session_telemetry(session_id: str, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
+    """
+    Figures from the stored telemetry (duration, ROM, velocity, landmark travel, per-rep breakdown).
+    `tier` says which retention tier the session is in (raw, downsampled, aggregate).
+    """
+    summary = await session_telemetry_summary(db, patient_id, session_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No telemetry stored for this session")
+    return {"session_id": session_id, **summary}
+
+@router.get("/logs/{session_id}")
+async def get_session_log(session_id: str, db: AsyncSession = Depends(get_async_db), patient_id: str = Depends(get_patient_id)):
+    """Full record for one session: list fields plus the complete report and metrics."""
+    row = (await db.execute(select(SessionReport, ExerciseSession).join(
+        ExerciseSession, SessionReport.session_id == ExerciseSession.session_uuid
+    ).where(
+        SessionReport.patient_id == patient_id,
+        ExerciseSession.patient_id == patient_id,
+        ExerciseSession.session_uuid == session_id
+    ).order_by(SessionReport.timestamp.desc(), SessionReport.id.desc()).limit(1))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    report, session = row
+    return {
+        "id": session.session_uuid,
+        "session_id": session.session_uuid,
+        "exercise_id": session.exercise_id,
+        "title": session.exercise_name or session.exercise_id,
+        "timestamp": report.timestamp.isoformat() if report.timestamp else None,
+        "status": session.status,
+        "domain": session.domain,
+        "metrics": session.metrics,
+        "report_summary": report.report_json,
+        **summary_fields(report)
+    }
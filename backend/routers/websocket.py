@@ -1,6 +1,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.orm import Session
 from database import SessionLocal, SessionReport, ExerciseSession, SessionMetrics
+from services.usage_tracker import usage_tracker, usage_counts
 try:
     from session_manager import SessionManager
 except ImportError:
@@ -11,7 +12,6 @@ import asyncio
 import uuid
 import time
 import base64
-import os
 
 # --- LOGGING SETUP ---
 logging.basicConfig(level=logging.INFO)
@@ -29,31 +29,20 @@ def get_db():
 
 # --- GEMINI CLIENT STUB (Replace with actual Google GenAI SDK if available) ---
 try:
-    from google import genai
     from google.genai import types
     SDK_INSTALLED = True
 except ImportError as e:
     logger.error(f"Google GenAI SDK not found: {e}")
     SDK_INSTALLED = False
 
-try:
-    from config import GEMINI_API_KEY
-except ImportError:
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if SDK_INSTALLED and GEMINI_API_KEY:
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY, http_options={'api_version': 'v1alpha'})
-        GEMINI_AVAILABLE = True
-        logger.info(f"Gemini Live Client Initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini Client: {e}")
-        GEMINI_AVAILABLE = False
-        client = None
+if SDK_INSTALLED:
+    from services.genai_client import genai_provider
+    GEMINI_AVAILABLE = genai_provider.available
 else:
-    logger.warning(f"Gemini Unavailable. SDK: {SDK_INSTALLED}, Key: {bool(GEMINI_API_KEY)}")
     GEMINI_AVAILABLE = False
-    client = None
+
+if not GEMINI_AVAILABLE:
+    logger.warning(f"Gemini Unavailable. SDK: {SDK_INSTALLED}, Key: {GEMINI_AVAILABLE}")
 
 # --- SESSION MANAGER ---
 session_manager = SessionManager()
@@ -127,6 +116,9 @@ async def websocket_endpoint(websocket: WebSocket, mode: str, db: Session = Depe
     # Notify Frontend of Session ID
     await websocket.send_json({"type": "session_started", "session_id": session_id})
 
+    # Token totals for this live session (written once, on disconnect)
+    live_usage = {"input_tokens": 0, "output_tokens": 0}
+
     # --- CONFIGURATION ---
     # [LEGACY ADOPTION] Use the specific model from production code
     model = "gemini-2.5-flash-native-audio-preview-12-2025" 
@@ -216,6 +208,8 @@ async def websocket_endpoint(websocket: WebSocket, mode: str, db: Session = Depe
     try:
         # --- GEMINI LIVE LOOP ---
         if GEMINI_AVAILABLE:
+            # Shared process-wide client (created in the app lifespan)
+            client = genai_provider.client
             async with client.aio.live.connect(model=model, config=config) as session:
                 logger.info(f"Connected to Gemini API ({model})")
 
@@ -365,6 +359,12 @@ async def websocket_endpoint(websocket: WebSocket, mode: str, db: Session = Depe
                         while gemini_connection_active:
                             try:
                                 async for response in session.receive():
+                                    usage = getattr(response, 'usage_metadata', None)
+                                    if usage:
+                                        input_tokens, output_tokens = usage_counts(usage)
+                                        live_usage["input_tokens"] += input_tokens
+                                        live_usage["output_tokens"] += output_tokens
+
                                     server_content = response.server_content
                                     if server_content and server_content.model_turn:
                                         for part in server_content.model_turn.parts:
@@ -438,3 +438,5 @@ async def websocket_endpoint(websocket: WebSocket, mode: str, db: Session = Depe
              pass
     finally:
          manager.disconnect(websocket)
+         if live_usage["input_tokens"] or live_usage["output_tokens"]:
+             usage_tracker.record("live", session_id=session_id, mode=mode.upper(), model=model, **live_usage)
@@ -0,0 +1,104 @@
+"""
+Measures what a polling client costs with and without conditional GETs.
+
+    python scripts/bench_conditional_get.py [--sessions 5000] [--polls 50]
+
+Seeds a synthetic SQLite DB, then polls the list endpoints in-process (ASGI transport)
+twice: once as a client that ignores ETags, once as one that sends If-None-Match like a
+browser does. Reports response bytes, DB queries and latency per poll for each, and checks
+that a write (new custom drill) invalidates the cached catalog on the next poll.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench")
+
+PATIENT = "default"
+ENDPOINTS = [
+    "/history?limit=20",
+    "/session/logs?limit=50",
+    "/reconnect/history?limit=50",
+    "/history/trends?period=week",
+    "/reconnect/drills",
+    "/exercises/custom?domain=BODY",
+]
+
+
+async def poll(client, path: str, polls: int, conditional: bool, queries: list):
+    etag, sizes, counts, latencies, statuses = None, [], [], [], {}
+    for _ in range(polls):
+        headers = {"X-Patient-Id": PATIENT}
+        if conditional and etag:
+            headers["If-None-Match"] = etag
+        before = len(queries)
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        counts.append(len(queries) - before)
+        sizes.append(len(response.content))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        etag = response.headers.get("etag") or etag
+    return {
+        "bytes": statistics.mean(sizes), "queries": statistics.mean(counts),
+        "ms": statistics.median(latencies), "statuses": statuses,
+    }
+
+
+async def run(polls: int):
+    import httpx
+    from sqlalchemy import event
+    from database import async_engine
+    from main import app
+
+    queries = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(1))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        logger.info(f"{'endpoint':32} {'mode':12} {'bytes/poll':>10} {'queries/poll':>12} {'p50 ms':>7}  statuses")
+        for path in ENDPOINTS:
+            for conditional in (False, True):
+                r = await poll(client, path, polls, conditional, queries)
+                logger.info(f"{path:32} {'etag' if conditional else 'plain':12} {r['bytes']:10.0f} "
+                            f"{r['queries']:12.2f} {r['ms']:7.2f}  {r['statuses']}")
+
+        # A write must invalidate the cached list on the very next poll
+        first = await client.get("/reconnect/drills", headers={"X-Patient-Id": PATIENT})
+        etag = first.headers["etag"]
+        await client.post("/reconnect/drills/save", headers={"X-Patient-Id": PATIENT},
+                          json={"name": "Bench Drill", "config": {"name": "Bench Drill"}})
+        after = await client.get("/reconnect/drills", headers={"X-Patient-Id": PATIENT, "If-None-Match": etag})
+        logger.info(f"after write: status {after.status_code}, etag changed: {after.headers.get('etag') != etag}")
+        logger.info(f"/metrics/etag: {(await client.get('/metrics/etag')).json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=5_000)
+    parser.add_argument("--polls", type=int, default=50)
+    args = parser.parse_args()
+
+    # Must be set before the app (and its engines) are imported
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from database import init_db
+    import bench_event_loop
+    bench_event_loop.PATIENTS = [PATIENT]
+    init_db()
+    logger.info(f"Seeding {args.sessions} sessions into {path} ...")
+    bench_event_loop.seed(args.sessions)
+    asyncio.run(run(args.polls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Measures event-loop responsiveness while the history endpoints are under load.
+
+    python scripts/bench_event_loop.py [--sessions 50000] [--requests 200] [--concurrency 20]
+
+Seeds a synthetic SQLite DB, then fires concurrent /session/logs and /history requests
+in-process (ASGI transport) while a heartbeat task measures how late its 10 ms sleeps
+wake up. Late wake-ups are what a live websocket feels as stutter: any DB call that
+blocks the loop shows up here. Reports heartbeat lag p50/p95/max and request latency.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import tempfile
+import time
+import uuid
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench")
+
+HEARTBEAT_SECONDS = 0.01
+PATIENTS = ["default", "p1", "p2"]
+
+
+def seed(n_sessions: int):
+    from database import SessionLocal, ExerciseSession, SessionReport
+    from services.session_summary import summarize_report
+    now = datetime.datetime.utcnow()
+    sessions, reports = [], []
+    for i in range(n_sessions):
+        start = now - datetime.timedelta(minutes=i)
+        session_uuid = str(uuid.uuid4())
+        patient_id = random.choice(PATIENTS)
+        report = {"activity_name": "Bicep Curl", "report_markdown": "# Clinical Report\n\n" + "Steady reps. " * 40}
+        sessions.append({
+            "patient_id": patient_id, "session_uuid": session_uuid, "exercise_id": "bicep_curl",
+            "exercise_name": "Bicep Curl", "domain": "BODY", "start_time": start,
+            "end_time": start + datetime.timedelta(minutes=5), "status": "completed", "metrics": {"reps": 10},
+        })
+        reports.append({
+            "patient_id": patient_id, "session_id": session_uuid, "timestamp": start,
+            "transcript": "[Incremental Session]", "clinical_notes": [], "report_json": report,
+            **summarize_report(report, []),
+        })
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(ExerciseSession, sessions)
+        db.bulk_insert_mappings(SessionReport, reports)
+        db.commit()
+    finally:
+        db.close()
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run(n_requests: int, concurrency: int):
+    import httpx
+    from main import app
+
+    lags = []
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            lags.append((time.perf_counter() - started - HEARTBEAT_SECONDS) * 1000)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client, i):
+        path = "/session/logs?limit=50" if i % 2 else "/history?limit=50"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path, headers={"X-Patient-Id": random.choice(PATIENTS)})
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/history?limit=1") # Warm up pools / caches
+        beat = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+
+    logger.info(f"{n_requests} requests, concurrency {concurrency}: {n_requests / elapsed:.0f} req/s")
+    logger.info(f"request latency ms : p50 {statistics.median(latencies):7.1f}  p95 {percentile(latencies, 0.95):7.1f}")
+    logger.info(f"heartbeat lag ms   : p50 {statistics.median(lags):7.1f}  p95 {percentile(lags, 0.95):7.1f}  "
+                f"max {max(lags):7.1f}  ({len(lags)} beats)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    # Must be set before the app (and its engines) are imported
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from database import init_db
+    init_db()
+    logger.info(f"Seeding {args.sessions} sessions into {path} ...")
+    seed(args.sessions)
+    asyncio.run(run(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
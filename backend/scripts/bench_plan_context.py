@@ -0,0 +1,116 @@
+"""
+Benchmarks PlanGenerator._get_session_context on a synthetic SQLite DB.
+
+    python scripts/bench_plan_context.py [--sessions 100000] [--runs 5]
+
+Compares the SQL aggregate implementation against the legacy ORM load + Python loop.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import json
+import random
+import statistics
+import tempfile
+import time
+import uuid
+import logging
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, ExerciseSession, SessionReport
+from services.plan_generator import PlanGenerator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench")
+
+EXERCISES = ["abduction", "bicep_curl", "wall_slide", "rotation", "HAPPY", "SAD"]
+
+
+def seed(db, n_sessions: int, n_reports: int):
+    now = datetime.datetime.utcnow()
+    sessions = []
+    for _ in range(n_sessions):
+        start = now - datetime.timedelta(minutes=random.randint(0, 60 * 24 * 30))
+        sessions.append({
+            "session_uuid": str(uuid.uuid4()),
+            "exercise_id": random.choice(EXERCISES),
+            "exercise_name": "Synthetic",
+            "domain": "BODY",
+            "start_time": start,
+            "end_time": start + datetime.timedelta(minutes=5),
+            "status": random.choice(["completed", "completed", "started"]),
+            "metrics": {"reps": random.randint(0, 20)},
+        })
+    db.bulk_insert_mappings(ExerciseSession, sessions)
+
+    reports = []
+    for i in range(n_reports):
+        reports.append({
+            "timestamp": now - datetime.timedelta(minutes=random.randint(0, 60 * 24 * 30)),
+            # Half match a raw session (deduped), half are orphans
+            "session_id": sessions[i]["session_uuid"] if i % 2 == 0 else str(uuid.uuid4()),
+            "transcript": "[Incremental Session]",
+            "clinical_notes": [],
+            "report_json": {"activity_name": random.choice(EXERCISES), "report_markdown": "# Clinical Report\n" + "x" * 2000},
+        })
+    db.bulk_insert_mappings(SessionReport, reports)
+    db.commit()
+
+
+def legacy_context(db):
+    """Pre-aggregation implementation: loads ORM rows and dedups in Python."""
+    seven_days_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    history = []
+    for s in db.query(ExerciseSession).filter(ExerciseSession.start_time >= seven_days_ago).order_by(ExerciseSession.start_time.asc()).all():
+        history.append({"date": s.start_time.strftime("%Y-%m-%d"), "exercise_id": s.exercise_id, "status": s.status,
+                        "reps": s.metrics.get("reps", 0) if s.metrics else 0})
+    for r in db.query(SessionReport).filter(SessionReport.timestamp >= seven_days_ago).order_by(SessionReport.timestamp.asc()).all():
+        data = r.report_json if isinstance(r.report_json, dict) else json.loads(r.report_json)
+        activity = data.get("activity_name", "Unknown")
+        r_date = r.timestamp.strftime("%Y-%m-%d")
+        if not any(h["date"] == r_date and h["exercise_id"] == activity for h in history):
+            history.append({"date": r_date, "exercise_id": activity, "status": "completed", "reps": "unknown"})
+    return history
+
+
+def timed(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--reports", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    logger.info(f"Seeding {args.sessions} sessions / {args.reports} reports into {path} ...")
+    seed(db, args.sessions, args.reports)
+
+    planner = object.__new__(PlanGenerator) # No Gemini client needed for context building
+    rows = planner._get_session_context(db)
+
+    # Legacy loads the reports too when raw history is sparse; force it for a like-for-like worst case
+    legacy_ms = timed(lambda: legacy_context(db), args.runs)
+    sql_ms = timed(lambda: planner._get_session_context(db), args.runs)
+
+    logger.info(f"legacy ORM + Python : {legacy_ms:8.1f} ms (median of {args.runs})")
+    logger.info(f"SQL aggregates      : {sql_ms:8.1f} ms (median of {args.runs}) -> {len(rows)} context rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Storage size and decode/analytics speed of session telemetry: JSON vs columnar segments.
+
+    python scripts/bench_telemetry.py [--minutes 10] [--fps 8] [--chunk-seconds 10]
+
+Synthesizes a session the way the frontend records it (8 fps, 6 upper-body landmarks,
+x/y rounded to 3 decimals, t to 2, vel to 3) and compares, for the whole session:
+  json      the samples as JSON (what a JSON column such as SessionMetrics.value would hold)
+  json+zlib the same, compressed
+  columnar  services/telemetry_store.py segments, one per chunk (what /session/chunk stores)
+Decode = bytes back to something analyzable; analytics = ROM, peak/mean velocity and
+landmark path length over the whole session.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import math
+import random
+import time
+import zlib
+
+from services.telemetry_store import encode_telemetry, decode_telemetry, concat_columns, summarize_telemetry
+
+LANDMARKS = [11, 12, 13, 14, 15, 16]
+
+
+def synthesize(minutes: float, fps: int) -> list:
+    samples, angle_prev = [], 0.0
+    for i in range(int(minutes * 60 * fps)):
+        t = i / fps
+        angle = 90 + 60 * math.sin(t * 2 * math.pi / 4) + random.gauss(0, 1.5) # ~4 s per rep
+        coords = {
+            str(idx): {"x": round(0.5 + 0.1 * math.sin(t + idx) + random.gauss(0, 0.004), 3),
+                       "y": round(0.4 + 0.1 * math.cos(t + idx) + random.gauss(0, 0.004), 3)}
+            for idx in LANDMARKS if random.random() > 0.02 # Occasionally out of frame
+        }
+        samples.append({"t": round(t, 2), "val": round(angle, 1), "vel": round((angle - angle_prev) / 100, 3),
+                        "coords": coords})
+        angle_prev = angle
+    return samples
+
+
+def summarize_json(samples: list) -> dict:
+    """The same figures computed the way JSON-stored telemetry would be: a Python loop."""
+    vals = [s["val"] for s in samples]
+    vels = [abs(s["vel"]) for s in samples]
+    travel, last = {}, {}
+    for s in samples:
+        for name, p in s["coords"].items():
+            if name in last:
+                travel[name] = travel.get(name, 0.0) + math.hypot(p["x"] - last[name]["x"], p["y"] - last[name]["y"])
+            last[name] = p
+    return {"rom": max(vals) - min(vals), "peak_velocity": max(vels), "mean_velocity": sum(vels) / len(vels),
+            "travel": travel}
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--fps", type=int, default=8)
+    parser.add_argument("--chunk-seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    samples = synthesize(args.minutes, args.fps)
+    per_chunk = int(args.chunk_seconds * args.fps)
+    chunks = [samples[i:i + per_chunk] for i in range(0, len(samples), per_chunk)]
+
+    as_json = json.dumps(samples).encode()
+    as_json_zlib = zlib.compress(as_json, 6)
+    segments, encode_ms = timed(lambda: [encode_telemetry(chunk) for chunk in chunks])
+    columnar = sum(len(s) for s in segments)
+
+    print(f"{len(samples)} samples ({args.minutes:g} min at {args.fps} fps), {len(chunks)} chunks")
+    print(f"{'format':10} {'bytes':>10} {'bytes/sample':>13} {'vs json':>8}")
+    for name, size in (("json", len(as_json)), ("json+zlib", len(as_json_zlib)), ("columnar", columnar)):
+        print(f"{name:10} {size:10d} {size / len(samples):13.1f} {len(as_json) / size:7.1f}x")
+
+    _, json_decode_ms = timed(lambda: json.loads(as_json))
+    _, json_zlib_decode_ms = timed(lambda: json.loads(zlib.decompress(as_json_zlib)))
+    columns, columnar_decode_ms = timed(lambda: concat_columns([decode_telemetry(s) for s in segments]))
+    decoded = json.loads(as_json)
+    json_summary, json_analytics_ms = timed(lambda: summarize_json(decoded))
+    summary, columnar_analytics_ms = timed(lambda: summarize_telemetry(columns))
+
+    print(f"\nencode columnar (all chunks)   {encode_ms:8.2f} ms")
+    print(f"decode json                    {json_decode_ms:8.2f} ms")
+    print(f"decode json+zlib               {json_zlib_decode_ms:8.2f} ms")
+    print(f"decode columnar -> NumPy       {columnar_decode_ms:8.2f} ms")
+    print(f"analytics python loop (json)   {json_analytics_ms:8.2f} ms")
+    print(f"analytics NumPy (columnar)     {columnar_analytics_ms:8.2f} ms")
+
+    # Lossless for what the client sends: float32 holds 3-decimal coordinates and 2-decimal times exactly enough
+    assert len(columns["t"]) == len(samples)
+    assert abs(summary["range_of_motion"] - round(json_summary["rom"], 2)) < 0.05
+    assert all(abs(summary["landmark_travel"][str(i)] - json_summary["travel"][str(i)]) < 0.01 for i in LANDMARKS)
+    print("\ncolumnar round trip matches the JSON figures")
+
+
+if __name__ == "__main__":
+    main()
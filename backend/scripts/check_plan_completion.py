@@ -0,0 +1,130 @@
+"""
+Concurrency check for /plan/complete: no completion may be lost when several land at once.
+
+    python scripts/check_plan_completion.py [--completions 24] [--rounds 5] [--database-url URL]
+
+Creates today's plan with `--completions` routine items in a file-backed SQLite DB (or the
+database at --database-url, e.g. Postgres), then marks every item complete at the same time:
+one thread per item, each with its own event loop, engine and AsyncSession, released
+together by a barrier, the way separate workers would hit the row. Repeats `--rounds` times
+on a fresh plan and fails (exit 1) if any round ends with a key missing from completion_status.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import datetime
+import tempfile
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger("check_plan_completion")
+
+PATIENT = "completion-check"
+
+
+def reset_plan(items: int):
+    from database import SessionLocal, DailyPlan
+    db = SessionLocal()
+    try:
+        db.query(DailyPlan).filter(DailyPlan.patient_id == PATIENT).delete()
+        db.add(DailyPlan(
+            patient_id=PATIENT, date=datetime.date.today(),
+            plan_json={"routine": [{"name": f"item {i}"} for i in range(items)]}, completion_status={},
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def stored_status() -> dict:
+    from database import SessionLocal, DailyPlan
+    db = SessionLocal()
+    try:
+        plan = db.query(DailyPlan).filter(DailyPlan.patient_id == PATIENT, DailyPlan.date == datetime.date.today()).one()
+        return plan.completion_status or {}
+    finally:
+        db.close()
+
+
+def worker_engine():
+    """An engine of its own per thread, like a separate worker (async pools are bound to one loop)."""
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from database import DATABASE_URL, IS_SQLITE, _async_url, _set_sqlite_pragmas
+    engine = create_async_engine(_async_url(DATABASE_URL), poolclass=NullPool)
+    if IS_SQLITE:
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def run_round(planner, items: int) -> tuple:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    barrier = threading.Barrier(items)
+    errors = []
+
+    def complete(index: int):
+        async def call():
+            engine = worker_engine()
+            try:
+                async with AsyncSession(engine, expire_on_commit=False) as db:
+                    barrier.wait() # Every completion starts at the same moment
+                    result = await planner.mark_exercise_complete(db, index, PATIENT)
+                    if result.get("status") != "updated":
+                        errors.append(f"item {index}: {result}")
+            finally:
+                await engine.dispose()
+        try:
+            asyncio.run(call())
+        except Exception as e:
+            errors.append(f"item {index}: {e}")
+
+    threads = [threading.Thread(target=complete, args=(i,)) for i in range(items)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--completions", type=int, default=24)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--database-url", default=None, help="Default: a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "completion.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from database import init_db
+    from services.plan_generator import PlanGenerator
+    init_db()
+    planner = PlanGenerator(None) # Completion never calls the model
+
+    failed = False
+    for round_no in range(1, args.rounds + 1):
+        reset_plan(args.completions)
+        errors, elapsed = run_round(planner, args.completions)
+        status = stored_status()
+        missing = [str(i) for i in range(args.completions) if status.get(str(i)) is not True]
+        ok = not missing and not errors
+        failed |= not ok
+        print(f"round {round_no}: {args.completions} concurrent completions in {elapsed * 1000:.0f} ms, "
+              f"{len(status)} keys stored, missing {missing or 'none'}" + (f", errors {errors}" if errors else ""))
+
+    print("FAIL: completions were lost" if failed else "OK: every completion was kept")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Runs one telemetry retention sweep now (the app also runs it in the background).
+
+    python scripts/compact_telemetry.py [--raw-days N] [--downsampled-days M] [--sizes-only]
+
+Raw segments older than the raw retention are downsampled per session (plus whole-session and
+per-rep summaries); downsampled segments past theirs are deleted. Defaults come from the
+TELEMETRY_* settings. Prints segments/samples/bytes per tier before and after.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+
+from database import engine, TelemetrySegment, TelemetrySummary
+from services.telemetry_retention import TelemetryCompactor, telemetry_compactor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("compact_telemetry")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw-days", type=int, default=telemetry_compactor.raw_days)
+    parser.add_argument("--downsampled-days", type=int, default=telemetry_compactor.downsampled_days)
+    parser.add_argument("--max-batches", type=int, default=1_000_000, help="Default: until nothing is left")
+    parser.add_argument("--sizes-only", action="store_true", help="Only print the per-tier sizes")
+    args = parser.parse_args()
+
+    # CLI runs don't go through create_all
+    TelemetrySegment.__table__.create(bind=engine, checkfirst=True)
+    TelemetrySummary.__table__.create(bind=engine, checkfirst=True)
+
+    compactor = TelemetryCompactor(
+        args.raw_days, args.downsampled_days, telemetry_compactor.hz, 0,
+        telemetry_compactor.batch_size, args.max_batches, telemetry_compactor.pause_seconds,
+    )
+    logger.info(f"Before: {json.dumps(compactor.tier_sizes())}")
+    if args.sizes_only:
+        return
+    counts = asyncio.run(compactor.run())
+    logger.info(f"Run: {json.dumps(counts)}")
+    logger.info(f"After: {json.dumps(compactor.tier_sizes())}")
+    stats = compactor.stats()
+    ratio = f"{stats['compaction_ratio']}x" if stats["compaction_ratio"] else "n/a"
+    logger.info(f"Compaction ratio {ratio}, failures {stats['failures']}")
+
+
+if __name__ == "__main__":
+    main()
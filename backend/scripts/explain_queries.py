@@ -0,0 +1,89 @@
+"""
+Prints the query plans of the hot history / planner / scheduler / catalog queries.
+
+    python scripts/explain_queries.py [--patient default]
+
+Uses DATABASE_URL (SQLite: EXPLAIN QUERY PLAN, Postgres: EXPLAIN). Run before and
+after a migration to check which indexes each query uses.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import logging
+
+from sqlalchemy import exists, func
+from database import SessionLocal, SessionReport, ExerciseSession, CustomExercise
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("explain")
+
+
+def hot_queries(db, patient_id: str):
+    week_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    yield "history list (/history)", db.query(SessionReport.id, SessionReport.timestamp).filter(
+        SessionReport.patient_id == patient_id
+    ).order_by(SessionReport.timestamp.desc(), SessionReport.id.desc()).limit(21)
+
+    yield "domain history (/reconnect/history)", db.query(SessionReport.id, ExerciseSession.session_uuid).join(
+        ExerciseSession, SessionReport.session_id == ExerciseSession.session_uuid
+    ).filter(
+        SessionReport.patient_id == patient_id,
+        ExerciseSession.patient_id == patient_id,
+        ExerciseSession.domain == "BODY"
+    ).order_by(SessionReport.timestamp.desc(), SessionReport.id.desc()).limit(51)
+
+    day = func.date(ExerciseSession.start_time)
+    yield "planner raw log (7 days)", db.query(
+        day, ExerciseSession.exercise_id, ExerciseSession.status, func.count(ExerciseSession.id)
+    ).filter(
+        ExerciseSession.patient_id == patient_id, ExerciseSession.start_time >= week_ago
+    ).group_by(day, ExerciseSession.exercise_id, ExerciseSession.status)
+
+    has_raw_log = exists().where(ExerciseSession.session_uuid == SessionReport.session_id)
+    yield "planner report fallback (7 days)", db.query(func.count(SessionReport.id)).filter(
+        SessionReport.patient_id == patient_id, SessionReport.timestamp >= week_ago, ~has_raw_log
+    )
+
+    yield "active patients (scheduler)", db.query(ExerciseSession.patient_id).filter(
+        ExerciseSession.start_time >= week_ago
+    ).distinct()
+
+    yield "catalog (/exercises/custom?domain=)", db.query(CustomExercise).filter(
+        CustomExercise.patient_id == patient_id, CustomExercise.domain == "BODY"
+    ).order_by(CustomExercise.created_at.desc())
+
+    yield "catalog (/reconnect/drills)", db.query(CustomExercise).filter(
+        CustomExercise.patient_id == patient_id,
+        (CustomExercise.module == "RECONNECT") | (CustomExercise.domain == "BODY")
+    ).order_by(CustomExercise.created_at.desc())
+
+
+def explain(db, query):
+    dialect = db.bind.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.connection().exec_driver_sql(prefix + sql).fetchall()
+    # SQLite rows: (id, parent, notused, detail); Postgres rows: (line,)
+    return [r[-1] for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patient", default="default")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for name, query in hot_queries(db, args.patient):
+            print(f"\n== {name}")
+            for line in explain(db, query):
+                print(f"   {line}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
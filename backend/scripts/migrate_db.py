@@ -1,8 +1,9 @@
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import engine, SessionLocal
+from migrate_db import run_migrations
 from sqlalchemy import text
 import logging
 
@@ -12,21 +13,10 @@ logger = logging.getLogger("migration")
 def run_migration():
     logger.info("Starting manual database migration for Multi-Module Domain Support...")
     
-    with engine.connect() as conn:
-        # 1. Add 'domain' to exercise_sessions
-        try:
-            conn.execute(text("ALTER TABLE exercise_sessions ADD COLUMN domain VARCHAR DEFAULT 'BODY'"))
-            logger.info("Added 'domain' column to exercise_sessions.")
-        except Exception as e:
-            logger.info(f"Column 'domain' might already exist or error: {e}")
-
-        # 2. Add 'module' to custom_exercises
-        try:
-            conn.execute(text("ALTER TABLE custom_exercises ADD COLUMN module VARCHAR DEFAULT 'RECONNECT'"))
-            logger.info("Added 'module' column to custom_exercises.")
-        except Exception as e:
-            logger.info(f"Column 'module' might already exist or error: {e}")
+    # 1-2. Schema ('domain', 'module' columns, indexes): versioned runner
+    run_migrations(engine)
 
+    with engine.connect() as conn:
         # 3. Backfill Data
         logger.info("Backfilling exercise_sessions domains...")
         
@@ -0,0 +1,39 @@
+"""
+Rebuilds the daily_activity rollup from completed sessions and their reports.
+
+    python scripts/rebuild_daily_activity.py [--patient PATIENT_ID]
+
+Use after bulk imports, manual data fixes, or a change to how sessions are rolled up.
+Run it while no sessions are ending: it replaces the rows in a single transaction.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+
+from database import SessionLocal, DailyActivity, engine
+from services.activity_rollup import rebuild_daily_activity
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("rebuild")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patient", help="Only rebuild this patient's rows (default: everyone)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    DailyActivity.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_activity(db, patient_id=args.patient, batch_size=args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"daily_activity: {rows} rows{' for ' + args.patient if args.patient else ''}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import datetime
+from sqlalchemy import select, delete, func, text, bindparam, Date, DateTime
+try:
+    from database import DailyActivity, ExerciseSession, SessionReport
+except ImportError:
+    from backend.database import DailyActivity, ExerciseSession, SessionReport
+try:
+    from services.session_summary import summarize_report
+except ImportError:
+    from backend.services.session_summary import summarize_report
+try:
+    from services.data_versions import bump_versions_sync
+except ImportError:
+    from backend.services.data_versions import bump_versions_sync
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+
+# daily_activity holds one row per (patient, date, domain, exercise) with additive counters,
+# so a completed session is a single upsert and trends read a few rows per day.
+# Range of motion comes from the report chart (the sampled joint-angle trajectory);
+# FACE charts plot expression confidence, not an angle.
+ROM_DOMAINS = {"BODY", "HAND"}
+COUNTERS = ("sessions", "reps", "duration_seconds", "rom_sessions", "rom_total", "safety_events")
+
+# Single-statement upsert: counters add, rom_best keeps the max (NULL-safe on both dialects)
+_UPSERT_SQL = """
+    INSERT INTO daily_activity (patient_id, date, domain, exercise_id, exercise_name, sessions, reps,
+                                duration_seconds, rom_sessions, rom_total, rom_best, safety_events, updated_at)
+    VALUES (:patient_id, :date, :domain, :exercise_id, :exercise_name, :sessions, :reps,
+            :duration_seconds, :rom_sessions, :rom_total, :rom_best, :safety_events, :updated_at)
+    ON CONFLICT (patient_id, date, domain, exercise_id) DO UPDATE SET
+        exercise_name = COALESCE(excluded.exercise_name, daily_activity.exercise_name),
+        sessions = daily_activity.sessions + excluded.sessions,
+        reps = daily_activity.reps + excluded.reps,
+        duration_seconds = daily_activity.duration_seconds + excluded.duration_seconds,
+        rom_sessions = daily_activity.rom_sessions + excluded.rom_sessions,
+        rom_total = daily_activity.rom_total + excluded.rom_total,
+        rom_best = {greatest}(COALESCE(daily_activity.rom_best, excluded.rom_best),
+                              COALESCE(excluded.rom_best, daily_activity.rom_best)),
+        safety_events = daily_activity.safety_events + excluded.safety_events,
+        updated_at = excluded.updated_at
+"""
+_UPSERT_BY_DIALECT = {
+    "postgresql": _UPSERT_SQL.format(greatest="GREATEST"),
+    "sqlite": _UPSERT_SQL.format(greatest="MAX"),
+}
+
+
+def _range_of_motion(report_json, domain: str):
+    """Degrees between the lowest and highest point of the report's trajectory chart, or None."""
+    if domain not in ROM_DOMAINS or not isinstance(report_json, dict):
+        return None
+    chart = report_json.get("chart_config") or {}
+    values = [point.get("y") for point in chart.get("data") or [] if isinstance(point, dict)]
+    values = [float(v) for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if len(values) < 2:
+        return None
+    return round(max(values) - min(values), 1)
+
+
+def activity_facts(exercise_session, summary: dict, report_json=None) -> dict:
+    """
+    One completed session as daily_activity increments.
+    `summary` is summarize_report() of its report (reps, duration, safety flags).
+    """
+    start = exercise_session.start_time or datetime.datetime.utcnow()
+    domain = exercise_session.domain or "BODY"
+    rom = _range_of_motion(report_json, domain)
+    return {
+        "patient_id": exercise_session.patient_id,
+        "date": start.date(),
+        "domain": domain,
+        "exercise_id": exercise_session.exercise_id or "unknown",
+        "exercise_name": exercise_session.exercise_name,
+        "sessions": 1,
+        "reps": summary.get("rep_count") or 0,
+        "duration_seconds": summary.get("duration_seconds") or 0,
+        "rom_sessions": 1 if rom is not None else 0,
+        "rom_total": rom or 0.0,
+        "rom_best": rom,
+        "safety_events": summary.get("safety_flag_count") or 0,
+    }
+
+
+def _merge(row, facts: dict):
+    for field in COUNTERS:
+        setattr(row, field, (getattr(row, field) or 0) + facts[field])
+    if facts["rom_best"] is not None:
+        row.rom_best = max(row.rom_best or 0, facts["rom_best"])
+    row.exercise_name = facts["exercise_name"] or row.exercise_name
+    row.updated_at = datetime.datetime.utcnow()
+
+
+def _key_filter(facts: dict):
+    return (
+        DailyActivity.patient_id == facts["patient_id"], DailyActivity.date == facts["date"],
+        DailyActivity.domain == facts["domain"], DailyActivity.exercise_id == facts["exercise_id"],
+    )
+
+
+async def record_session_activity(db, facts: dict):
+    """Adds one completed session to its daily_activity row (AsyncSession; the caller commits)."""
+    sql = _UPSERT_BY_DIALECT.get(db.bind.dialect.name)
+    if sql:
+        stmt = text(sql).bindparams(bindparam("date", type_=Date), bindparam("updated_at", type_=DateTime))
+        await db.execute(stmt, {**facts, "updated_at": datetime.datetime.utcnow()})
+        return
+
+    # Other dialects: row lock + read-modify-write
+    row = (await db.execute(select(DailyActivity).where(*_key_filter(facts)).with_for_update())).scalar_one_or_none()
+    if row is None:
+        db.add(DailyActivity(**facts))
+    else:
+        _merge(row, facts)
+
+
+def rebuild_daily_activity(db, patient_id: str = None, batch_size: int = 1000) -> int:
+    """
+    Recomputes daily_activity from completed sessions and their reports, for one patient
+    or everyone (sync Session). Replaces the rows in one transaction; returns the row count.
+    Sessions completing while it runs may be missed: run it when the clinic is idle.
+    """
+    rows = {}
+    last_id, scanned = 0, 0
+    while True:
+        query = select(ExerciseSession).where(ExerciseSession.status == "completed", ExerciseSession.id > last_id)
+        if patient_id:
+            query = query.where(ExerciseSession.patient_id == patient_id)
+        sessions = db.execute(query.order_by(ExerciseSession.id).limit(batch_size)).scalars().all()
+        if not sessions:
+            break
+
+        # Latest report per session (the one /session/end stored)
+        reports = {}
+        for r in db.execute(
+            select(SessionReport.session_id, SessionReport.patient_id, SessionReport.report_json,
+                   SessionReport.clinical_notes)
+            .where(SessionReport.session_id.in_([s.session_uuid for s in sessions]))
+            .order_by(SessionReport.id)
+        ):
+            reports[(r.patient_id, r.session_id)] = r
+
+        for s in sessions:
+            report = reports.get((s.patient_id, s.session_uuid))
+            report_json = report.report_json if report else {}
+            summary = summarize_report(report_json, report.clinical_notes if report else [], s)
+            facts = activity_facts(s, summary, report_json)
+            key = (facts["patient_id"], facts["date"], facts["domain"], facts["exercise_id"])
+            if key in rows:
+                _merge(rows[key], facts)
+            else:
+                rows[key] = DailyActivity(**facts, updated_at=datetime.datetime.utcnow())
+
+        last_id = sessions[-1].id
+        scanned += len(sessions)
+        db.expunge_all() # Keep memory flat: only the rollup rows are kept
+        logger.info(f"[DailyActivity] Scanned {scanned} sessions...")
+
+    try:
+        stale = delete(DailyActivity)
+        if patient_id:
+            stale = stale.where(DailyActivity.patient_id == patient_id)
+            affected = {patient_id}
+        else:
+            affected = set(db.execute(select(DailyActivity.patient_id).distinct()).scalars())
+        db.execute(stale)
+        # Bulk delete skips the after_flush version hook: patients left with no rows would keep their ETags
+        bump_versions_sync(db, "sessions", affected)
+        db.add_all(rows.values())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"[DailyActivity] Rebuilt {len(rows)} rows from {scanned} sessions.")
+    return len(rows)
+
+
+def _period_starts(period: str, count: int, today: datetime.date) -> list:
+    """First day of each of the last `count` weeks (Monday) or months, oldest first."""
+    if period == "week":
+        current = today - datetime.timedelta(days=today.weekday())
+        return [current - datetime.timedelta(weeks=i) for i in reversed(range(count))]
+    starts, month = [], today.replace(day=1)
+    for _ in range(count):
+        starts.append(month)
+        month = (month - datetime.timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+async def activity_trends(db, patient_id: str, period: str = "week", count: int = 12,
+                          domain: str = None, exercise_id: str = None) -> list:
+    """
+    Totals per week or month from daily_activity (AsyncSession). Reads at most one
+    grouped row per day in range, however many sessions the patient has.
+    """
+    starts = _period_starts(period, count, datetime.datetime.utcnow().date())
+    query = select(
+        DailyActivity.date,
+        func.sum(DailyActivity.sessions).label("sessions"),
+        func.sum(DailyActivity.reps).label("reps"),
+        func.sum(DailyActivity.duration_seconds).label("duration_seconds"),
+        func.sum(DailyActivity.rom_sessions).label("rom_sessions"),
+        func.sum(DailyActivity.rom_total).label("rom_total"),
+        func.max(DailyActivity.rom_best).label("rom_best"),
+        func.sum(DailyActivity.safety_events).label("safety_events"),
+    ).where(DailyActivity.patient_id == patient_id, DailyActivity.date >= starts[0])
+    if domain:
+        query = query.where(DailyActivity.domain == domain)
+    if exercise_id:
+        query = query.where(DailyActivity.exercise_id == exercise_id)
+    days = (await db.execute(query.group_by(DailyActivity.date))).all()
+
+    buckets = {start: {"sessions": 0, "reps": 0, "duration_seconds": 0, "rom_sessions": 0, "rom_total": 0.0,
+                       "rom_best": None, "safety_events": 0, "active_days": 0} for start in starts}
+    for day in days:
+        start = day.date - datetime.timedelta(days=day.date.weekday()) if period == "week" else day.date.replace(day=1)
+        bucket = buckets.get(start)
+        if bucket is None:
+            continue
+        for field in COUNTERS:
+            bucket[field] += getattr(day, field) or 0
+        if day.rom_best is not None:
+            bucket["rom_best"] = max(bucket["rom_best"] or 0, day.rom_best)
+        bucket["active_days"] += 1
+
+    trends = []
+    for start, bucket in buckets.items():
+        rom_sessions, rom_total = bucket.pop("rom_sessions"), bucket.pop("rom_total")
+        trends.append({
+            "period_start": start.isoformat(),
+            **bucket,
+            "rom_avg": round(rom_total / rom_sessions, 1) if rom_sessions else None,
+        })
+    return trends
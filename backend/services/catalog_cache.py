@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+try:
+    from services.data_versions import data_version, data_version_sync
+except ImportError:
+    from backend.services.data_versions import data_version, data_version_sync
+try:
+    from config import CATALOG_CACHE_MAX_ENTRIES
+except ImportError:
+    from backend.config import CATALOG_CACHE_MAX_ENTRIES
+
+
+class CatalogCache:
+    """
+    Per-worker LRU of built catalog lists (standard + custom entries), keyed by
+    (patient_id, view) and tagged with the patient's "catalog" data version.
+
+    The version row is bumped in the same transaction as every CustomExercise write,
+    by any worker, so it doubles as the cross-worker invalidation signal: an entry is
+    only served while its tag matches the version read for this request. Writes in this
+    worker also drop the patient's entries right away (invalidate()).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (patient_id, view) -> (version, items)
+        self._lock = threading.Lock() # The planner reads it from worker threads
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, patient_id: str, view: str, version: int):
+        key = (patient_id, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] != version:
+                # Another worker (or a script) changed the catalog since this was built
+                del self._entries[key]
+                self._stats["stale"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return list(entry[1]) # Callers may append; the cached list stays intact
+
+    def put(self, patient_id: str, view: str, version: int, items: list):
+        with self._lock:
+            self._entries[(patient_id, view)] = (version, list(items))
+            self._entries.move_to_end((patient_id, view))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, patient_id: str):
+        """Drops every view of the patient's catalog (call after committing a write)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == patient_id]:
+                del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["stale"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+            }
+
+
+catalog_cache = CatalogCache(CATALOG_CACHE_MAX_ENTRIES)
+
+
+async def cached_catalog(db, patient_id: str, view: str, load, version: int = None) -> list:
+    """
+    The `view` list for the patient, built by `await load()` on a miss (AsyncSession).
+    Pass `version` when the handler already read it (e.g. for its ETag).
+    """
+    if version is None:
+        version = await data_version(db, "catalog", patient_id)
+    items = catalog_cache.get(patient_id, view, version)
+    if items is None:
+        items = await load()
+        # Tagged with the version read before loading: a concurrent write can only make it older
+        catalog_cache.put(patient_id, view, version, items)
+    return items
+
+
+def cached_catalog_sync(db, patient_id: str, view: str, load) -> list:
+    """cached_catalog for a sync Session; `load()` is a plain function."""
+    version = data_version_sync(db, "catalog", patient_id)
+    items = catalog_cache.get(patient_id, view, version)
+    if items is None:
+        items = load()
+        catalog_cache.put(patient_id, view, version, items)
+    return items
@@ -0,0 +1,76 @@
+from itertools import chain
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+try:
+    from database import DataVersion, CustomExercise, SessionReport, ExerciseSession, DailyActivity, DailyPlan, DEFAULT_PATIENT_ID
+except ImportError:
+    from backend.database import DataVersion, CustomExercise, SessionReport, ExerciseSession, DailyActivity, DailyPlan, DEFAULT_PATIENT_ID
+
+# Which tables feed which read models. Any ORM insert/update/delete of these rows bumps
+# (scope, patient_id) in the same transaction, from any worker, thread or script, so
+# readers can tell "nothing changed" with one primary-key lookup.
+SCOPES = {
+    "catalog": (CustomExercise,), # drills, emotions, custom exercises
+    "sessions": (SessionReport, ExerciseSession, DailyActivity), # history lists, trends
+    "plan": (DailyPlan,), # daily plan + completion
+}
+_SCOPE_BY_MODEL = {model: scope for scope, models in SCOPES.items() for model in models}
+
+_BUMP_SQL = """
+    INSERT INTO data_versions (scope, patient_id, version) VALUES (:scope, :patient_id, 1)
+    ON CONFLICT (scope, patient_id) DO UPDATE SET version = data_versions.version + 1
+"""
+
+
+def _bump(connection, keys):
+    # Sorted: concurrent writers take the version row locks in the same order
+    for scope, patient_id in sorted(keys):
+        params = {"scope": scope, "patient_id": patient_id}
+        if connection.dialect.name in ("postgresql", "sqlite"):
+            connection.execute(text(_BUMP_SQL), params)
+            continue
+        updated = connection.execute(text(
+            "UPDATE data_versions SET version = version + 1 WHERE scope = :scope AND patient_id = :patient_id"
+        ), params)
+        if not updated.rowcount:
+            connection.execute(text(
+                "INSERT INTO data_versions (scope, patient_id, version) VALUES (:scope, :patient_id, 1)"
+            ), params)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session, flush_context):
+    """Registered for every Session (AsyncSession runs one underneath) once this module is imported."""
+    keys = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        scope = _SCOPE_BY_MODEL.get(type(obj))
+        if scope and (obj not in session.dirty or session.is_modified(obj)):
+            keys.add((scope, obj.patient_id or DEFAULT_PATIENT_ID))
+    if keys:
+        _bump(session.connection(), keys)
+
+
+def bump_versions_sync(db, scope: str, patient_ids):
+    """bump_version for a sync Session and several patients (bulk deletes); the caller commits."""
+    keys = {(scope, patient_id or DEFAULT_PATIENT_ID) for patient_id in patient_ids}
+    if keys:
+        _bump(db.connection(), keys)
+
+
+async def bump_version(db, scope: str, patient_id: str):
+    """For writes that bypass the ORM (raw SQL updates). AsyncSession; the caller commits."""
+    await db.run_sync(lambda session: _bump(session.connection(), {(scope, patient_id)}))
+
+
+def _version_select(scope: str, patient_id: str):
+    return select(DataVersion.version).where(DataVersion.scope == scope, DataVersion.patient_id == patient_id)
+
+
+async def data_version(db, scope: str, patient_id: str) -> int:
+    """Current version of `scope` for the patient (0 = never written). AsyncSession."""
+    return (await db.execute(_version_select(scope, patient_id))).scalar_one_or_none() or 0
+
+
+def data_version_sync(db, scope: str, patient_id: str) -> int:
+    """data_version for a sync Session (worker threads, scripts)."""
+    return db.execute(_version_select(scope, patient_id)).scalar_one_or_none() or 0
@@ -1,18 +1,23 @@
 
 import logging
+import hashlib
 import json
-import os
-try:
-    from google import genai
-    from google.genai import types
-except ImportError:
-    import google.generativeai as genai 
-
-from config import GEMINI_API_KEY
+import time
+from google.genai import types
+
+from services.genai_client import genai_provider
+from services.gemini_scheduler import scheduler, Priority
+from services.usage_tracker import usage_tracker
+from services.schema_cache import schema_cache
+from services.exercise_templates import template_matcher
+from config import EXERCISE_TEMPLATES_ENABLED
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
+GENERATOR_MODEL = "gemini-3-flash-preview"
+GENERATOR_TEMPERATURE = 0.2
+
 # --- SCHEMA DEFINITION ---
 # strict JSON schema for the Universal Physics Engine
 EXERCISE_SCHEMA = """
@@ -87,6 +92,9 @@ Output:
 }}
 """
 
+# Cache entries are keyed on this: editing the prompt or temperature invalidates them
+PROMPT_VERSION = hashlib.sha256(f"{SYSTEM_INSTRUCTION}|{GENERATOR_TEMPERATURE}".encode()).hexdigest()[:12]
+
 def validate_schema(schema: dict) -> dict:
     """
     Sanitizes and validates the generated schema.
@@ -118,25 +126,43 @@ def validate_schema(schema: dict) -> dict:
 async def generate_exercise_schema(description: str) -> dict:
     """
     Generates an exercise schema from a description using Gemini.
+    Standard movements are built instantly from a local template; otherwise served
+    from the schema cache when an equivalent description was generated before.
     """
-    if not GEMINI_API_KEY:
+    if EXERCISE_TEMPLATES_ENABLED:
+        schema = template_matcher.match(description)
+        if schema:
+            logger.info(f"Exercise template hit for: {description}")
+            return validate_schema(schema)
+
+    if not genai_provider.available:
         raise ValueError("GEMINI_API_KEY is not set")
 
+    return await schema_cache.get_or_generate(
+        description, GENERATOR_MODEL, PROMPT_VERSION,
+        lambda: _generate_uncached(description),
+    )
+
+async def _generate_uncached(description: str) -> dict:
     try:
-        # Initialize Client
-        client = genai.Client(api_key=GEMINI_API_KEY, http_options={'api_version': 'v1alpha'})
+        # Shared, pooled client (no per-call connection setup)
+        client = genai_provider.client
         
         logger.info(f"Generating exercise for: {description}")
         
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=[description],
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_INSTRUCTION,
-                temperature=0.2,
-                response_mime_type="application/json"
+        async with scheduler.slot(Priority.INTERACTIVE):
+            started = time.time()
+            response = await client.aio.models.generate_content(
+                model=GENERATOR_MODEL,
+                contents=[description],
+                config=types.GenerateContentConfig(
+                    system_instruction=SYSTEM_INSTRUCTION,
+                    temperature=GENERATOR_TEMPERATURE,
+                    response_mime_type="application/json"
+                )
             )
-        )
+        usage_tracker.record("generator", usage=response.usage_metadata, started=started,
+                             mode="GENERATOR", model=GENERATOR_MODEL)
 
         # Parse JSON
         result_json = json.loads(response.text)
@@ -0,0 +1,238 @@
+import re
+import time
+from collections import deque
+try:
+    from services.schema_cache import normalize_description
+except ImportError:
+    from backend.services.schema_cache import normalize_description
+
+# Each template is one cyclic movement on a single joint angle:
+#   joint      -> landmark triple (without side prefix), angle measured at the middle point
+#   rest/peak  -> (op, default target) for the start and action stages
+#   aliases    -> normalized phrases; every word of an alias must appear in the description
+# All metrics use BODY landmark names / ANGLE, the only ones UniversalPhysicsEngine resolves by name.
+TEMPLATES = {
+    "bicep_curl": {
+        "name": "Bicep Curl", "metric": "elbow_angle", "joint": ("SHOULDER", "ELBOW", "WRIST"),
+        "rest": ("GT", 160), "peak": ("LT", 45),
+        "stages": ("Start (Extension)", "Curl (Flexion)"),
+        "aliases": ["bicep curl", "biceps curl", "arm curl", "elbow flexion", "hammer curl"],
+    },
+    "elbow_extension": {
+        "name": "Elbow Extension", "metric": "elbow_angle", "joint": ("SHOULDER", "ELBOW", "WRIST"),
+        "rest": ("LT", 90), "peak": ("GT", 160),
+        "stages": ("Start (Bent)", "Extend (Straight Arm)"),
+        "aliases": ["elbow extension", "tricep extension", "triceps extension", "tricep kickback"],
+    },
+    "shoulder_abduction": {
+        "name": "Shoulder Abduction", "metric": "shoulder_angle", "joint": ("HIP", "SHOULDER", "ELBOW"),
+        "rest": ("LT", 30), "peak": ("GT", 90),
+        "stages": ("Start (Arm at Side)", "Raise (Abduction)"),
+        "aliases": ["shoulder abduction", "lateral raise", "side raise", "arm abduction"],
+    },
+    "shoulder_flexion": {
+        "name": "Shoulder Flexion", "metric": "shoulder_angle", "joint": ("HIP", "SHOULDER", "ELBOW"),
+        "rest": ("LT", 30), "peak": ("GT", 150),
+        "stages": ("Start (Arm at Side)", "Raise (Flexion)"),
+        "aliases": ["shoulder flexion", "front raise", "forward raise", "arm raise", "overhead reach"],
+    },
+    "shoulder_press": {
+        "name": "Shoulder Press", "metric": "elbow_angle", "joint": ("SHOULDER", "ELBOW", "WRIST"),
+        "rest": ("LT", 100), "peak": ("GT", 160),
+        "stages": ("Start (Hands at Shoulders)", "Press (Arms Overhead)"),
+        "aliases": ["shoulder press", "overhead press", "military press"],
+    },
+    "wall_slide": {
+        "name": "Wall Slide", "metric": "shoulder_angle", "joint": ("HIP", "SHOULDER", "ELBOW"),
+        "rest": ("LT", 100), "peak": ("GT", 150),
+        "stages": ("Start (W Position)", "Slide Up (Y Position)"),
+        "aliases": ["wall slide", "wall angel"],
+    },
+    "external_rotation": {
+        "name": "Shoulder External Rotation", "metric": "forearm_angle", "joint": ("HIP", "ELBOW", "WRIST"),
+        "rest": ("LT", 45), "peak": ("GT", 80),
+        "stages": ("Start (Forearm Forward)", "Rotate Out"),
+        "aliases": ["external rotation", "shoulder rotation", "outward rotation", "rotator cuff"],
+    },
+    "squat": {
+        "name": "Squat", "metric": "knee_angle", "joint": ("HIP", "KNEE", "ANKLE"),
+        "rest": ("GT", 160), "peak": ("LT", 100),
+        "stages": ("Start (Standing)", "Squat (Knees Bent)"),
+        "aliases": ["squat", "sit to stand", "chair stand", "mini squat"],
+    },
+    "lunge": {
+        "name": "Lunge", "metric": "knee_angle", "joint": ("HIP", "KNEE", "ANKLE"),
+        "rest": ("GT", 160), "peak": ("LT", 100),
+        "stages": ("Start (Standing)", "Lunge (Front Knee Bent)"),
+        "aliases": ["lunge", "split squat"],
+    },
+    "knee_extension": {
+        "name": "Knee Extension", "metric": "knee_angle", "joint": ("HIP", "KNEE", "ANKLE"),
+        "rest": ("LT", 100), "peak": ("GT", 160),
+        "stages": ("Start (Knee Bent)", "Extend (Leg Straight)"),
+        "aliases": ["knee extension", "leg extension", "seated leg raise", "long arc quad"],
+    },
+    "hip_flexion": {
+        "name": "Hip Flexion", "metric": "hip_angle", "joint": ("SHOULDER", "HIP", "KNEE"),
+        "rest": ("GT", 160), "peak": ("LT", 110),
+        "stages": ("Start (Standing)", "Knee Up (Flexion)"),
+        "aliases": ["hip flexion", "knee raise", "high knee", "marching", "march in place"],
+    },
+    "hip_abduction": {
+        "name": "Hip Abduction", "metric": "hip_angle", "joint": ("SHOULDER", "HIP", "KNEE"),
+        "rest": ("GT", 170), "peak": ("LT", 150),
+        "stages": ("Start (Standing)", "Leg Out (Abduction)"),
+        "aliases": ["hip abduction", "side leg raise", "lateral leg raise", "leg abduction"],
+    },
+    "calf_raise": {
+        "name": "Calf Raise", "metric": "ankle_angle", "joint": ("KNEE", "ANKLE", "FOOT_INDEX"),
+        "rest": ("LT", 120), "peak": ("GT", 140),
+        "stages": ("Start (Heels Down)", "Rise (On Toes)"),
+        "aliases": ["calf raise", "heel raise", "toe raise", "ankle plantarflexion"],
+    },
+}
+
+DEFAULT_HOLD = 0.5
+DEFAULT_TOLERANCE = 10
+# GT/LT conditions ignore tolerance, so the peak must sit this far past the rest target or the
+# two stages overlap (the built-in hip abduction / calf raise ranges are exactly this wide)
+MIN_RANGE = 2 * DEFAULT_TOLERANCE
+
+# Pre-split aliases once: (template_id, alias word set)
+_ALIASES = [(tid, set(alias.split()))
+            for tid, t in TEMPLATES.items() for alias in (normalize_description(a) for a in t["aliases"])]
+
+_ANGLE_RE = re.compile(r"(\d{1,3})\s*(?:°|deg\b|degs\b|degrees?\b)")
+_TO_ANGLE_RE = re.compile(r"\bto\s+(\d{1,3})\s*(?:°|deg\b|degs\b|degrees?\b)")
+_HOLD_RE = re.compile(r"hold(?:ing)?\s*(?:for\s*)?(\d+(?:\.\d+)?)\s*(?:s\b|sec|second)|(\d+(?:\.\d+)?)\s*(?:s|sec|second)s?\s*hold")
+
+
+# Returned by the parsers when the description can't be mapped onto one template instance
+_UNPARSEABLE = object()
+
+
+def _parse_side(text: str):
+    words = set(re.findall(r"[a-z]+", text))
+    # One side at a time needs a stage per side; the combined schema would wait for both arms
+    if words & {"alternating", "alternate"}:
+        return _UNPARSEABLE
+    if words & {"both", "bilateral"}:
+        return ["LEFT", "RIGHT"]
+    if "right" in words:
+        return ["RIGHT"]
+    return ["LEFT"]
+
+
+def _parse_angle(text: str):
+    """The peak angle: the only one given, or the "to N degrees" end of a range. None for the default."""
+    values = _ANGLE_RE.findall(text)
+    if len(values) > 1:
+        values = _TO_ANGLE_RE.findall(text)
+        if len(values) != 1:
+            return _UNPARSEABLE
+    if values:
+        value = int(values[0])
+        if 0 < value <= 180:
+            return value
+    return None
+
+
+def _parse_hold(text: str):
+    match = _HOLD_RE.search(text)
+    if match:
+        return min(float(match.group(1) or match.group(2)), 30.0)
+    return None
+
+
+def _identify(description: str):
+    words = set(normalize_description(description).split())
+    hits = [(tid, alias_words) for tid, alias_words in _ALIASES if alias_words <= words]
+    # A longer alias wins over the shorter one it contains ("split squat" over "squat")
+    matched = {tid for tid, alias_words in hits
+               if not any(alias_words < other for _, other in hits)}
+    # Compound requests ("squat then curl") are left to the LLM
+    if len(matched) != 1:
+        return None
+    return matched.pop()
+
+
+def build_schema(template_id: str, sides: list, peak_target=None, hold_time=None) -> dict:
+    """Instantiates a template as an EXERCISE_SCHEMA dict, or None if the peak target overlaps the rest position."""
+    t = TEMPLATES[template_id]
+    peak_op, default_peak = t["peak"]
+    rest_op, rest_target = t["rest"]
+    peak_target = peak_target or default_peak
+    travel = peak_target - rest_target if peak_op == "GT" else rest_target - peak_target
+    if travel < MIN_RANGE:
+        return None
+
+    metrics = {}
+    rest_conditions, peak_conditions = [], []
+    for side in sides:
+        key = t["metric"] if len(sides) == 1 else f"{side.lower()}_{t['metric']}"
+        metrics[key] = {"type": "ANGLE", "points": [f"{side}_{p}" for p in t["joint"]]}
+        rest_conditions.append({"metric": key, "op": rest_op, "target": rest_target, "tolerance": DEFAULT_TOLERANCE})
+        peak_conditions.append({"metric": key, "op": peak_op, "target": peak_target, "tolerance": DEFAULT_TOLERANCE})
+    # Stability (secondary) metric, as the generator prompt requires
+    metrics["torso_vertical"] = {"type": "VERTICAL_DIFF", "points": [f"{sides[0]}_SHOULDER", f"{sides[0]}_HIP"]}
+
+    side_label = "" if len(sides) > 1 else f" ({sides[0].title()})"
+    rest_name, peak_name = t["stages"]
+    return {
+        "name": f"{t['name']}{side_label}",
+        "domain": "BODY",
+        "metrics": metrics,
+        "relevant_landmarks": [],
+        "stages": [
+            {"name": rest_name, "description": "Return to the start position.",
+             "conditions": rest_conditions, "hold_time": DEFAULT_HOLD},
+            {"name": peak_name, "description": f"Reach {peak_target} degrees and hold.",
+             "conditions": peak_conditions, "hold_time": hold_time if hold_time is not None else DEFAULT_HOLD},
+        ],
+    }
+
+
+class TemplateMatcher:
+    """Matches descriptions of standard movements to a local template; tracks match rate and latency."""
+
+    def __init__(self, latency_window: int = 1000):
+        self.matches = 0
+        self.misses = 0
+        self.by_template = {}
+        self._latencies_us = deque(maxlen=latency_window)
+
+    def match(self, description: str):
+        """Returns a schema for a recognized movement, or None (caller falls back to the LLM)."""
+        started = time.perf_counter()
+        template_id = _identify(description)
+        schema = None
+        if template_id:
+            text = description.lower()
+            sides, peak_target = _parse_side(text), _parse_angle(text)
+            if sides is not _UNPARSEABLE and peak_target is not _UNPARSEABLE:
+                schema = build_schema(template_id, sides, peak_target, _parse_hold(text))
+        if schema:
+            self.matches += 1
+            self.by_template[template_id] = self.by_template.get(template_id, 0) + 1
+        else:
+            self.misses += 1
+        self._latencies_us.append((time.perf_counter() - started) * 1e6)
+        return schema
+
+    def stats(self) -> dict:
+        total = self.matches + self.misses
+        lat = sorted(self._latencies_us)
+        return {
+            "matches": self.matches,
+            "misses": self.misses,
+            "match_rate": round(self.matches / total, 3) if total else None,
+            "by_template": self.by_template,
+            "latency_us": {
+                "p50": round(lat[len(lat) // 2], 1) if lat else None,
+                "p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 1) if lat else None,
+                "max": round(lat[-1], 1) if lat else None,
+            },
+        }
+
+
+template_matcher = TemplateMatcher()
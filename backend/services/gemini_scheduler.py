@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import GEMINI_MAX_CONCURRENCY, GEMINI_RATE_PER_SEC, GEMINI_BURST
+except ImportError:
+    from backend.config import GEMINI_MAX_CONCURRENCY, GEMINI_RATE_PER_SEC, GEMINI_BURST
+
+
+class Priority(IntEnum):
+    """Lower value = served first."""
+    INTERACTIVE = 0 # User is waiting: finalize, exercise generation, analyze
+    PLAN = 1        # Daily plan generation
+    BACKGROUND = 2  # Chunk ingest, speculative drafts, compaction
+
+
+class GeminiScheduler:
+    """
+    Process-wide gate for Gemini REST calls.
+    - Concurrency cap: at most `max_concurrency` calls in flight.
+    - Token bucket: `rate_per_sec` sustained, `burst` back-to-back.
+    - Strict priority: a waiting INTERACTIVE call is always admitted before PLAN/BACKGROUND.
+
+    Usage:
+        async with scheduler.slot(Priority.INTERACTIVE):
+            response = await client.aio.models.generate_content(...)
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_sec: float, burst: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(1, burst)
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._active = 0
+        self._waiters = [] # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+        # Queue wait samples per class (seconds)
+        self._waits = {p: deque(maxlen=1000) for p in Priority}
+        self._requests = {p: 0 for p in Priority}
+
+    # --- TOKEN BUCKET ---
+
+    def _take_token(self) -> float:
+        """Consumes a token. Returns 0 on success, else seconds until one is available."""
+        if self.rate_per_sec <= 0:
+            return 0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_sec)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate_per_sec
+
+    def _arm_timer(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    # --- ADMISSION ---
+
+    def _dispatch(self):
+        while self._waiters and self._active < self.max_concurrency:
+            fut = self._waiters[0][2]
+            if fut.done(): # Cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._take_token()
+            if delay > 0:
+                self._arm_timer(delay)
+                return
+            heapq.heappop(self._waiters)
+            self._active += 1
+            fut.set_result(None)
+
+    async def acquire(self, priority: Priority):
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        enqueued = time.monotonic()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Admitted in the same tick we were cancelled: hand the slot back
+                self.release()
+            raise
+
+        wait = time.monotonic() - enqueued
+        self._waits[priority].append(wait)
+        self._requests[priority] += 1
+        if wait > 5:
+            logger.warning(f"[GeminiScheduler] {priority.name} call waited {wait:.2f}s for a slot")
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # --- METRICS ---
+
+    def stats(self) -> dict:
+        queued = {p: 0 for p in Priority}
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                queued[Priority(priority)] += 1
+
+        classes = {}
+        for p in Priority:
+            waits = sorted(self._waits[p])
+            def pct(q):
+                return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else 0.0
+            classes[p.name] = {
+                "requests": self._requests[p],
+                "queued": queued[p],
+                "wait_ms_p50": pct(0.50),
+                "wait_ms_p95": pct(0.95),
+                "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_sec": self.rate_per_sec,
+            "tokens_available": round(self._tokens, 2),
+            "classes": classes,
+        }
+
+
+# Shared by every Gemini REST caller in the process
+scheduler = GeminiScheduler(GEMINI_MAX_CONCURRENCY, GEMINI_RATE_PER_SEC, GEMINI_BURST)
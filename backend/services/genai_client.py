@@ -0,0 +1,80 @@
+import time
+import httpx
+from google import genai
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import (
+        GEMINI_API_KEY, GENAI_MAX_CONNECTIONS, GENAI_MAX_KEEPALIVE_CONNECTIONS,
+        GENAI_KEEPALIVE_EXPIRY_SECONDS, GENAI_HTTP_TIMEOUT_SECONDS,
+    )
+except ImportError:
+    from backend.config import (
+        GEMINI_API_KEY, GENAI_MAX_CONNECTIONS, GENAI_MAX_KEEPALIVE_CONNECTIONS,
+        GENAI_KEEPALIVE_EXPIRY_SECONDS, GENAI_HTTP_TIMEOUT_SECONDS,
+    )
+
+
+class GenAIClientProvider:
+    """
+    One process-wide genai.Client backed by pooled keep-alive HTTP connections.
+    Started/closed by the FastAPI lifespan; services read `.client` at call time.
+    Outside the app (scripts), the client is created lazily on first use.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+        self._http = None
+        self._async_http = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self.start()
+        return self._client
+
+    def start(self):
+        if self._client is not None or not self.available:
+            return
+        started = time.perf_counter()
+        limits = httpx.Limits(
+            max_connections=GENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=GENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GENAI_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        timeout = httpx.Timeout(GENAI_HTTP_TIMEOUT_SECONDS, connect=10.0)
+        # We own these pools (the SDK leaves caller-supplied clients open), so close() must release them
+        self._http = httpx.Client(limits=limits, timeout=timeout)
+        self._async_http = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._client = genai.Client(
+            api_key=self.api_key,
+            http_options={
+                "api_version": "v1alpha",
+                "httpx_client": self._http,
+                "httpx_async_client": self._async_http,
+            },
+        )
+        logger.info(f"[GenAI] Shared client ready in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    async def close(self):
+        if self._client is None:
+            return
+        await self._async_http.aclose()
+        self._http.close()
+        self._client = self._http = self._async_http = None
+        logger.info("[GenAI] Shared client closed")
+
+
+genai_provider = GenAIClientProvider(GEMINI_API_KEY)
+
+
+def get_genai_client():
+    """FastAPI dependency: the shared client (None when no API key is configured)."""
+    return genai_provider.client if genai_provider.available else None
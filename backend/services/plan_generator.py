@@ -1,165 +1,322 @@
+import asyncio
 import json
 import os
-from google import genai
 from google.genai import types
+from sqlalchemy import func, exists, select, text, bindparam, Date, JSON
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 try:
-    from database import SessionReport, DailyPlan, CustomExercise, ExerciseSession
+    from database import SessionLocal, SessionReport, DailyPlan, DailyActivity, CustomExercise, ExerciseSession, DEFAULT_PATIENT_ID
 except ImportError:
-    from backend.database import SessionReport, DailyPlan, CustomExercise, ExerciseSession
+    from backend.database import SessionLocal, SessionReport, DailyPlan, DailyActivity, CustomExercise, ExerciseSession, DEFAULT_PATIENT_ID
 try:
     from utils.logging import logger
 except ImportError:
     from backend.utils.logging import logger
+try:
+    from services.gemini_scheduler import scheduler, Priority
+    from services.usage_tracker import usage_tracker
+except ImportError:
+    from backend.services.gemini_scheduler import scheduler, Priority
+    from backend.services.usage_tracker import usage_tracker
+try:
+    from services.data_versions import bump_version
+    from services.catalog_cache import cached_catalog_sync
+except ImportError:
+    from backend.services.data_versions import bump_version
+    from backend.services.catalog_cache import cached_catalog_sync
 import datetime
+import time
+
+# Standard exercises every patient's plan can draw from (custom ones are added per patient)
+STANDARD_MENU = [
+    {"id": "abduction", "name": "Shoulder Abduction", "domain": "BODY"},
+    {"id": "bicep_curl", "name": "Bicep Curls", "domain": "BODY"},
+    {"id": "wall_slide", "name": "Wall Slides", "domain": "BODY"},
+    {"id": "rotation", "name": "External Rotation", "domain": "BODY"},
+]
 
 class PlanGenerator:
-    def __init__(self, api_key: str):
-        self.client = genai.Client(api_key=api_key, http_options={"api_version": "v1alpha"})
+    # In-flight generations keyed by (patient, plan date), shared by every PlanGenerator in
+    # the process so /plan/daily and /reconnect/plan also deduplicate against each other.
+    _inflight = {} # { (patient_id, date): asyncio.Task }
+    # Background precomputes (no fallback routine: they raise when Gemini fails), kept apart
+    # so a live request never inherits their failure.
+    _precomputing = {} # { (patient_id, date): asyncio.Task }
+
+    def __init__(self, client_provider):
+        self.client_provider = client_provider # Shared GenAIClientProvider
+
+    @property
+    def client(self):
+        return self.client_provider.client
+
+    @staticmethod
+    def _with_completion(plan_row: DailyPlan):
+        """Merges completion status into the plan JSON for the frontend."""
+        plan_data = plan_row.plan_json
+        if isinstance(plan_data, str): plan_data = json.loads(plan_data)
+        
+        # Inject completion status
+        # Frontend expects: { ..., routine: [{..., completed: true}] }
+        status = plan_row.completion_status or {}
+        for idx, item in enumerate(plan_data.get("routine", [])):
+            item["completed"] = status.get(str(idx), False)
+        
+        return plan_data
+
+    @staticmethod
+    def _plan_select(patient_id: str, day: datetime.date):
+        return select(DailyPlan).where(DailyPlan.patient_id == patient_id, DailyPlan.date == day)
+
+    async def _load_plan(self, db: AsyncSession, patient_id: str, day: datetime.date):
+        cached_plan = (await db.execute(self._plan_select(patient_id, day))).scalar_one_or_none()
+        return self._with_completion(cached_plan) if cached_plan else None
 
-    def generate_daily_plan(self, db: Session):
+    async def generate_daily_plan(self, db: AsyncSession, patient_id: str = DEFAULT_PATIENT_ID):
         """
-        Get today's plan.
+        Get the patient's plan for today.
         1. Check DB for existing plan for today.
         2. If exists, return it (with completion status).
         3. If not, generate via Gemini, save to DB, and return.
+           Concurrent callers share one in-flight generation (single-flight).
+        The cache read uses the request's AsyncSession; generation runs its DB work in worker threads.
         """
         today = datetime.date.today()
         
         # 1. Check Cache
-        cached_plan = db.query(DailyPlan).filter(DailyPlan.date == today).first()
+        cached_plan = await self._load_plan(db, patient_id, today)
         if cached_plan:
-            # Merge completion status into the plan JSON for the frontend
-            plan_data = cached_plan.plan_json
-            if isinstance(plan_data, str): plan_data = json.loads(plan_data)
-            
-            # Inject completion status
-            # Frontend expects: { ..., routine: [{..., completed: true}] }
-            status = cached_plan.completion_status or {}
-            for idx, item in enumerate(plan_data.get("routine", [])):
-                item["completed"] = status.get(str(idx), False)
-            
-            return plan_data
+            return cached_plan
 
-        # 2. Generate New Plan (Gemini)
-        generated_plan = self._generate_from_gemini(db)
-        
-        # 3. Save to DB
+        # 2. A precompute for today is already running: wait for it, but generate our own if it fails
+        key = (patient_id, today)
+        pending = self._precomputing.get(key)
+        if pending is not None:
+            try:
+                plan = await asyncio.shield(pending)
+                if plan:
+                    return plan
+            except Exception as e:
+                logger.warning(f"Precompute for {patient_id}/{today} failed ({e}); generating now")
+
+        # 3. Generate (or join the generation already running)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create_plan(patient_id, today))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info(f"Joining in-flight plan generation for {patient_id}/{today}")
+
+        # Shield: one caller disconnecting must not cancel the shared generation
+        return await asyncio.shield(task)
+
+    async def precompute_plan(self, patient_id: str, day: datetime.date):
+        """
+        Generates `day`'s plan ahead of time so the first fetch is a cache read.
+        Replaces an earlier precompute for that day as long as nothing in it was completed.
+        Joins an in-flight generation for `day` (live or precompute) instead of starting a second one.
+        """
+        key = (patient_id, day)
+        task = self._inflight.get(key) or self._precomputing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create_plan(patient_id, day, replace=True))
+            self._precomputing[key] = task
+            task.add_done_callback(lambda _: self._precomputing.pop(key, None))
+        return await asyncio.shield(task)
+
+    def plan_status(self, patient_id: str, day: datetime.date):
+        """(created_at or None if there is no plan, has_progress) for the patient's stored plan on `day`."""
+        db = SessionLocal()
+        try:
+            row = db.query(DailyPlan.created_at, DailyPlan.completion_status).filter(
+                DailyPlan.patient_id == patient_id, DailyPlan.date == day
+            ).first()
+            if row is None:
+                return None, False
+            return row.created_at or datetime.datetime.min, bool(row.completion_status)
+        finally:
+            db.close()
+
+    async def _create_plan(self, patient_id: str, day: datetime.date, replace: bool = False):
+        """Generates and stores the patient's plan for `day`, using its own DB session."""
+        def gather():
+            db = SessionLocal()
+            try:
+                return self._get_exercise_menu(db, patient_id), self._get_session_context(db, patient_id)
+            finally:
+                db.close()
+
+        menu, history = await asyncio.to_thread(gather)
+        # Precomputes must not cache the fallback routine: the live request can still retry Gemini
+        generated_plan = await self._generate_from_gemini(menu, history, fallback=not replace)
+        return await asyncio.to_thread(self._save_plan, patient_id, day, generated_plan, replace)
+
+    def _save_plan(self, patient_id: str, day: datetime.date, generated_plan: dict, replace: bool = False):
+        db = SessionLocal()
         try:
+            if replace:
+                existing = db.query(DailyPlan).filter(
+                    DailyPlan.patient_id == patient_id, DailyPlan.date == day
+                ).first()
+                if existing:
+                    if existing.completion_status:
+                        # Patient already started this plan: keep it
+                        return self._with_completion(existing)
+                    existing.plan_json = generated_plan
+                    existing.created_at = datetime.datetime.utcnow()
+                    db.commit()
+                    return generated_plan
+
             new_db_plan = DailyPlan(
-                date=today,
+                patient_id=patient_id,
+                date=day,
                 plan_json=generated_plan,
                 completion_status={}
             )
             db.add(new_db_plan)
             db.commit()
+        except IntegrityError:
+            # Another worker saved today's plan first: serve that one so every client agrees
+            db.rollback()
+            existing = db.execute(self._plan_select(patient_id, day)).scalar_one_or_none()
+            if existing:
+                return self._with_completion(existing)
         except Exception as e:
             logger.error(f"Failed to save generated plan: {e}")
+        finally:
+            db.close()
             
         return generated_plan
 
-    def _get_exercise_menu(self, db: Session):
+    def _get_exercise_menu(self, db: Session, patient_id: str = DEFAULT_PATIENT_ID):
         """
         Returns a list of all available exercises (Hardcoded + Custom).
+        Served from the catalog cache while the patient's catalog version is unchanged.
         """
-        # 1. Hardcoded Defaults
-        menu = [
-            {"id": "abduction", "name": "Shoulder Abduction", "domain": "BODY"},
-            {"id": "bicep_curl", "name": "Bicep Curls", "domain": "BODY"},
-            {"id": "wall_slide", "name": "Wall Slides", "domain": "BODY"},
-            {"id": "rotation", "name": "External Rotation", "domain": "BODY"},
-        ]
-        
-        # 2. Fetch Custom Exercises
-        try:
-            custom_exercises = db.query(CustomExercise).all()
+        def load():
+            # 1. Hardcoded Defaults
+            menu = list(STANDARD_MENU)
+
+            # 2. Fetch Custom Exercises
+            custom_exercises = db.query(CustomExercise).filter(CustomExercise.patient_id == patient_id).all()
             for ex in custom_exercises:
                 menu.append({
                     "id": ex.id,
                     "name": ex.name,
                     "domain": ex.domain
                 })
+            return menu
+
+        try:
+            return cached_catalog_sync(db, patient_id, "menu", load)
         except Exception as e:
             logger.warning(f"Failed to fetch custom exercises: {e}")
-            
-        return menu
+            return list(STANDARD_MENU)
 
-    def _get_session_context(self, db: Session):
+    def _get_session_context(self, db: Session, patient_id: str = DEFAULT_PATIENT_ID):
         """
-        Summarizes the last 7 days of activity.
-        Primary Source: ExerciseSession (Raw Log)
-        Secondary Source: SessionReport (Detailed Analysis) - used if primary is empty.
+        Summarizes the last 7 days of activity as grouped aggregates, computed in SQL.
+        Primary Source: daily_activity rollup -> completed sessions, reps per (date, exercise);
+                        ExerciseSession (Raw Log) -> per (date, exercise, status) for sessions never completed
+        Secondary Source: SessionReport (Detailed Analysis) - used if primary is sparse.
+        Only reports without a matching ExerciseSession are counted (dedup in the query).
         """
-        seven_days_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+        # Whole UTC days for every source: the rollup is keyed by session start date (UTC)
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=7)).date()
+        since_start = datetime.datetime.combine(since, datetime.time.min)
         history = []
         
-        # 1. Fetch from ExerciseSession (Raw)
+        # 1a. Completed volume from the daily_activity rollup (one row per day and exercise)
+        try:
+            rows = db.query(
+                DailyActivity.date, DailyActivity.exercise_id, DailyActivity.sessions, DailyActivity.reps
+            ).filter(
+                DailyActivity.patient_id == patient_id,
+                DailyActivity.date >= since
+            ).all()
+
+            for r in rows:
+                history.append({
+                    "date": str(r.date),
+                    "exercise_id": r.exercise_id,
+                    "source": "daily_activity",
+                    "status": "completed",
+                    "sessions": r.sessions,
+                    "reps": r.reps
+                })
+        except Exception as e:
+            logger.warning(f"Failed to read daily activity: {e}")
+
+        # 1b. Sessions that never completed (abandoned / in progress) are not rolled up: raw log
         try:
-            raw_sessions = db.query(ExerciseSession).filter(
-                ExerciseSession.start_time >= seven_days_ago
-            ).order_by(ExerciseSession.start_time.asc()).all()
+            day = func.date(ExerciseSession.start_time)
+            rows = db.query(
+                day.label("day"),
+                ExerciseSession.exercise_id,
+                ExerciseSession.status,
+                func.count(ExerciseSession.id).label("sessions"),
+                func.coalesce(func.sum(ExerciseSession.metrics["reps"].as_integer()), 0).label("reps"),
+            ).filter(
+                ExerciseSession.patient_id == patient_id,
+                ExerciseSession.start_time >= since_start,
+                ExerciseSession.status != "completed"
+            ).group_by(day, ExerciseSession.exercise_id, ExerciseSession.status).all()
             
-            for s in raw_sessions:
-                # Calculate simple volume if metrics exist
-                reps = s.metrics.get("reps", 0) if s.metrics else 0
+            for r in rows:
                 history.append({
-                    "date": s.start_time.strftime("%Y-%m-%d"),
-                    "exercise_id": s.exercise_id,
+                    "date": str(r.day),
+                    "exercise_id": r.exercise_id,
                     "source": "raw_log",
-                    "status": s.status,
-                    "reps": reps
+                    "status": r.status,
+                    "sessions": r.sessions,
+                    "reps": r.reps
                 })
         except Exception as e:
-            logger.warning(f"Failed to fetch exercise sessions: {e}")
+            logger.warning(f"Failed to aggregate exercise sessions: {e}")
 
-        # 2. Fetch from SessionReport (Analysis) if history is sparse (< 3)
+        # 2. Aggregate SessionReport (Analysis) if history is sparse (< 3)
         if len(history) < 3:
             try:
-                reports = db.query(SessionReport).filter(
-                    SessionReport.timestamp >= seven_days_ago
-                ).order_by(SessionReport.timestamp.asc()).all()
-
-                for r in reports:
-                    # Parse JSON
-                    data = r.report_json if isinstance(r.report_json, dict) else json.loads(r.report_json)
-                    
-                    # Extract Activity Name from various paths
-                    activity = "Unknown"
-                    if "activity_name" in data: activity = data["activity_name"]
-                    elif "session_overview" in data:
-                        if isinstance(data["session_overview"], dict):
-                            activity = data["session_overview"].get("activity", "Unknown")
-                        elif isinstance(data["session_overview"], list):
-                            for line in data["session_overview"]:
-                                if "Activity:" in line:
-                                    activity = line.split(":", 1)[1].strip()
-                                    break
-                    
-                    # Deduplicate: Only add if we don't have a raw log for this time (approx match)
-                    # For simplicity, we just check if this date is already in history
-                    r_date = r.timestamp.strftime("%Y-%m-%d")
-                    if not any(h["date"] == r_date and h["exercise_id"] == activity for h in history):
-                         history.append({
-                            "date": r_date,
-                            "exercise_id": activity, # Use name as ID for fallback
-                            "source": "session_report",
-                            "status": "completed",
-                            "reps": "unknown"
-                        })
+                day = func.date(SessionReport.timestamp)
+                # Activity name from the known report layouts
+                activity = func.coalesce(
+                    SessionReport.report_json["activity_name"].as_string(),
+                    SessionReport.report_json[("session_overview", "activity")].as_string(),
+                    "Unknown"
+                )
+                has_raw_log = exists().where(ExerciseSession.session_uuid == SessionReport.session_id)
+                rows = db.query(
+                    day.label("day"),
+                    activity.label("activity"),
+                    func.count(SessionReport.id).label("sessions"),
+                ).filter(
+                    SessionReport.patient_id == patient_id,
+                    SessionReport.timestamp >= since_start,
+                    ~has_raw_log
+                ).group_by(day, activity).all()
+
+                for r in rows:
+                    history.append({
+                        "date": str(r.day),
+                        "exercise_id": r.activity, # Use name as ID for fallback
+                        "source": "session_report",
+                        "status": "completed",
+                        "sessions": r.sessions,
+                        "reps": "unknown"
+                    })
 
             except Exception as e:
-                logger.warning(f"Failed to fetch session reports: {e}")
+                logger.warning(f"Failed to aggregate session reports: {e}")
 
         # Sort combined history by date
         history.sort(key=lambda x: x["date"])
         return history
 
-    def _generate_from_gemini(self, db: Session):
-        # 1. Gather Data
-        menu = self._get_exercise_menu(db)
-        history = self._get_session_context(db)
-        
-        # 2. Construct Prompt
+    async def _generate_from_gemini(self, menu: list, history: list, fallback: bool = True):
+        # 1. Construct Prompt
         Prompt_Context = f"""
         ### AVAILABLE EXERCISES (MENU)
         {json.dumps(menu, indent=2)}
@@ -195,20 +352,26 @@ class PlanGenerator:
         """
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-3-flash-preview", # Flash is fast enough for planning
-                contents=Prompt_Context,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    response_mime_type="application/json",
-                    temperature=0.3
+            async with scheduler.slot(Priority.PLAN):
+                started = time.time()
+                response = await self.client.aio.models.generate_content(
+                    model="gemini-3-flash-preview", # Flash is fast enough for planning
+                    contents=Prompt_Context,
+                    config=types.GenerateContentConfig(
+                        system_instruction=system_instruction,
+                        response_mime_type="application/json",
+                        temperature=0.3
+                    )
                 )
-            )
+            usage_tracker.record("planner", usage=response.usage_metadata, started=started,
+                                 mode="PLAN", model="gemini-3-flash-preview")
             
             return json.loads(response.text)
 
         except Exception as e:
             logger.error(f"Plan Generation Failed: {e}")
+            if not fallback:
+                raise
             # Fallback Routine
             return {
                 "day_id": datetime.date.today().isoformat(),
@@ -219,9 +382,40 @@ class PlanGenerator:
                 ]
             }
 
-    def mark_exercise_complete(self, db: Session, exercise_index: int):
+    # Single-statement completion updates: the JSON merge happens inside the database,
+    # so concurrent completions (e.g. two devices) can't overwrite each other.
+    _COMPLETE_SQL = {
+        "postgresql": """
+            UPDATE daily_plans
+            SET completion_status = jsonb_set(COALESCE(completion_status::jsonb, '{}'::jsonb), ARRAY[:key]::text[], 'true'::jsonb)::json
+            WHERE patient_id = :patient_id AND date = :day
+            RETURNING completion_status
+        """,
+        "sqlite": """
+            UPDATE daily_plans
+            SET completion_status = json_set(COALESCE(completion_status, '{}'), '$."' || :key || '"', json('true'))
+            WHERE patient_id = :patient_id AND date = :day
+            RETURNING completion_status
+        """,
+    }
+
+    async def mark_exercise_complete(self, db: AsyncSession, exercise_index: int, patient_id: str = DEFAULT_PATIENT_ID):
         today = datetime.date.today()
-        plan = db.query(DailyPlan).filter(DailyPlan.date == today).first()
+        key = str(exercise_index)
+
+        sql = self._COMPLETE_SQL.get(db.bind.dialect.name)
+        if sql:
+            stmt = text(sql).bindparams(bindparam("day", type_=Date)).columns(completion_status=JSON)
+            row = (await db.execute(stmt, {"key": key, "day": today, "patient_id": patient_id})).first()
+            if row is not None:
+                await bump_version(db, "plan", patient_id) # Raw UPDATE: the ORM flush hook doesn't see it
+            await db.commit()
+            if row is None:
+                return {"error": "No plan found for today"}
+            return {"status": "updated", "completion": row.completion_status}
+
+        # Other dialects: row lock + read-modify-write
+        plan = (await db.execute(self._plan_select(patient_id, today).with_for_update())).scalar_one_or_none()
         
         if not plan:
             return {"error": "No plan found for today"}
@@ -229,8 +423,8 @@ class PlanGenerator:
         # Update completion status
         # Note: SQLAlchemy requires re-assignment for JSON mutation to be detected or flag_modified
         current_status = dict(plan.completion_status) if plan.completion_status else {}
-        current_status[str(exercise_index)] = True
+        current_status[key] = True
         
         plan.completion_status = current_status
-        db.commit()
+        await db.commit()
         return {"status": "updated", "completion": current_status}
@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+import random
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+try:
+    from database import SessionLocal, ExerciseSession, PlanPrecomputeClaim
+except ImportError:
+    from backend.database import SessionLocal, ExerciseSession, PlanPrecomputeClaim
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import (
+        PLAN_PRECOMPUTE_QUIET_MINUTES, PLAN_PRECOMPUTE_AT,
+        PLAN_PRECOMPUTE_JITTER_SECONDS, PLAN_PRECOMPUTE_CONCURRENCY,
+    )
+except ImportError:
+    from backend.config import (
+        PLAN_PRECOMPUTE_QUIET_MINUTES, PLAN_PRECOMPUTE_AT,
+        PLAN_PRECOMPUTE_JITTER_SECONDS, PLAN_PRECOMPUTE_CONCURRENCY,
+    )
+
+# A worker that died mid-precompute leaves its claim behind; others may take it over after this
+CLAIM_TTL = datetime.timedelta(minutes=10)
+
+
+class PlanPrecomputer:
+    """
+    Background scheduler that generates each patient's DailyPlan for tomorrow ahead
+    of time, so /plan/daily becomes a cache read. Two triggers:
+    - Quiet period: no session of that patient has completed for `quiet_minutes`
+      since their last one (i.e. the day's last session is done).
+    - Off-peak: a fixed daily time, for every recently active patient.
+    Runs are jittered and capped at `concurrency` at a time across patients. Every worker
+    runs both triggers; a (patient, day) claim row makes sure only one of them generates.
+    """
+
+    def __init__(self, quiet_minutes: float, off_peak_at: str, jitter_seconds: float, concurrency: int):
+        self.quiet_seconds = quiet_minutes * 60
+        self.off_peak_at = datetime.datetime.strptime(off_peak_at, "%H:%M").time() if off_peak_at else None
+        self.jitter_seconds = jitter_seconds
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        self.planner = None
+        self._dirty = {} # { patient_id: last session completed (UTC) } since their last precompute
+        self._quiet_tasks = {} # { patient_id: asyncio.Task }
+        self._off_peak_task = None
+
+    def start(self, planner):
+        self.planner = planner
+        if self.off_peak_at:
+            self._off_peak_task = asyncio.create_task(self._off_peak_loop())
+        logger.info(f"[PlanPrecomputer] Started (quiet={self.quiet_seconds / 60:.0f}m, off-peak={self.off_peak_at})")
+
+    def stop(self):
+        for task in [self._off_peak_task, *self._quiet_tasks.values()]:
+            if task and not task.done():
+                task.cancel()
+        self._quiet_tasks.clear()
+        self.planner = None
+
+    def notify_session_completed(self, patient_id: str):
+        """Called on /session/end. (Re)arms the patient's quiet-period trigger."""
+        if not self.planner:
+            return
+        self._dirty[patient_id] = datetime.datetime.utcnow()
+        task = self._quiet_tasks.get(patient_id)
+        if task and not task.done():
+            task.cancel()
+        # "Tomorrow" as of this session, not of when the quiet period ends (it may cross midnight)
+        day = datetime.date.today() + datetime.timedelta(days=1)
+        self._quiet_tasks[patient_id] = asyncio.create_task(self._after_quiet_period(patient_id, day))
+
+    async def _after_quiet_period(self, patient_id: str, day: datetime.date):
+        await asyncio.sleep(self.quiet_seconds)
+        self._quiet_tasks.pop(patient_id, None)
+        await self._precompute(patient_id, day, "quiet period")
+
+    def _seconds_until_off_peak(self):
+        now = datetime.datetime.now()
+        target = datetime.datetime.combine(now.date(), self.off_peak_at)
+        if target <= now:
+            target += datetime.timedelta(days=1)
+        return (target - now).total_seconds()
+
+    @staticmethod
+    def _active_patients(days: int = 7):
+        """Patients with at least one session in the last `days`."""
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        db = SessionLocal()
+        try:
+            rows = db.query(ExerciseSession.patient_id).filter(
+                ExerciseSession.start_time >= since
+            ).distinct().all()
+            return [r.patient_id for r in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim(patient_id: str, day: datetime.date) -> bool:
+        """Claims the (patient, day) precompute for this worker. False if another worker holds it."""
+        now = datetime.datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.add(PlanPrecomputeClaim(patient_id=patient_id, date=day, claimed_at=now))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            # Held: take it over only if its holder is presumed dead (conditional update = one winner)
+            taken = db.execute(update(PlanPrecomputeClaim).where(
+                PlanPrecomputeClaim.patient_id == patient_id, PlanPrecomputeClaim.date == day,
+                PlanPrecomputeClaim.claimed_at < now - CLAIM_TTL,
+            ).values(claimed_at=now)).rowcount
+            db.commit()
+            return bool(taken)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _release(patient_id: str, day: datetime.date):
+        db = SessionLocal()
+        try:
+            db.execute(delete(PlanPrecomputeClaim).where(
+                PlanPrecomputeClaim.patient_id == patient_id, PlanPrecomputeClaim.date == day
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _off_peak_loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_off_peak())
+            day = datetime.date.today() + datetime.timedelta(days=1)
+            patients = await asyncio.to_thread(self._active_patients)
+            # Semaphore bounds how many of these actually run at once
+            await asyncio.gather(*(self._precompute(p, day, "off-peak") for p in patients), return_exceptions=True)
+
+    async def _precompute(self, patient_id: str, day: datetime.date, reason: str):
+        # Spread runs out so many patients/workers don't hit Gemini in the same second
+        await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+        async with self._semaphore:
+            if not self.planner or day < datetime.date.today():
+                return
+            if not await asyncio.to_thread(self._claim, patient_id, day):
+                return # Another worker is on it
+            try:
+                # Checked under the claim: a plan another worker just finished counts
+                created_at, has_progress = await asyncio.to_thread(self.planner.plan_status, patient_id, day)
+                dirty_since = self._dirty.get(patient_id)
+                if has_progress or (created_at and (dirty_since is None or created_at >= dirty_since)):
+                    return
+
+                self._dirty.pop(patient_id, None)
+                try:
+                    await self.planner.precompute_plan(patient_id, day)
+                    logger.info(f"[PlanPrecomputer] Precomputed plan for {patient_id}/{day} ({reason})")
+                except Exception as e:
+                    self._dirty.setdefault(patient_id, dirty_since or datetime.datetime.utcnow())
+                    logger.error(f"[PlanPrecomputer] Precompute for {patient_id}/{day} failed: {e}")
+            finally:
+                await asyncio.to_thread(self._release, patient_id, day)
+
+
+plan_precomputer = PlanPrecomputer(
+    PLAN_PRECOMPUTE_QUIET_MINUTES, PLAN_PRECOMPUTE_AT, PLAN_PRECOMPUTE_JITTER_SECONDS, PLAN_PRECOMPUTE_CONCURRENCY
+)
@@ -1,19 +1,49 @@
 import os
 import json
-from google import genai
 from google.genai import types
 import asyncio
 import time
+from collections import deque
 try:
     from utils.logging import logger
 except ImportError:
     from backend.utils.logging import logger
+try:
+    from services.gemini_scheduler import scheduler, Priority
+except ImportError:
+    from backend.services.gemini_scheduler import scheduler, Priority
+try:
+    from services.usage_tracker import usage_tracker
+except ImportError:
+    from backend.services.usage_tracker import usage_tracker
+try:
+    from config import (
+        REPORT_DRAFT_EVERY_N_CHUNKS, REPORT_DRAFT_IDLE_SECONDS, REPORT_DRAFT_MAX_PER_SESSION,
+        REPORT_COMPACT_EVERY_N_CHUNKS, REPORT_COMPACT_KEEP_RECENT, REPORT_SESSION_TOKEN_BUDGET,
+    )
+except ImportError:
+    from backend.config import (
+        REPORT_DRAFT_EVERY_N_CHUNKS, REPORT_DRAFT_IDLE_SECONDS, REPORT_DRAFT_MAX_PER_SESSION,
+        REPORT_COMPACT_EVERY_N_CHUNKS, REPORT_COMPACT_KEEP_RECENT, REPORT_SESSION_TOKEN_BUDGET,
+    )
 
 class ReportDrafter:
-    def __init__(self, api_key: str):
-        self.client = genai.Client(api_key=api_key, http_options={"api_version": "v1alpha"})
+    MODEL = "gemini-3-flash-preview"
+
+    def __init__(self, client_provider):
+        self.client_provider = client_provider # Shared GenAIClientProvider
         self.active_sessions = {} # { session_id: chat_session }
         self.locks = {} # { session_id: asyncio.Lock }
+
+        # Speculative Drafting (keeps a ready-to-serve report while the session runs)
+        self.draft_every_n_chunks = REPORT_DRAFT_EVERY_N_CHUNKS
+        self.draft_idle_seconds = REPORT_DRAFT_IDLE_SECONDS
+        self.draft_max_per_session = REPORT_DRAFT_MAX_PER_SESSION
+
+        # Context Compaction (bounds per-turn prompt size on long sessions)
+        self.compact_every_n_chunks = REPORT_COMPACT_EVERY_N_CHUNKS
+        self.compact_keep_recent = REPORT_COMPACT_KEEP_RECENT
+        self.session_token_budget = REPORT_SESSION_TOKEN_BUDGET
         
         # The "Shadow Brain" Instructions
         self.SYSTEM_INSTRUCTION = """
@@ -61,14 +91,26 @@ class ReportDrafter:
             instruction = self.EMOTION_COACH_INSTRUCTION if domain == "FACE" else self.SYSTEM_INSTRUCTION
             
             chat = self.client.aio.chats.create(
-                model="gemini-3-flash-preview", 
+                model=self.MODEL, 
                 config=types.GenerateContentConfig(
                     system_instruction=instruction,
                     temperature=0.4 
                 )
             )
             # Store chat AND a hunk counter AND domain AND name
-            self.active_sessions[session_id] = {"chat": chat, "chunks": 0, "domain": domain, "exercise_name": exercise_name}
+            self.active_sessions[session_id] = {
+                "chat": chat, "chunks": 0, "domain": domain, "exercise_name": exercise_name,
+                "instruction": instruction,
+                "ingested": 0, # Chunks actually present in chat history
+                "dropped": 0, # Chunks that never will be (over budget / send failed)
+                # Speculative draft state
+                "draft": None, "draft_chunk": 0, "drafts_used": 0,
+                "draft_task": None, "draft_pending": None,
+                # (ingested #, prompt) of the latest chunks, to fold into a lagging draft at finalize
+                "recent_chunks": deque(maxlen=self.draft_every_n_chunks),
+                # Token accounting / compaction state
+                "tokens_used": 0, "turn_tokens": [], "compacted_at": 0, "compactions": 0,
+            }
             self.locks[session_id] = asyncio.Lock()
             logger.info(f"[ReportDrafter] Started Shadow Session: {session_id} ({exercise_name})")
             return True
@@ -84,12 +126,18 @@ class ReportDrafter:
             await self.start_session(session_id)
         
         session_data = self.active_sessions[session_id]
-        chat = session_data["chat"]
         lock = self.locks.get(session_id)
+
+        if self._over_budget(session_data):
+            logger.warning(f"[ReportDrafter] Token budget exhausted for {session_id} ({session_data['tokens_used']} tokens). Chunk not sent.")
+            session_data["chunks"] += 1
+            session_data["dropped"] += 1
+            return False
         
         # Increment Counter
         session_data["chunks"] += 1
         chunk_num = session_data["chunks"]
+        ingested = False
         
         # Format the prompt
         prompt = f"""
@@ -106,33 +154,152 @@ class ReportDrafter:
         try:
             # Concurrency Safety: Ensure we don't overlap turns in the same chat
             async with lock:
-                response = await chat.send_message(prompt)
-                logger.debug(f"[ReportDrafter] Ingested Chunk #{chunk_num}. Brain said: {response.text[:20]}...")
+                # Read the chat under the lock: compaction may have replaced it
+                async with scheduler.slot(Priority.BACKGROUND):
+                    started = time.time()
+                    response = await session_data["chat"].send_message(prompt)
+                session_data["ingested"] += 1
+                session_data["recent_chunks"].append((session_data["ingested"], prompt))
+                ingested = True
+                prompt_tokens = self._record_usage(session_id, session_data, response, "ingest", started)
+                session_data["turn_tokens"].append(prompt_tokens)
+                logger.debug(f"[ReportDrafter] Ingested Chunk #{chunk_num} ({prompt_tokens} prompt tokens). Brain said: {response.text[:20]}...")
+
+                if session_data["ingested"] - session_data["compacted_at"] >= self.compact_every_n_chunks:
+                    await self._compact_history(session_id)
+            self._schedule_draft(session_id)
             return True
         except Exception as e:
+            if not ingested:
+                session_data["dropped"] += 1
             logger.error(f"[ReportDrafter] Error ingesting chunk: {e}")
             return False
 
-    async def finalize_report(self, session_id: str):
-        """Triggers the final readout."""
-        if session_id not in self.active_sessions: return {"error": "Session not found"}
-        
+    @property
+    def client(self):
+        return self.client_provider.client
+
+    # --- TOKEN ACCOUNTING / COMPACTION ---
+
+    def _record_usage(self, session_id: str, session_data: dict, response, call_type: str, started: float):
+        """
+        Logs the call to the usage table and adds its tokens to the session total.
+        Returns its prompt token count.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        usage_tracker.record(call_type, usage=usage, started=started, session_id=session_id,
+                             mode=session_data.get("domain"), model=self.MODEL)
+        if not usage:
+            return 0
+        session_data["tokens_used"] += usage.total_token_count or 0
+        return usage.prompt_token_count or 0
+
+    def _over_budget(self, session_data: dict):
+        return bool(self.session_token_budget) and session_data["tokens_used"] >= self.session_token_budget
+
+    @staticmethod
+    def _token_stats(session_data: dict):
+        """Prompt tokens per ingest turn over the session (first/last/max), for the logs."""
+        turns = session_data["turn_tokens"]
+        if not turns:
+            return "no turns"
+        return (f"prompt tokens/turn first={turns[0]} last={turns[-1]} max={max(turns)}, "
+                f"total={session_data['tokens_used']}, compactions={session_data['compactions']}")
+
+    async def _compact_history(self, session_id: str):
+        """
+        Replaces the chat with [state summary] + the last few chunk turns.
+        Caller must hold the session lock.
+        """
         session_data = self.active_sessions[session_id]
-        chat = session_data["chat"]
-        total_chunks = session_data["chunks"]
-        
-        logger.info(f"[ReportDrafter] Finalizing Report for {session_id}. Total Chunks Processed: {total_chunks}")
-        start_time = time.time()
-        
+        history = session_data["chat"].get_history(curated=True)
+
+        prompt = """
+        [COMMAND: SUMMARIZE_STATE]
+        Summarize everything observed so far into a compact state for yourself.
+        Include: rep counts, key metrics and ranges, notable events with timestamps,
+        safety flags, and a downsampled trajectory (max 20 points of time/value) of the
+        primary metric so the final chart can still be drawn.
+        Max 300 words. No preamble.
+        """
+        try:
+            async with scheduler.slot(Priority.BACKGROUND):
+                started = time.time()
+                response = await self.client.aio.models.generate_content(
+                    model=self.MODEL,
+                    contents=history + [types.Content(role="user", parts=[types.Part(text=prompt)])],
+                    config=types.GenerateContentConfig(
+                        system_instruction=session_data["instruction"],
+                        temperature=0.2,
+                    )
+                )
+            self._record_usage(session_id, session_data, response, "compaction", started)
+            summary = response.text
+        except Exception as e:
+            # Keep the full chat; try again after the next K chunks
+            logger.warning(f"[ReportDrafter] Compaction failed for {session_id}: {e}")
+            session_data["compacted_at"] = session_data["ingested"]
+            return
+
+        # Last N (user, model) chunk turns; skip anything that doesn't start on a user turn
+        recent = history[-2 * self.compact_keep_recent:] if self.compact_keep_recent > 0 else []
+        while recent and recent[0].role != "user":
+            recent = recent[1:]
+
+        compact_history = [
+            types.Content(role="user", parts=[types.Part(text=f"[STATE SUMMARY] (chunks 1-{session_data['ingested']})\n{summary}")]),
+            types.Content(role="model", parts=[types.Part(text="Ack")]),
+        ] + recent
+
+        session_data["chat"] = self.client.aio.chats.create(
+            model=self.MODEL,
+            config=types.GenerateContentConfig(
+                system_instruction=session_data["instruction"],
+                temperature=0.4
+            ),
+            history=compact_history,
+        )
+        session_data["compacted_at"] = session_data["ingested"]
+        session_data["compactions"] += 1
+        logger.info(f"[ReportDrafter] Compacted {session_id}: {len(history)} -> {len(compact_history)} turns. {self._token_stats(session_data)}")
+
+    # Separator between the streamed markdown and the trailing chart JSON (streaming finalize only)
+    STREAM_DELIMITER = "===CHART_JSON==="
+
+    def _finalize_context(self, session_data: dict):
+        """Returns (exercise_name, chart_title) for the FINALIZE prompt."""
         domain = session_data.get("domain", "BODY")
         exercise_name = session_data.get("exercise_name", "Exercise")
         chart_title = "Confidence vs Time" if domain == "FACE" else f"{exercise_name} Trajectory (Form Analysis)"
-        
-        prompt = f"""
+        return exercise_name, chart_title
+
+    @staticmethod
+    def _normalize_chart(result: dict):
+        """[FIX] Enforce Chart Schema (x, y) if model returns t, val or others"""
+        if result.get("chart_config") and result["chart_config"].get("data"):
+            raw_data = result["chart_config"]["data"]
+            mapped_data = []
+            for pt in raw_data:
+                # Map known aliases to x, y
+                x = pt.get("x") or pt.get("t") or pt.get("time") or 0
+                y = pt.get("y") or pt.get("val") or pt.get("value") or 0
+                mapped_data.append({"x": x, "y": y})
+            result["chart_config"]["data"] = mapped_data
+        return result
+
+    def _finalize_prompt(self, session_data: dict, command: str = None, stream: bool = False):
+        """
+        The FINALIZE prompt. `command` replaces the default instruction (see _fold_in_prompt);
+        `stream` asks for markdown first and the chart JSON after STREAM_DELIMITER.
+        """
+        exercise_name, chart_title = self._finalize_context(session_data)
+        command = command or f"""
         [COMMAND: FINALIZE]
         Patient Performed: {exercise_name}
         Output the FINAL REPORT based on the chunks received.
-        
+        """
+        return f"""
+        {command}
         **Requirements:**
         1. **Speed:** Be concise. Bullet points over paragraphs.
         2. **Chart Data:** You MUST output the chart data as a SIMPLE ARRAY of objects.
@@ -142,7 +309,12 @@ class ReportDrafter:
            - This visualization allows detecting "Sudden Drops" (Safety Events) or "Smoothness" (Form).
            - Use the "coords" field in telemetry if available.
         
-        **Output Schema (Strict JSON):**
+        {self._stream_format(chart_title) if stream else self._json_format(chart_title)}
+        """
+
+    @staticmethod
+    def _json_format(chart_title: str):
+        return f"""**Output Schema (Strict JSON):**
         {{
             "report_markdown": "# Clinical Report\\n...",
             "chart_config": {{
@@ -154,18 +326,262 @@ class ReportDrafter:
                 ]
             }},
             "thoughts": "Brief analysis summary"
-        }}
+        }}"""
+
+    def _stream_format(self, chart_title: str):
+        # Markdown first (streamable as-is), chart JSON last. JSON mode would hide the
+        # markdown inside an escaped string until the very end.
+        return f"""**Output Format (Strict):**
+        1. The report as plain Markdown, starting with "# Clinical Report". No code fences.
+        2. A line containing exactly: {self.STREAM_DELIMITER}
+        3. A JSON object (no code fences):
+        {{
+            "chart_config": {{
+                "title": "{chart_title}",
+                "xAxis": "Time (s)",
+                "data": [
+                    {{"x": 10, "y": 0.45}},
+                    {{"x": 20, "y": 0.90}}
+                ]
+            }},
+            "thoughts": "Brief analysis summary"
+        }}"""
+
+    def _fold_in_prompt(self, session_data: dict, stream: bool = False):
+        """
+        A short FINALIZE prompt (no chat history): the cached draft plus the chunks it hasn't seen.
+        None when there is no draft, it's already current, or an unseen chunk is no longer kept.
+        """
+        draft, covered = session_data["draft"], session_data["draft_chunk"]
+        expected = session_data["chunks"] - session_data["dropped"]
+        unseen = [prompt for n, prompt in session_data["recent_chunks"] if n > covered]
+        if not draft or covered >= expected or len(unseen) != expected - covered:
+            return None
+
+        exercise_name, _ = self._finalize_context(session_data)
+        previous = {k: v for k, v in draft.items() if k != "clinical_notes"}
+        command = f"""
+        [COMMAND: FINALIZE]
+        Patient Performed: {exercise_name}
+        Below is the report you drafted from chunks 1-{covered}, then the {len(unseen)} chunk(s) received since.
+        Output the FINAL REPORT covering ALL chunks: update counts, findings and the chart
+        (keep its points from the draft where still valid, extend the time axis to the new chunks).
+
+        **Draft Report (chunks 1-{covered}):**
+        {json.dumps(previous)}
+
+        **New Chunks:**
+        {"".join(unseen)}
+        """
+        return self._finalize_prompt(session_data, command=command, stream=stream)
+
+    def _parse_report_text(self, text: str, session_data: dict):
+        """Parses the FINALIZE JSON (with truncation repair) into the report payload."""
+        try:
+            # [FIX] Strip Markdown Code Blocks
+            clean_text = text.strip()
+            if clean_text.startswith("```"):
+                clean_text = clean_text.split("```json")[-1].split("```")[0].strip()
+            elif clean_text.startswith("`"): # sometimes single ticks
+                clean_text = clean_text.replace("`", "")
+            
+            result = json.loads(clean_text)
+            
+            # [FIX] Return the raw clinical notes too
+            result["clinical_notes"] = list(session_data.get("notes", []))
+
+            return self._normalize_chart(result)
+        except json.JSONDecodeError:
+            logger.warning("[ReportDrafter] JSON Parse Error. Attempting Repair.")
+            
+            # [REPAIR] Attempt to salvage truncated JSON
+            try:
+                # 1. Find the last complete data point closure "}," inside the data array
+                last_obj_idx = clean_text.rfind("},")
+                if last_obj_idx != -1:
+                    # Trim to that point and close the JSON structure
+                    # Assumes structure: { ..., "chart_config": { ..., "data": [ { ... }, { ... } <TRUNCATED>
+                    repaired_text = clean_text[:last_obj_idx+1] + "]}}" 
+                    logger.info(f"[ReportDrafter] Repaired JSON: {repaired_text[-50:]}")
+                    
+                    result = json.loads(repaired_text)
+                    
+                    # Apply same schema fix to repaired result
+                    self._normalize_chart(result)
+                        
+                    result["clinical_notes"] = list(session_data.get("notes", []))
+                    return result
+            except Exception as repair_err:
+                logger.error(f"[ReportDrafter] Repair Failed: {repair_err}")
+
+            return {"report_markdown": text, "chart_config": None, "clinical_notes": []}
+
+    # --- SPECULATIVE DRAFTING ---
+
+    def _schedule_draft(self, session_id: str):
+        """
+        Arms the next speculative draft: immediately once N chunks are unseen by the
+        current draft, otherwise after the idle timeout (re-armed on every chunk).
+        """
+        session_data = self.active_sessions.get(session_id)
+        if not session_data or session_data["drafts_used"] >= self.draft_max_per_session:
+            return
+
+        task = session_data["draft_task"]
+        if task and not task.done():
+            if session_data["draft_pending"] is not None:
+                return # Generating now; it re-arms itself when done
+            task.cancel() # Reset idle timer
+
+        unseen = session_data["ingested"] - session_data["draft_chunk"]
+        delay = 0 if unseen >= self.draft_every_n_chunks else self.draft_idle_seconds
+        session_data["draft_task"] = asyncio.create_task(self._draft_after(session_id, delay))
+
+    async def _draft_after(self, session_id: str, delay: float):
+        await asyncio.sleep(delay)
+
+        session_data = self.active_sessions.get(session_id)
+        if not session_data or session_data["draft_chunk"] >= session_data["ingested"]:
+            return
+        if session_data["drafts_used"] >= self.draft_max_per_session:
+            logger.info(f"[ReportDrafter] Draft ceiling reached for {session_id} ({self.draft_max_per_session}).")
+            return
+        if self._over_budget(session_data):
+            return
+
+        # Snapshot history under the chat lock so it matches the chunk count exactly
+        async with self.locks[session_id]:
+            history = session_data["chat"].get_history()
+            covered = session_data["ingested"]
+        session_data["draft_pending"] = covered
+        session_data["drafts_used"] += 1
+
+        start_time = time.time()
+        try:
+            # Side request on a copy of the history: the live chat must not see FINALIZE
+            async with scheduler.slot(Priority.BACKGROUND):
+                started = time.time()
+                response = await self.client.aio.models.generate_content(
+                    model=self.MODEL,
+                    contents=history + [types.Content(role="user", parts=[types.Part(text=self._finalize_prompt(session_data))])],
+                    config=types.GenerateContentConfig(
+                        system_instruction=session_data["instruction"],
+                        response_mime_type="application/json",
+                        max_output_tokens=8192,
+                        temperature=0.2,
+                    )
+                )
+            self._record_usage(session_id, session_data, response, "draft", started)
+            result = self._parse_report_text(response.text, session_data)
+            if covered > session_data["draft_chunk"]:
+                session_data["draft"] = result
+                session_data["draft_chunk"] = covered
+            logger.info(f"[ReportDrafter] Draft #{session_data['drafts_used']} for {session_id} covers {covered} chunks ({time.time() - start_time:.2f}s).")
+        except Exception as e:
+            logger.warning(f"[ReportDrafter] Speculative draft failed for {session_id}: {e}")
+            return
+        finally:
+            session_data["draft_pending"] = None
+
+        # Chunks may have landed while we were generating
+        if session_id in self.active_sessions and session_data["ingested"] > session_data["draft_chunk"]:
+            self._schedule_draft(session_id)
+
+    async def _take_fresh_draft(self, session_id: str, session_data: dict):
+        """
+        Returns the speculative draft if it already covers every chunk received,
+        waiting for an in-flight draft that will (and for chunks still being ingested).
+        Cancels any other pending draft work.
+        Drafts count chunks in chat history (`ingested`), so the target is every chunk
+        received minus those dropped; chunks still being sent keep the draft stale.
+        """
+        # Let a chunk that is still being sent (flushData posts one right before /end) land first
+        lock = self.locks.get(session_id)
+        if lock:
+            async with lock:
+                pass
+
+        expected = session_data["chunks"] - session_data["dropped"]
+        task = session_data["draft_task"]
+        if task and not task.done():
+            if session_data["draft_pending"] == expected:
+                try:
+                    await asyncio.shield(task)
+                except Exception:
+                    pass
+            else:
+                task.cancel()
+
+        if session_data["draft"] and session_data["draft_chunk"] == expected:
+            return session_data["draft"]
+        return None
+
+    async def _fold_in(self, session_id: str, session_data: dict):
         """
+        Finalizes from the lagging draft plus the unseen chunks (see _fold_in_prompt).
+        Returns the report, or None to fall back to the full finalize.
+        """
+        prompt = self._fold_in_prompt(session_data)
+        if not prompt:
+            return None
+        start_time = time.time()
+        try:
+            async with scheduler.slot(Priority.INTERACTIVE):
+                started = time.time()
+                response = await self.client.aio.models.generate_content(
+                    model=self.MODEL,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        system_instruction=session_data["instruction"],
+                        response_mime_type="application/json",
+                        max_output_tokens=8192,
+                        temperature=0.2,
+                    )
+                )
+            self._record_usage(session_id, session_data, response, "fold_in", started)
+            logger.info(f"[ReportDrafter] Folded chunks {session_data['draft_chunk'] + 1}-{session_data['ingested']} into the draft for {session_id} ({time.time() - start_time:.2f}s).")
+            return self._parse_report_text(response.text, session_data)
+        except Exception as e:
+            logger.warning(f"[ReportDrafter] Fold-in failed for {session_id}, running full finalize: {e}")
+            return None
+
+    async def finalize_report(self, session_id: str):
+        """Triggers the final readout."""
+        if session_id not in self.active_sessions: return {"error": "Session not found"}
+        
+        session_data = self.active_sessions[session_id]
+        chat = session_data["chat"]
+        total_chunks = session_data["chunks"]
+
+        # Fast path: nothing changed since the last speculative draft
+        draft = await self._take_fresh_draft(session_id, session_data)
+        if draft:
+            logger.info(f"[ReportDrafter] Serving speculative draft for {session_id} ({total_chunks} chunks).")
+            self.active_sessions.pop(session_id, None)
+            return draft
+
+        # Draft is a chunk or two behind: fold them in with a short prompt
+        report = await self._fold_in(session_id, session_data)
+        if report:
+            self.active_sessions.pop(session_id, None)
+            return report
+        
+        logger.info(f"[ReportDrafter] Finalizing Report for {session_id}. Total Chunks Processed: {total_chunks}. {self._token_stats(session_data)}")
+        start_time = time.time()
+        
+        prompt = self._finalize_prompt(session_data)
         
         try:
-            response = await chat.send_message(
-                prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    max_output_tokens=8192, # [FIX] Prevent Truncation
-                    temperature=0.2, # Lower temp for strict formatting (from legacy)
+            async with scheduler.slot(Priority.INTERACTIVE):
+                started = time.time()
+                response = await chat.send_message(
+                    prompt,
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        max_output_tokens=8192, # [FIX] Prevent Truncation
+                        temperature=0.2, # Lower temp for strict formatting (from legacy)
+                    )
                 )
-            )
             
             elapsed = time.time() - start_time
             
@@ -179,66 +595,117 @@ class ReportDrafter:
                 pass
 
             logger.info(f"[ReportDrafter] Report Generated in {elapsed:.2f}s. Usage: {response.usage_metadata}")
+            self._record_usage(session_id, session_data, response, "finalize", started)
             
             # Cleanup
             del self.active_sessions[session_id]
             
-            try:
-                # [FIX] Strip Markdown Code Blocks
-                clean_text = response.text.strip()
-                if clean_text.startswith("```"):
-                    clean_text = clean_text.split("```json")[-1].split("```")[0].strip()
-                elif clean_text.startswith("`"): # sometimes single ticks
-                    clean_text = clean_text.replace("`", "")
-                
-                result = json.loads(clean_text)
-                
-                # [FIX] Return the raw clinical notes too
-                result["clinical_notes"] = list(session_data.get("notes", []))
-
-                # [FIX] Enforce Chart Schema (x, y) if model returns t, val or others
-                if result.get("chart_config") and result["chart_config"].get("data"):
-                    raw_data = result["chart_config"]["data"]
-                    mapped_data = []
-                    for pt in raw_data:
-                        # Map known aliases to x, y
-                        x = pt.get("x") or pt.get("t") or pt.get("time") or 0
-                        y = pt.get("y") or pt.get("val") or pt.get("value") or 0
-                        mapped_data.append({"x": x, "y": y})
-                    result["chart_config"]["data"] = mapped_data
-
-                return result
-            except json.JSONDecodeError:
-                logger.warning(f"[ReportDrafter] JSON Parse Error. Attempting Repair.")
-                
-                # [REPAIR] Attempt to salvage truncated JSON
-                try:
-                    # 1. Find the last complete data point closure "}," inside the data array
-                    last_obj_idx = clean_text.rfind("},")
-                    if last_obj_idx != -1:
-                        # Trim to that point and close the JSON structure
-                        # Assumes structure: { ..., "chart_config": { ..., "data": [ { ... }, { ... } <TRUNCATED>
-                        repaired_text = clean_text[:last_obj_idx+1] + "]}}" 
-                        logger.info(f"[ReportDrafter] Repaired JSON: {repaired_text[-50:]}")
-                        
-                        result = json.loads(repaired_text)
-                        
-                        # Apply same schema fix to repaired result
-                        if result.get("chart_config") and result["chart_config"].get("data"):
-                            raw_data = result["chart_config"]["data"]
-                            mapped_data = []
-                            for pt in raw_data:
-                                x = pt.get("x") or pt.get("t") or pt.get("time") or 0
-                                y = pt.get("y") or pt.get("val") or pt.get("value") or 0
-                                mapped_data.append({"x": x, "y": y})
-                            result["chart_config"]["data"] = mapped_data
-                            
-                        result["clinical_notes"] = list(session_data.get("notes", []))
-                        return result
-                except Exception as repair_err:
-                    logger.error(f"[ReportDrafter] Repair Failed: {repair_err}")
-
-                return {"report_markdown": response.text, "chart_config": None, "clinical_notes": []}
+            return self._parse_report_text(response.text, session_data)
         except Exception as e:
             logger.error(f"[ReportDrafter] Error finalizing: {e}")
             return {"report_markdown": "Error generating report.", "chart_config": None, "clinical_notes": []}
+
+    async def finalize_report_stream(self, session_id: str):
+        """
+        Streaming variant of finalize_report.
+        Yields ("token", text) while the report markdown is generated, then a single
+        ("final", result) with the same shape finalize_report returns.
+        """
+        if session_id not in self.active_sessions:
+            yield ("final", {"error": "Session not found"})
+            return
+
+        session_data = self.active_sessions[session_id]
+        chat = session_data["chat"]
+
+        draft = await self._take_fresh_draft(session_id, session_data)
+        if draft:
+            logger.info(f"[ReportDrafter] Serving speculative draft for {session_id} ({session_data['chunks']} chunks).")
+            self.active_sessions.pop(session_id, None)
+            yield ("token", draft.get("report_markdown", ""))
+            yield ("final", draft)
+            return
+
+        config = types.GenerateContentConfig(max_output_tokens=8192, temperature=0.2)
+        attempts = []
+        # Draft is a chunk or two behind: fold them in with a short prompt, full chat if that fails
+        fold_in_prompt = self._fold_in_prompt(session_data, stream=True)
+        if fold_in_prompt:
+            attempts.append(("fold_in", lambda: self.client.aio.models.generate_content_stream(
+                model=self.MODEL,
+                contents=fold_in_prompt,
+                config=types.GenerateContentConfig(
+                    system_instruction=session_data["instruction"],
+                    max_output_tokens=8192,
+                    temperature=0.2,
+                )
+            )))
+        attempts.append(("finalize", lambda: chat.send_message_stream(
+            self._finalize_prompt(session_data, stream=True), config=config)))
+
+        for call_type, open_stream in attempts:
+            logger.info(f"[ReportDrafter] Streaming Final Report ({call_type}) for {session_id}. Total Chunks Processed: {session_data['chunks']}. {self._token_stats(session_data)}")
+            start_time = time.time()
+            full_text = ""
+            emitted = 0  # chars of full_text already yielded as markdown
+            first_token_at = None
+            usage = None
+
+            try:
+                async with scheduler.slot(Priority.INTERACTIVE):
+                    started = time.time()
+                    stream = await open_stream()
+                    async for chunk in stream:
+                        if chunk.usage_metadata:
+                            usage = chunk.usage_metadata
+                        if not chunk.text:
+                            continue
+                        full_text += chunk.text
+
+                        # Only emit up to the delimiter. Hold back a tail in case the delimiter
+                        # is split across two chunks.
+                        cut = full_text.find(self.STREAM_DELIMITER)
+                        safe_end = cut if cut != -1 else max(emitted, len(full_text) - len(self.STREAM_DELIMITER))
+                        if safe_end > emitted:
+                            if first_token_at is None:
+                                first_token_at = time.time() - start_time
+                            yield ("token", full_text[emitted:safe_end])
+                            emitted = safe_end
+                break
+            except Exception as e:
+                logger.error(f"[ReportDrafter] Error streaming final report ({call_type}): {e}")
+                if full_text:
+                    break # Tokens already went out: finish with what we have
+        else:
+            self.active_sessions.pop(session_id, None)
+            yield ("final", {"report_markdown": "Error generating report.", "chart_config": None, "clinical_notes": []})
+            return
+
+        markdown, _, tail = full_text.partition(self.STREAM_DELIMITER)
+        if not tail and len(markdown) > emitted:
+            # No delimiter arrived (truncated output): flush what was held back
+            yield ("token", markdown[emitted:])
+
+        elapsed = time.time() - start_time
+        ttft = f"{first_token_at:.2f}s" if first_token_at is not None else "n/a"
+        logger.info(f"[ReportDrafter] Streamed Report in {elapsed:.2f}s (first token {ttft}). Usage: {usage}")
+        usage_tracker.record(call_type, usage=usage, started=started, session_id=session_id,
+                             mode=session_data.get("domain"), model=self.MODEL)
+
+        # Cleanup
+        self.active_sessions.pop(session_id, None)
+
+        result = {"report_markdown": markdown.strip(), "chart_config": None}
+        tail = tail.strip()
+        if tail.startswith("```"):
+            tail = tail.split("```json")[-1].split("```")[0].strip()
+        if tail:
+            try:
+                structured = json.loads(tail)
+                result["chart_config"] = structured.get("chart_config")
+                result["thoughts"] = structured.get("thoughts")
+            except json.JSONDecodeError:
+                logger.warning("[ReportDrafter] Could not parse streamed chart JSON. Returning report without chart.")
+
+        result["clinical_notes"] = list(session_data.get("notes", []))
+        yield ("final", self._normalize_chart(result))
@@ -0,0 +1,196 @@
+import asyncio
+import copy
+import datetime
+import hashlib
+import re
+from collections import OrderedDict
+try:
+    from database import SessionLocal, ExerciseSchemaCache as CacheRow
+except ImportError:
+    from backend.database import SessionLocal, ExerciseSchemaCache as CacheRow
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import EXERCISE_CACHE_MAX_ENTRIES, EXERCISE_CACHE_TOUCH_FLUSH_SECONDS
+except ImportError:
+    from backend.config import EXERCISE_CACHE_MAX_ENTRIES, EXERCISE_CACHE_TOUCH_FLUSH_SECONDS
+
+
+def normalize_description(text: str) -> str:
+    """'Bicep curls!' and 'bicep curl' map to the same key: lowercase, punctuation dropped, plural 's' stripped."""
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+
+class SchemaCache:
+    """
+    LRU cache for generated exercise schemas: an in-process OrderedDict in front of
+    the `exercise_schema_cache` table, so entries survive restarts and are shared by workers.
+    Concurrent misses for the same key share one generation call.
+    In-process hits don't write: their hit count and last-used time are buffered and
+    flushed every `touch_flush_interval` seconds, and before the table is trimmed.
+    """
+
+    def __init__(self, max_entries: int, touch_flush_interval: float):
+        self.max_entries = max_entries
+        self.touch_flush_interval = touch_flush_interval
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._touched = {} # { key: [hits, last_used_at] } not yet written
+        self._flusher = None
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(normalized: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{model}|{prompt_version}|{normalized}".encode()).hexdigest()
+
+    async def get_or_generate(self, description: str, model: str, prompt_version: str, generate) -> dict:
+        """
+        Returns the cached schema for `description`, or awaits `generate()` and caches it.
+        Results containing an "error" key are returned but never cached.
+        """
+        normalized = normalize_description(description)
+        key = self.make_key(normalized, model, prompt_version)
+
+        # 1. In-process hit
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            self._touch(key)
+            return copy.deepcopy(self._memory[key])
+
+        # 2. Single-flight: join a lookup/generation already running for this key
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load_or_generate(key, normalized, model, prompt_version, generate))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        schema = await asyncio.shield(task)
+        return copy.deepcopy(schema)
+
+    async def _load_or_generate(self, key, normalized, model, prompt_version, generate) -> dict:
+        schema = await asyncio.to_thread(self._load, key)
+        if schema is not None:
+            self._stats["db_hits"] += 1
+            self._remember(key, schema)
+            return schema
+
+        self._stats["misses"] += 1
+        schema = await generate()
+        if isinstance(schema, dict) and "error" not in schema:
+            # Buffered hits go along: the store trims by last-used time
+            await asyncio.to_thread(self._store, key, normalized, model, prompt_version, schema, self._take_touched())
+            self._remember(key, schema)
+        return schema
+
+    def _touch(self, key: str):
+        touched = self._touched.setdefault(key, [0, None])
+        touched[0] += 1
+        touched[1] = datetime.datetime.utcnow()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._periodic_flush())
+
+    async def _periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.touch_flush_interval)
+            await self.flush()
+            if not self._touched:
+                return # Re-armed by the next hit
+
+    def _take_touched(self):
+        touched, self._touched = self._touched, {}
+        return touched
+
+    async def flush(self):
+        """Writes buffered hit counts / last-used times (also called at shutdown)."""
+        touched = self._take_touched()
+        if touched:
+            await asyncio.to_thread(self._write_touches, touched)
+
+    def _remember(self, key: str, schema: dict):
+        self._memory[key] = schema
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- DB (runs in a worker thread) ---
+
+    def _load(self, key: str):
+        db = SessionLocal()
+        try:
+            row = db.query(CacheRow).filter(CacheRow.key == key).first()
+            if row is None:
+                return None
+            row.hits = (row.hits or 0) + 1
+            row.last_used_at = datetime.datetime.utcnow()
+            db.commit()
+            return row.schema_json
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[SchemaCache] Load failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_touches(touched: dict, db=None):
+        """One UPDATE per touched key, one transaction. Pass `db` to write in the caller's session."""
+        own = db is None
+        db = db or SessionLocal()
+        try:
+            for key, (hits, last_used_at) in touched.items():
+                db.query(CacheRow).filter(CacheRow.key == key).update(
+                    {CacheRow.hits: CacheRow.hits + hits, CacheRow.last_used_at: last_used_at},
+                    synchronize_session=False,
+                )
+            if own:
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[SchemaCache] Writing {len(touched)} touches failed: {e}")
+        finally:
+            if own:
+                db.close()
+
+    def _store(self, key, normalized, model, prompt_version, schema, touched: dict = None):
+        db = SessionLocal()
+        try:
+            db.merge(CacheRow(
+                key=key, description=normalized, model=model, prompt_version=prompt_version,
+                schema_json=schema, hits=0, last_used_at=datetime.datetime.utcnow(),
+            ))
+            db.commit()
+            self._stats["stores"] += 1
+
+            # Evict least recently used rows beyond the bound (recent hits first, or they'd look stale)
+            if touched:
+                self._write_touches(touched, db)
+                db.commit()
+            stale = [k for (k,) in db.query(CacheRow.key)
+                     .order_by(CacheRow.last_used_at.desc())
+                     .offset(self.max_entries).all()]
+            if stale:
+                db.query(CacheRow).filter(CacheRow.key.in_(stale)).delete(synchronize_session=False)
+                db.commit()
+                self._stats["evictions"] += len(stale)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[SchemaCache] Store failed: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        hits = self._stats["memory_hits"] + self._stats["db_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+        }
+
+
+schema_cache = SchemaCache(EXERCISE_CACHE_MAX_ENTRIES, EXERCISE_CACHE_TOUCH_FLUSH_SECONDS)
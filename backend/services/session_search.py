@@ -0,0 +1,160 @@
+import re
+from sqlalchemy import text, Integer, Float
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+
+# Full-text index over session reports, one document per SessionReport:
+#   names (weighted higher): exercise name / id, activity name
+#   body: transcript, clinical notes, report markdown
+# Postgres: `session_search` table with a weighted tsvector + GIN index.
+# SQLite:   `session_search` FTS5 virtual table keyed by rowid = report id (bm25 ranking).
+# Anything else (or SQLite without FTS5): search falls back to ILIKE.
+
+_POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS session_search (
+        report_id INTEGER PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+        patient_id VARCHAR NOT NULL,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_session_search_document ON session_search USING GIN (document)",
+]
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS session_search USING fts5(
+        names, body, patient_id UNINDEXED, tokenize='porter unicode61'
+    )""",
+]
+# Ids already indexed (backfill skips these)
+INDEXED_IDS_SQL = {
+    "postgresql": "SELECT report_id FROM session_search",
+    "sqlite": "SELECT rowid FROM session_search",
+}
+
+_enabled_dialects = set()
+
+
+def ensure_search_index(engine) -> bool:
+    """Creates the full-text index for this engine's dialect. Returns False if unsupported."""
+    dialect = engine.dialect.name
+    ddl = {"postgresql": _POSTGRES_DDL, "sqlite": _SQLITE_DDL}.get(dialect)
+    if not ddl:
+        logger.warning(f"[Search] No full-text index for dialect '{dialect}'; using ILIKE search")
+        return False
+    try:
+        with engine.begin() as conn:
+            for statement in ddl:
+                conn.execute(text(statement))
+        _enabled_dialects.add(dialect)
+        return True
+    except Exception as e:
+        logger.warning(f"[Search] Full-text index unavailable ({e}); using ILIKE search")
+        return False
+
+
+def search_enabled(db) -> bool:
+    return db.bind.dialect.name in _enabled_dialects
+
+
+def _document(report, exercise_session=None):
+    names = [report.activity_name]
+    if exercise_session is not None:
+        names += [exercise_session.exercise_name, exercise_session.exercise_id]
+    report_json = report.report_json if isinstance(report.report_json, dict) else {}
+    body = [report.transcript, report_json.get("report_markdown") or report_json.get("report")]
+    body += [n for n in (report.clinical_notes or []) if isinstance(n, str)]
+    # exercise_id is snake_case: index its words too
+    names_text = " ".join(n.replace("_", " ") for n in names if n)
+    body_text = "\n".join(b for b in body if isinstance(b, str) and b)
+    return names_text, body_text
+
+
+def _index_statements(dialect: str, report, exercise_session=None):
+    names, body = _document(report, exercise_session)
+    params = {"report_id": report.id, "patient_id": report.patient_id, "names": names, "body": body}
+    if dialect == "postgresql":
+        return [(text("""
+            INSERT INTO session_search (report_id, patient_id, document)
+            VALUES (:report_id, :patient_id,
+                    setweight(to_tsvector('english', :names), 'A') || setweight(to_tsvector('english', :body), 'B'))
+            ON CONFLICT (report_id) DO UPDATE SET document = EXCLUDED.document
+        """), params)]
+    return [
+        (text("DELETE FROM session_search WHERE rowid = :report_id"), params),
+        (text("""
+            INSERT INTO session_search (rowid, names, body, patient_id)
+            VALUES (:report_id, :names, :body, :patient_id)
+        """), params),
+    ]
+
+
+def index_report(db, report, exercise_session=None, commit: bool = True):
+    """Adds/refreshes the search document for a committed SessionReport (commit=False: caller commits)."""
+    dialect = db.bind.dialect.name
+    if dialect not in _enabled_dialects:
+        return
+    try:
+        for statement, params in _index_statements(dialect, report, exercise_session):
+            db.execute(statement, params)
+        if commit:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[Search] Failed to index report {report.id}: {e}")
+
+
+async def index_report_async(db, report, exercise_session=None, commit: bool = True):
+    """
+    index_report for an AsyncSession (request handlers).
+    commit=False: runs in a savepoint of the caller's transaction (a failed index keeps the report); caller commits.
+    """
+    dialect = db.bind.dialect.name
+    if dialect not in _enabled_dialects:
+        return
+    statements = _index_statements(dialect, report, exercise_session)
+    try:
+        if commit:
+            for statement, params in statements:
+                await db.execute(statement, params)
+            await db.commit()
+        else:
+            async with db.begin_nested():
+                for statement, params in statements:
+                    await db.execute(statement, params)
+    except Exception as e:
+        if commit:
+            await db.rollback()
+        logger.error(f"[Search] Failed to index report {report.id}: {e}")
+
+
+def _fts5_query(term: str) -> str:
+    """User text -> safe FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", term)
+    if not words:
+        return None
+    quoted = ['"' + w.replace('"', '""') + '"' for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_matches(db, term: str, patient_id: str):
+    """
+    Subquery of (report_id, score) for reports matching `term`, higher score = more relevant.
+    None when the term has no searchable words.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return text("""
+            SELECT report_id, ts_rank(document, websearch_to_tsquery('english', :term)) AS score
+            FROM session_search
+            WHERE patient_id = :patient_id AND document @@ websearch_to_tsquery('english', :term)
+        """).bindparams(term=term, patient_id=patient_id).columns(report_id=Integer, score=Float).subquery("matches")
+
+    match = _fts5_query(term)
+    if not match:
+        return None
+    # bm25() is lower-is-better; names weigh 4x the body
+    return text("""
+        SELECT rowid AS report_id, -bm25(session_search, 4.0, 1.0) AS score
+        FROM session_search
+        WHERE session_search MATCH :match AND patient_id = :patient_id
+    """).bindparams(match=match, patient_id=patient_id).columns(report_id=Integer, score=Float).subquery("matches")
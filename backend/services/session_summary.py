@@ -0,0 +1,94 @@
+import json
+import re
+
+SUMMARY_MAX_CHARS = 240
+
+# Notes emitted by the frontend physics engines / safety checks
+_REP_NOTE = re.compile(r"\[EVENT\].*\b(?:rep|curl|slide|raise)\b.*completed", re.IGNORECASE)
+_SAFETY_NOTE = re.compile(r"SAFETY_STOP|high velocity|safety concern", re.IGNORECASE)
+
+
+def _as_dict(report_json) -> dict:
+    if isinstance(report_json, dict):
+        return report_json
+    try:
+        parsed = json.loads(report_json) if report_json else {}
+        return parsed if isinstance(parsed, dict) else {}
+    except (TypeError, ValueError):
+        return {}
+
+
+def extract_activity_name(report: dict):
+    """Exercise name from the report, across the shapes older report versions used."""
+    # Path 1: Top-level (some versions)
+    if "activity_name" in report:
+        return report["activity_name"]
+    overview = report.get("session_overview")
+    # Path 2: Session Overview (older versions)
+    if isinstance(overview, dict):
+        return overview.get("activity")
+    # Path 3: Session Overview text (if string)
+    if isinstance(overview, list):
+        for line in overview:
+            if isinstance(line, str) and "Activity:" in line:
+                return line.split(":", 1)[1].strip()
+    return None
+
+
+def _short_summary(report: dict):
+    """The model's 'thoughts', else the first prose paragraph of the markdown, truncated."""
+    text = report.get("thoughts")
+    if not text:
+        for block in (report.get("report_markdown") or report.get("report") or "").split("\n\n"):
+            block = block.strip()
+            if block and not block.startswith(("#", "|", "```", "---")):
+                text = block
+                break
+    if not text or not isinstance(text, str):
+        return None
+    text = " ".join(text.split())
+    return text if len(text) <= SUMMARY_MAX_CHARS else text[:SUMMARY_MAX_CHARS - 1].rstrip() + "…"
+
+
+def summarize_report(report_json, clinical_notes=None, exercise_session=None) -> dict:
+    """
+    Summary columns for a SessionReport row: activity_name, duration_seconds, rep_count,
+    safety_flag_count, summary. `exercise_session` (optional) supplies name, duration and reps.
+    """
+    report = _as_dict(report_json)
+    notes = [n for n in (clinical_notes if clinical_notes is not None else report.get("clinical_notes")) or []
+             if isinstance(n, str)]
+
+    activity_name = extract_activity_name(report)
+    duration_seconds = None
+    rep_count = None
+    if exercise_session is not None:
+        activity_name = activity_name or exercise_session.exercise_name or exercise_session.exercise_id
+        if exercise_session.start_time and exercise_session.end_time:
+            duration_seconds = int((exercise_session.end_time - exercise_session.start_time).total_seconds())
+        reps = (exercise_session.metrics or {}).get("reps")
+        if isinstance(reps, (int, float)):
+            rep_count = int(reps)
+    if rep_count is None:
+        rep_count = sum(1 for n in notes if _REP_NOTE.search(n))
+
+    return {
+        "activity_name": activity_name or "Unknown Exercise",
+        "duration_seconds": duration_seconds,
+        "rep_count": rep_count,
+        "safety_flag_count": sum(1 for n in notes if _SAFETY_NOTE.search(n)),
+        "summary": _short_summary(report),
+    }
+
+
+SUMMARY_FIELDS = ("activity_name", "duration_seconds", "rep_count", "safety_flag_count", "summary")
+
+
+def summary_columns(model):
+    """The materialized summary columns of `model` (SessionReport), for column-only list queries."""
+    return [getattr(model, field) for field in SUMMARY_FIELDS]
+
+
+def summary_fields(row) -> dict:
+    """Summary columns of a SessionReport row (or a column-projected row) as a dict."""
+    return {field: getattr(row, field) for field in SUMMARY_FIELDS}
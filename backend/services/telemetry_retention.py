@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import random
+import time
+from collections import OrderedDict
+from sqlalchemy import select, delete, func
+try:
+    from database import SessionLocal, TelemetrySegment, TelemetrySummary
+except ImportError:
+    from backend.database import SessionLocal, TelemetrySegment, TelemetrySummary
+try:
+    from services.telemetry_store import (
+        FORMAT_VERSION, concat_columns, decode_telemetry, downsample_columns, encode_columns,
+        merge_summaries, rep_summaries, summarize_telemetry,
+    )
+except ImportError:
+    from backend.services.telemetry_store import (
+        FORMAT_VERSION, concat_columns, decode_telemetry, downsample_columns, encode_columns,
+        merge_summaries, rep_summaries, summarize_telemetry,
+    )
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import (
+        TELEMETRY_RAW_RETENTION_DAYS, TELEMETRY_DOWNSAMPLED_RETENTION_DAYS, TELEMETRY_DOWNSAMPLE_HZ,
+        TELEMETRY_COMPACTION_INTERVAL_MINUTES, TELEMETRY_COMPACTION_BATCH_SIZE,
+        TELEMETRY_COMPACTION_MAX_BATCHES, TELEMETRY_COMPACTION_PAUSE_SECONDS,
+    )
+except ImportError:
+    from backend.config import (
+        TELEMETRY_RAW_RETENTION_DAYS, TELEMETRY_DOWNSAMPLED_RETENTION_DAYS, TELEMETRY_DOWNSAMPLE_HZ,
+        TELEMETRY_COMPACTION_INTERVAL_MINUTES, TELEMETRY_COMPACTION_BATCH_SIZE,
+        TELEMETRY_COMPACTION_MAX_BATCHES, TELEMETRY_COMPACTION_PAUSE_SECONDS,
+    )
+
+RAW, DOWNSAMPLED = "raw", "downsampled"
+# Sessions that failed to compact are skipped (NOT IN on the sweep query), at most this many,
+# and retried after FAILED_RETRY
+MAX_FAILED = 500
+FAILED_RETRY = datetime.timedelta(hours=24)
+
+
+class TelemetryCompactor:
+    """
+    Moves stored telemetry down the retention tiers (see config.py):
+    1. raw -> downsampled: per session, the raw segments become one downsampled segment plus a
+       TelemetrySummary (whole-session and per-rep figures computed from the raw samples).
+       Raw rows arriving after that are folded into the same segment and summary.
+    2. downsampled -> aggregate: downsampled segments past their retention are deleted; the
+       summary stays.
+    Work is done in batches of `batch_size` sessions/rows, one short transaction per session,
+    with a pause between batches, so ingestion and reads on session_telemetry are never
+    blocked for long. Every worker may run it: a session whose raw rows were already
+    deleted by someone else is rolled back and skipped.
+    """
+
+    def __init__(self, raw_days: int, downsampled_days: int, hz: float, interval_minutes: float,
+                 batch_size: int, max_batches: int, pause_seconds: float):
+        self.raw_days = raw_days
+        self.downsampled_days = downsampled_days
+        self.hz = hz
+        self.interval_seconds = interval_minutes * 60
+        self.batch_size = max(1, batch_size)
+        self.max_batches = max(1, max_batches)
+        self.pause_seconds = pause_seconds
+
+        self._task = None
+        self._failed = OrderedDict() # { session_uuid: failed_at } left raw for now, oldest first
+        self._stats = {
+            "runs": 0, "sessions_downsampled": 0, "segments_expired": 0, "sessions_skipped": 0,
+            "failures": 0, "bytes_before": 0, "bytes_after": 0, "last_run_at": None, "last_run_seconds": None,
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"[TelemetryCompactor] Started (raw {self.raw_days}d, downsampled {self.downsampled_days}d, "
+                    f"every {self.interval_seconds / 60:.0f}m)")
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _loop(self):
+        # Workers started together shouldn't sweep in the same second
+        await asyncio.sleep(random.uniform(0, min(60, self.interval_seconds)))
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"[TelemetryCompactor] Run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run(self) -> dict:
+        """One sweep of both tiers, bounded by max_batches each. Returns this run's counts."""
+        started = time.perf_counter()
+        now = datetime.datetime.utcnow()
+        counts = {"sessions_downsampled": 0, "segments_expired": 0}
+        for key, step, days in (("sessions_downsampled", self.downsample_batch, self.raw_days),
+                                ("segments_expired", self.expire_batch, self.downsampled_days)):
+            if not days:
+                continue # 0 = keep this tier forever
+            for _ in range(self.max_batches):
+                done, full = await asyncio.to_thread(step, now)
+                counts[key] += done
+                if not full:
+                    break
+                await asyncio.sleep(self.pause_seconds)
+
+        self._stats["runs"] += 1
+        self._stats["last_run_at"] = now.isoformat()
+        self._stats["last_run_seconds"] = round(time.perf_counter() - started, 2)
+        if counts["sessions_downsampled"] or counts["segments_expired"]:
+            logger.info(f"[TelemetryCompactor] Downsampled {counts['sessions_downsampled']} sessions, "
+                        f"expired {counts['segments_expired']} segments")
+        return counts
+
+    def downsample_batch(self, now: datetime.datetime):
+        """Compacts up to batch_size sessions with raw segments past retention. (compacted, batch was full)"""
+        cutoff = now - datetime.timedelta(days=self.raw_days)
+        while self._failed and next(iter(self._failed.values())) < now - FAILED_RETRY:
+            self._failed.popitem(last=False)
+        db = SessionLocal()
+        try:
+            query = select(TelemetrySegment.patient_id, TelemetrySegment.session_uuid).where(
+                TelemetrySegment.tier == RAW, TelemetrySegment.created_at < cutoff
+            )
+            if self._failed:
+                query = query.where(TelemetrySegment.session_uuid.not_in(list(self._failed)))
+            sessions = db.execute(query.distinct().limit(self.batch_size)).all()
+            compacted = sum(self._compact_session(db, s.patient_id, s.session_uuid) for s in sessions)
+            return compacted, len(sessions) == self.batch_size
+        finally:
+            db.close()
+
+    def _segments(self, db, patient_id: str, session_uuid: str, tier: str):
+        return db.execute(
+            select(TelemetrySegment.id, TelemetrySegment.data, TelemetrySegment.created_at)
+            .where(TelemetrySegment.patient_id == patient_id, TelemetrySegment.session_uuid == session_uuid,
+                   TelemetrySegment.tier == tier)
+            .order_by(TelemetrySegment.t_start, TelemetrySegment.id)
+        ).all()
+
+    def _compact_session(self, db, patient_id: str, session_uuid: str) -> bool:
+        try:
+            rows = self._segments(db, patient_id, session_uuid, RAW)
+            if not rows:
+                return False
+            columns = concat_columns([decode_telemetry(r.data) for r in rows])
+            reduced = downsample_columns(columns, self.hz)
+            summary = summarize_telemetry(columns)
+            reps = rep_summaries(columns)
+
+            # Raw rows that arrived after the session was compacted: one segment for all of it
+            previous = self._segments(db, patient_id, session_uuid, DOWNSAMPLED)
+            if previous:
+                reduced = downsample_columns(
+                    concat_columns([decode_telemetry(r.data) for r in previous] + [reduced]), self.hz
+                )
+                rows = rows + previous
+            ids = [r.id for r in rows]
+
+            # Write phase: short, touches only this session's rows
+            deleted = db.execute(delete(TelemetrySegment).where(TelemetrySegment.id.in_(ids))).rowcount
+            if deleted != len(ids):
+                db.rollback() # Another worker compacted it first
+                self._stats["sessions_skipped"] += 1
+                return False
+            blob = None
+            if len(reduced["t"]):
+                blob = encode_columns(reduced)
+                db.add(TelemetrySegment(
+                    patient_id=patient_id, session_uuid=session_uuid, tier=DOWNSAMPLED,
+                    t_start=float(reduced["t"][0]), t_end=float(reduced["t"][-1]), samples=len(reduced["t"]),
+                    format=FORMAT_VERSION, data=blob,
+                    created_at=min(r.created_at for r in rows), # Ages from when the session was recorded
+                ))
+            existing = db.execute(select(TelemetrySummary).where(
+                TelemetrySummary.patient_id == patient_id, TelemetrySummary.session_uuid == session_uuid
+            )).scalar_one_or_none()
+            if existing:
+                # Its raw samples are gone: combine figures rather than recompute from downsampled data
+                existing.summary = merge_summaries(existing.summary or {}, summary)
+                existing.reps = sorted((existing.reps or []) + reps, key=lambda rep: rep["start"])
+            else:
+                db.add(TelemetrySummary(patient_id=patient_id, session_uuid=session_uuid, summary=summary, reps=reps))
+            db.commit()
+
+            self._stats["sessions_downsampled"] += 1
+            self._stats["bytes_before"] += sum(len(r.data) for r in rows)
+            self._stats["bytes_after"] += len(blob) if blob else 0
+            return True
+        except Exception as e:
+            db.rollback()
+            self._failed[session_uuid] = datetime.datetime.utcnow()
+            self._failed.move_to_end(session_uuid)
+            while len(self._failed) > MAX_FAILED:
+                self._failed.popitem(last=False) # Retried on the next sweep
+            self._stats["failures"] += 1
+            logger.error(f"[TelemetryCompactor] Could not compact session {session_uuid}: {e}")
+            return False
+
+    def expire_batch(self, now: datetime.datetime):
+        """Deletes up to batch_size downsampled segments past retention. (deleted, batch was full)"""
+        cutoff = now - datetime.timedelta(days=self.downsampled_days)
+        db = SessionLocal()
+        try:
+            ids = db.execute(select(TelemetrySegment.id).where(
+                TelemetrySegment.tier == DOWNSAMPLED, TelemetrySegment.created_at < cutoff
+            ).limit(self.batch_size)).scalars().all()
+            if not ids:
+                return 0, False
+            deleted = db.execute(delete(TelemetrySegment).where(TelemetrySegment.id.in_(ids))).rowcount
+            db.commit()
+            self._stats["segments_expired"] += deleted
+            return deleted, len(ids) == self.batch_size
+        finally:
+            db.close()
+
+    def tier_sizes(self) -> dict:
+        """Segments, samples and bytes stored per tier (full scan of the table: CLI / metrics only)."""
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(
+                TelemetrySegment.tier, func.count(TelemetrySegment.id), func.sum(TelemetrySegment.samples),
+                func.sum(func.length(TelemetrySegment.data)),
+            ).group_by(TelemetrySegment.tier)).all()
+            summaries = db.execute(select(func.count(TelemetrySummary.id))).scalar()
+        finally:
+            db.close()
+        tiers = {tier: {"segments": n, "samples": int(samples or 0), "bytes": int(size or 0)}
+                 for tier, n, samples, size in rows}
+        return {**tiers, "summaries": summaries}
+
+    def stats(self) -> dict:
+        before, after = self._stats["bytes_before"], self._stats["bytes_after"]
+        return {
+            **self._stats,
+            "compaction_ratio": round(before / after, 1) if after else None,
+            "failed_sessions": len(self._failed),
+            "running": bool(self._task and not self._task.done()),
+            "policy": {"raw_days": self.raw_days, "downsampled_days": self.downsampled_days, "downsample_hz": self.hz},
+        }
+
+
+telemetry_compactor = TelemetryCompactor(
+    TELEMETRY_RAW_RETENTION_DAYS, TELEMETRY_DOWNSAMPLED_RETENTION_DAYS, TELEMETRY_DOWNSAMPLE_HZ,
+    TELEMETRY_COMPACTION_INTERVAL_MINUTES, TELEMETRY_COMPACTION_BATCH_SIZE,
+    TELEMETRY_COMPACTION_MAX_BATCHES, TELEMETRY_COMPACTION_PAUSE_SECONDS,
+)
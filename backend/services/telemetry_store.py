@@ -0,0 +1,386 @@
+import math
+import struct
+import zlib
+import numpy as np
+from sqlalchemy import select
+try:
+    from database import AsyncSessionLocal, TelemetrySegment, TelemetrySummary
+except ImportError:
+    from backend.database import AsyncSessionLocal, TelemetrySegment, TelemetrySummary
+try:
+    from config import TELEMETRY_STORE_ENABLED, TELEMETRY_COMPRESSION_LEVEL
+except ImportError:
+    from backend.config import TELEMETRY_STORE_ENABLED, TELEMETRY_COMPRESSION_LEVEL
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+
+# Segment format 1 (little-endian):
+#   header  "TLM1", uint32 samples, uint16 landmarks, uint16 name bytes, landmark names (utf-8, comma separated)
+#   payload zlib of the columns t, val, vel, x per landmark, y per landmark, each:
+#       missing bitmap (packbits, 1 = NaN: landmark out of frame, non-numeric gauge), then its present values:
+#       kind 1 (scaled): uint8 decimals, int64 first value * 10^decimals, uint8 width, deltas (int8-64)
+#       kind 0 (raw):    float32
+# The client rounds its samples (t to 2 decimals, coordinates and velocity to 3), so most columns
+# are small integer steps at a fixed scale; a delta of a few thousandths fits one byte and
+# compresses well, where the same value as float32 has noisy low mantissa bits. A column is
+# only scaled when every value round-trips exactly, so decoding yields the same float32 either way.
+# Integer widths are byte-shuffled (all low bytes, then high bytes) before compression.
+FORMAT_VERSION = 1
+_MAGIC = b"TLM1"
+_HEADER = struct.Struct("<4sIHH")
+_SCALED = struct.Struct("<BBqB") # kind, decimals, first value, delta width
+_RAW_KIND, _SCALED_KIND = 0, 1
+MAX_DECIMALS = 4
+SCALAR_COLUMNS = ("t", "val", "vel")
+_WIDTHS = {1: np.int8, 2: np.int16, 4: np.int32, 8: np.int64}
+
+
+def _number(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def _landmark_order(names) -> list:
+    # MediaPipe indices sort numerically ("11" before "112"), anything else by name
+    return sorted(names, key=lambda n: (0, int(n), "") if n.isdigit() else (1, 0, n))
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def _unshuffle(raw: bytes, dtype, count: int) -> np.ndarray:
+    width = np.dtype(dtype).itemsize
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(width, count)
+    return planes.T.copy().view(dtype).reshape(count)
+
+
+def _encode_column(values: np.ndarray) -> bytes:
+    """float64 column -> missing bitmap + scaled deltas (or raw float32)."""
+    present = values[np.isfinite(values)]
+    out = np.packbits(~np.isfinite(values)).tobytes()
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        scaled = np.round(present * scale)
+        if np.array_equal(scaled / scale, present) and (not len(scaled) or np.abs(scaled).max() < 2 ** 53):
+            ints = scaled.astype(np.int64)
+            deltas = np.diff(ints)
+            peak = int(np.abs(deltas).max()) if len(deltas) else 0
+            width = next(w for w, dtype in _WIDTHS.items() if peak <= np.iinfo(dtype).max)
+            first = int(ints[0]) if len(ints) else 0
+            return out + _SCALED.pack(_SCALED_KIND, decimals, first, width) + _shuffle(deltas.astype(_WIDTHS[width]))
+    return out + bytes([_RAW_KIND]) + _shuffle(present.astype(np.float32))
+
+
+def _decode_column(buffer: bytes, offset: int, n: int):
+    """(float32 column, next offset)"""
+    mask_bytes = (n + 7) // 8
+    missing = np.unpackbits(np.frombuffer(buffer, np.uint8, mask_bytes, offset), count=n).astype(bool)
+    offset += mask_bytes
+    count = n - int(missing.sum())
+    if buffer[offset] == _RAW_KIND:
+        present = _unshuffle(buffer[offset + 1:offset + 1 + 4 * count], np.float32, count)
+        offset += 1 + 4 * count
+    else:
+        _, decimals, first, width = _SCALED.unpack_from(buffer, offset)
+        offset += _SCALED.size
+        size = width * max(count - 1, 0)
+        deltas = _unshuffle(buffer[offset:offset + size], _WIDTHS[width], max(count - 1, 0))
+        offset += size
+        ints = np.empty(count, dtype=np.int64)
+        if count:
+            ints[0] = first
+            ints[1:] = deltas
+            np.cumsum(ints, out=ints)
+        present = (ints / 10.0 ** decimals).astype(np.float32)
+    if count == n:
+        return present, offset
+    column = np.full(n, np.nan, dtype=np.float32)
+    column[~missing] = present
+    return column, offset
+
+
+def _encode_matrix(landmarks: list, matrix: np.ndarray) -> bytes:
+    names = ",".join(landmarks).encode()
+    header = _HEADER.pack(_MAGIC, matrix.shape[1], len(landmarks), len(names)) + names
+    payload = b"".join(_encode_column(row) for row in matrix)
+    return header + zlib.compress(payload, TELEMETRY_COMPRESSION_LEVEL)
+
+
+def encode_telemetry(samples: list) -> bytes:
+    """Client telemetry samples ({t, val, vel, coords: {landmark: {x, y}}}) -> one compressed segment."""
+    landmarks = _landmark_order({str(k) for s in samples for k in (s.get("coords") or {})})
+    index = {name: i for i, name in enumerate(landmarks)}
+    n, count = len(samples), len(landmarks)
+
+    matrix = np.full((3 + 2 * count, n), np.nan)
+    for col, sample in enumerate(samples):
+        matrix[0, col] = _number(sample.get("t"))
+        matrix[1, col] = _number(sample.get("val"))
+        matrix[2, col] = _number(sample.get("vel"))
+        for name, point in (sample.get("coords") or {}).items():
+            if isinstance(point, dict):
+                row = index[str(name)]
+                matrix[3 + row, col] = _number(point.get("x"))
+                matrix[3 + count + row, col] = _number(point.get("y"))
+    return _encode_matrix(landmarks, matrix)
+
+
+def encode_columns(columns: dict) -> bytes:
+    """NumPy columns (the shape decode_telemetry returns) -> one compressed segment."""
+    matrix = np.vstack([columns["t"], columns["val"], columns["vel"], columns["x"], columns["y"]]).astype(np.float64)
+    return _encode_matrix(list(columns["landmarks"]), matrix)
+
+
+def decode_telemetry(blob: bytes) -> dict:
+    """
+    One segment -> {"t", "val", "vel": float32 (n,), "landmarks": [names],
+    "x", "y": float32 (landmarks, n)}.
+    """
+    magic, n, count, name_bytes = _HEADER.unpack_from(blob)
+    if magic != _MAGIC:
+        raise ValueError("Not a telemetry segment")
+    offset = _HEADER.size + name_bytes
+    names = bytes(blob[_HEADER.size:offset]).decode()
+    payload = zlib.decompress(blob[offset:])
+    matrix, offset = np.empty((3 + 2 * count, n), dtype=np.float32), 0
+    for row in range(3 + 2 * count):
+        matrix[row], offset = _decode_column(payload, offset, n)
+    return {
+        "t": matrix[0], "val": matrix[1], "vel": matrix[2],
+        "landmarks": names.split(",") if names else [],
+        "x": matrix[3:3 + count], "y": matrix[3 + count:],
+    }
+
+
+def empty_columns() -> dict:
+    empty = np.empty(0, dtype=np.float32)
+    return {"t": empty, "val": empty, "vel": empty, "landmarks": [],
+            "x": np.empty((0, 0), dtype=np.float32), "y": np.empty((0, 0), dtype=np.float32)}
+
+
+def concat_columns(parts: list) -> dict:
+    """
+    Joins decoded segments into one time-ordered set of columns. Landmarks missing from a
+    segment are NaN there; samples with a repeated timestamp (a retried chunk) are kept once.
+    """
+    if not parts:
+        return empty_columns()
+    landmarks = _landmark_order({name for part in parts for name in part["landmarks"]})
+    index = {name: i for i, name in enumerate(landmarks)}
+    columns = {key: np.concatenate([part[key] for part in parts]) for key in SCALAR_COLUMNS}
+
+    total = len(columns["t"])
+    xs = np.full((len(landmarks), total), np.nan, dtype=np.float32)
+    ys = np.full((len(landmarks), total), np.nan, dtype=np.float32)
+    start = 0
+    for part in parts:
+        end = start + len(part["t"])
+        rows = [index[name] for name in part["landmarks"]]
+        xs[rows, start:end] = part["x"]
+        ys[rows, start:end] = part["y"]
+        start = end
+
+    order = np.argsort(columns["t"], kind="stable")
+    t = columns["t"][order]
+    keep = order[np.concatenate(([True], np.diff(t) > 0))] if total else order
+    return {
+        **{key: columns[key][keep] for key in SCALAR_COLUMNS},
+        "landmarks": landmarks, "x": xs[:, keep], "y": ys[:, keep],
+    }
+
+
+def summarize_telemetry(columns: dict) -> dict:
+    """Vectorized per-session figures: duration, sample rate, metric range (ROM), velocity, landmark travel."""
+    t, val, vel = columns["t"], columns["val"], columns["vel"]
+    if not len(t):
+        return {"samples": 0}
+    duration = float(t[-1] - t[0])
+    has_val, has_vel = bool(np.isfinite(val).any()), bool(np.isfinite(vel).any())
+    # Path length of each landmark in normalized image units; an out-of-frame gap joins its ends
+    travel = []
+    for x, y in zip(columns["x"], columns["y"]):
+        seen = np.isfinite(x) & np.isfinite(y)
+        travel.append(np.hypot(np.diff(x[seen]), np.diff(y[seen])).sum())
+    return {
+        "samples": int(len(t)),
+        "t_start": round(float(t[0]), 2),
+        "t_end": round(float(t[-1]), 2),
+        "duration_seconds": round(duration, 2),
+        "sample_rate_hz": round((len(t) - 1) / duration, 2) if duration > 0 else None,
+        "val_min": round(float(np.nanmin(val)), 2) if has_val else None,
+        "val_max": round(float(np.nanmax(val)), 2) if has_val else None,
+        "range_of_motion": round(float(np.nanmax(val) - np.nanmin(val)), 2) if has_val else None,
+        "peak_velocity": round(float(np.nanmax(np.abs(vel))), 3) if has_vel else None,
+        "mean_velocity": round(float(np.nanmean(np.abs(vel))), 3) if has_vel else None,
+        "landmark_travel": {name: round(float(d), 3) for name, d in zip(columns["landmarks"], travel)},
+    }
+
+
+def merge_summaries(first: dict, second: dict) -> dict:
+    """
+    summarize_telemetry() of two disjoint sample sets of one session combined (raw rows that
+    arrived after the session was compacted). Extremes and counts are exact, mean velocity is
+    sample-weighted, landmark travel leaves out the step between the two sets.
+    """
+    if not first.get("samples"):
+        return second
+    if not second.get("samples"):
+        return first
+    parts = (first, second)
+
+    def pick(key, fn):
+        values = [p[key] for p in parts if p.get(key) is not None]
+        return fn(values) if values else None
+
+    samples = first["samples"] + second["samples"]
+    t_start, t_end = pick("t_start", min), pick("t_end", max)
+    if all(p.get("t_start") is not None for p in parts):
+        duration = t_end - t_start
+    else:
+        duration = sum(p.get("duration_seconds") or 0 for p in parts) # Stored before spans were kept
+    val_min, val_max = pick("val_min", min), pick("val_max", max)
+    weighted = [(p["mean_velocity"], p["samples"]) for p in parts if p.get("mean_velocity") is not None]
+    travel = dict(first.get("landmark_travel") or {})
+    for name, d in (second.get("landmark_travel") or {}).items():
+        travel[name] = round(travel.get(name, 0.0) + d, 3)
+    return {
+        "samples": samples,
+        "t_start": t_start,
+        "t_end": t_end,
+        "duration_seconds": round(duration, 2),
+        "sample_rate_hz": round((samples - 1) / duration, 2) if duration > 0 else None,
+        "val_min": val_min,
+        "val_max": val_max,
+        "range_of_motion": round(val_max - val_min, 2) if val_min is not None else None,
+        "peak_velocity": pick("peak_velocity", max),
+        "mean_velocity": round(sum(v * n for v, n in weighted) / sum(n for _, n in weighted), 3) if weighted else None,
+        "landmark_travel": travel,
+    }
+
+
+def downsample_columns(columns: dict, hz: float = 1.0) -> dict:
+    """
+    Means over 1/hz-second buckets (NaN-aware), rounded to the client's precision so the
+    downsampled segment still encodes as small integer steps. Peaks are not kept here:
+    rep_summaries() holds the per-rep extremes.
+    """
+    t = columns["t"].astype(np.float64)
+    if not len(t):
+        return empty_columns()
+    buckets, inverse = np.unique(np.floor(t * hz), return_inverse=True)
+
+    def means(values, decimals):
+        values = values.astype(np.float64)
+        seen = np.isfinite(values)
+        totals = np.bincount(inverse, weights=np.where(seen, values, 0.0), minlength=len(buckets))
+        counts = np.bincount(inverse, weights=seen, minlength=len(buckets))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.round(totals / counts, decimals) # 0/0 -> NaN: nothing seen in that bucket
+
+    return {
+        "t": means(t, 2), "val": means(columns["val"], 2), "vel": means(columns["vel"], 3),
+        "landmarks": list(columns["landmarks"]),
+        "x": np.array([means(row, 3) for row in columns["x"]]).reshape(len(columns["landmarks"]), len(buckets)),
+        "y": np.array([means(row, 3) for row in columns["y"]]).reshape(len(columns["landmarks"]), len(buckets)),
+    }
+
+
+def rep_summaries(columns: dict, min_range: float = 5.0) -> list:
+    """
+    Splits the `val` trajectory into repetitions: a rep runs from leaving the rest side of
+    the motion (whichever side the session starts on) to the next return to it, with a
+    hysteresis band so tremor around the midline doesn't count. Per rep: start/end time,
+    duration, min/max/range of `val` and peak |vel|. Empty if the motion spans < `min_range`.
+    """
+    seen = np.isfinite(columns["val"]) & np.isfinite(columns["t"])
+    t, val = columns["t"][seen].astype(np.float64), columns["val"][seen].astype(np.float64)
+    vel = np.abs(np.nan_to_num(columns["vel"][seen].astype(np.float64)))
+    if len(val) < 4:
+        return []
+    low, high = np.percentile(val, [10, 90])
+    if high - low < min_range:
+        return []
+    mid, band = (low + high) / 2, (high - low) * 0.15
+    state = np.where(val > mid + band, 1, np.where(val < mid - band, -1, 0))
+    classified = np.flatnonzero(state) # Samples inside the band keep the previous side
+    sides = state[classified]
+    flips = np.flatnonzero(np.diff(sides)) + 1
+    returns = flips[sides[flips] == sides[0]] # Back on the rest side: the previous rep is complete
+    bounds = classified[np.concatenate(([0], returns))]
+    if len(bounds) < 2:
+        return []
+    # reduceat covers [bound_i, bound_i+1); the last slice is an unfinished rep
+    mins = np.minimum.reduceat(val, bounds)[:-1]
+    maxs = np.maximum.reduceat(val, bounds)[:-1]
+    peaks = np.maximum.reduceat(vel, bounds)[:-1]
+    return [{
+        "start": round(float(t[a]), 2), "end": round(float(t[b]), 2), "duration": round(float(t[b] - t[a]), 2),
+        "val_min": round(float(lo), 2), "val_max": round(float(hi), 2), "range": round(float(hi - lo), 2),
+        "peak_velocity": round(float(peak), 3),
+    } for a, b, lo, hi, peak in zip(bounds[:-1], bounds[1:], mins, maxs, peaks)]
+
+
+def segment_row(patient_id: str, session_uuid: str, samples: list):
+    """TelemetrySegment for a chunk's samples, or None if it carries no timestamps."""
+    samples = [s for s in samples if isinstance(s, dict)]
+    times = [t for t in (_number(s.get("t")) for s in samples) if not math.isnan(t)]
+    if not times:
+        return None
+    return TelemetrySegment(
+        patient_id=patient_id, session_uuid=session_uuid,
+        t_start=min(times), t_end=max(times), samples=len(samples),
+        format=FORMAT_VERSION, data=encode_telemetry(samples),
+    )
+
+
+async def store_telemetry_chunk(patient_id: str, session_uuid: str, samples):
+    """Background task for /session/chunk: appends the chunk's samples as one segment."""
+    if not TELEMETRY_STORE_ENABLED or not session_uuid or not isinstance(samples, list) or not samples:
+        return
+    try:
+        row = segment_row(patient_id, session_uuid, samples)
+        if row is None:
+            return
+        async with AsyncSessionLocal() as db:
+            db.add(row)
+            await db.commit()
+    except Exception as e:
+        logger.error(f"[Telemetry] Failed to store chunk for {session_uuid}: {e}")
+
+
+async def load_session_telemetry(db, patient_id: str, session_uuid: str, tier: str = "raw") -> dict:
+    """
+    Stored telemetry of a session as NumPy columns (AsyncSession). See decode_telemetry.
+    tier="downsampled" reads the reduced segment left once the raw samples aged out.
+    """
+    blobs = (await db.execute(
+        select(TelemetrySegment.data)
+        .where(TelemetrySegment.patient_id == patient_id, TelemetrySegment.session_uuid == session_uuid,
+               TelemetrySegment.tier == tier)
+        .order_by(TelemetrySegment.t_start, TelemetrySegment.id)
+    )).scalars().all()
+    return concat_columns([decode_telemetry(blob) for blob in blobs])
+
+
+async def session_telemetry_summary(db, patient_id: str, session_uuid: str):
+    """
+    Whole-session and per-rep figures: computed from the raw samples while they are kept,
+    then read from the summary stored at compaction. None if nothing was ever stored.
+    """
+    columns = await load_session_telemetry(db, patient_id, session_uuid)
+    if len(columns["t"]):
+        return {"tier": "raw", **summarize_telemetry(columns), "reps": rep_summaries(columns)}
+    stored = (await db.execute(select(TelemetrySummary).where(
+        TelemetrySummary.patient_id == patient_id, TelemetrySummary.session_uuid == session_uuid
+    ))).scalar_one_or_none()
+    if stored is None:
+        return None
+    downsampled = (await db.execute(select(TelemetrySegment.id).where(
+        TelemetrySegment.patient_id == patient_id, TelemetrySegment.session_uuid == session_uuid,
+        TelemetrySegment.tier == "downsampled"
+    ).limit(1))).first()
+    return {"tier": "downsampled" if downsampled else "aggregate", **stored.summary, "reps": stored.reps}
@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import time
+from collections import defaultdict
+from sqlalchemy import case, extract, func
+from sqlalchemy.orm import Session
+try:
+    from database import SessionLocal, ModelUsage, ExerciseSession
+except ImportError:
+    from backend.database import SessionLocal, ModelUsage, ExerciseSession
+try:
+    from utils.logging import logger
+except ImportError:
+    from backend.utils.logging import logger
+try:
+    from config import USAGE_FLUSH_BATCH_SIZE, USAGE_FLUSH_INTERVAL_SECONDS
+except ImportError:
+    from backend.config import USAGE_FLUSH_BATCH_SIZE, USAGE_FLUSH_INTERVAL_SECONDS
+
+
+def usage_counts(usage):
+    """(input_tokens, output_tokens) from a GenerateContentResponse/LiveServerMessage usage_metadata."""
+    if not usage:
+        return 0, 0
+    input_tokens = getattr(usage, "prompt_token_count", None) or 0
+    # REST responses report candidates_token_count, Live reports response_token_count
+    output_tokens = (getattr(usage, "candidates_token_count", None)
+                     or getattr(usage, "response_token_count", None) or 0)
+    output_tokens += getattr(usage, "thoughts_token_count", None) or 0
+    return input_tokens, output_tokens
+
+
+class UsageTracker:
+    """
+    Buffers one row per model call and writes them to `model_usage` in batches,
+    either when the buffer fills or every few seconds, off the event loop.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._flusher = None
+
+    def record(self, call_type: str, usage=None, started: float = None, session_id: str = None,
+               mode: str = None, model: str = None, input_tokens: int = None, output_tokens: int = None):
+        """
+        Records a model call. Pass `usage` (usage_metadata) or explicit token counts,
+        and `started` (time.time() right before the call) to capture latency.
+        """
+        if usage is not None:
+            input_tokens, output_tokens = usage_counts(usage)
+        self._buffer.append({
+            "timestamp": datetime.datetime.utcnow(),
+            "session_id": session_id,
+            "mode": mode,
+            "call_type": call_type,
+            "model": model,
+            "input_tokens": input_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "latency_ms": int((time.time() - started) * 1000) if started else None,
+        })
+
+        if len(self._buffer) >= self.batch_size:
+            self._spawn_flush()
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            try:
+                self._flusher = asyncio.get_running_loop().create_task(self._periodic_flush())
+            except RuntimeError:
+                pass # No loop (scripts): rows are written on the next flush()
+
+    def _spawn_flush(self):
+        try:
+            asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            self._write(self._take())
+
+    async def _periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._buffer:
+                return # Re-armed by the next record()
+
+    def _take(self):
+        rows, self._buffer = self._buffer, []
+        return rows
+
+    @staticmethod
+    def _write(rows):
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(ModelUsage, rows)
+            db.commit()
+        except Exception as e:
+            logger.error(f"[UsageTracker] Failed to write {len(rows)} usage rows: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    async def flush(self):
+        rows = self._take()
+        if rows:
+            await asyncio.to_thread(self._write, rows)
+
+
+def _percentile(values, q):
+    """`values` must already be sorted (the latency query orders them)."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _session_minutes(dialect: str):
+    """Session length in minutes (0 if the clock went backwards) as a SQL expression."""
+    start, end = ExerciseSession.start_time, ExerciseSession.end_time
+    if dialect == "sqlite":
+        seconds = (func.julianday(end) - func.julianday(start)) * 86400
+    else:
+        seconds = extract("epoch", end - start)
+    return case((seconds > 0, seconds), else_=0) / 60
+
+
+def summarize_usage(db: Session, days: int = 7):
+    """
+    Aggregates model_usage over the last `days`:
+    per (day, mode): calls, tokens, p50/p95 latency and tokens per session-minute,
+    plus a per call_type breakdown to find the most expensive paths.
+    Counts and sums are GROUP BY queries; only latencies are fetched row by row.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    recent = ModelUsage.timestamp >= since
+    tokens = func.coalesce(ModelUsage.input_tokens, 0) + func.coalesce(ModelUsage.output_tokens, 0)
+    minutes = _session_minutes(db.bind.dialect.name)
+    day = func.date(ModelUsage.timestamp).label("day")
+    mode = func.coalesce(ModelUsage.mode, "UNKNOWN").label("mode")
+    call_type = func.coalesce(ModelUsage.call_type, "unknown").label("call_type")
+
+    def bucket():
+        return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "latencies": [],
+                "sessions": 0, "session_tokens": 0, "session_minutes": 0}
+
+    def aggregate(*keys):
+        groups = defaultdict(bucket)
+        for row in db.query(
+            *keys, func.count().label("calls"),
+            func.coalesce(func.sum(ModelUsage.input_tokens), 0).label("input_tokens"),
+            func.coalesce(func.sum(ModelUsage.output_tokens), 0).label("output_tokens"),
+        ).filter(recent).group_by(*keys):
+            b = groups[tuple(str(k) for k in row[:len(keys)])]
+            b["calls"], b["input_tokens"], b["output_tokens"] = row.calls, row.input_tokens, row.output_tokens
+
+        # Tokens per group and session, then joined to the (finished) sessions for their length
+        per_session = db.query(
+            *keys, ModelUsage.session_id.label("session_id"), func.sum(tokens).label("tokens")
+        ).filter(recent, ModelUsage.session_id.isnot(None)).group_by(*keys, ModelUsage.session_id).subquery()
+        group_cols = [per_session.c[k.name] for k in keys]
+        for row in db.query(
+            *group_cols, func.count().label("sessions"),
+            func.sum(per_session.c.tokens).label("session_tokens"), func.sum(minutes).label("session_minutes"),
+        ).join(ExerciseSession, ExerciseSession.session_uuid == per_session.c.session_id).filter(
+            ExerciseSession.end_time.isnot(None)
+        ).group_by(*group_cols):
+            b = groups[tuple(str(k) for k in row[:len(keys)])]
+            b["sessions"], b["session_tokens"], b["session_minutes"] = row.sessions, row.session_tokens, float(row.session_minutes or 0)
+        return groups
+
+    by_day_mode = aggregate(day, mode)
+    by_call_type = aggregate(call_type)
+
+    # Percentiles need the values: fetch just the latency (and its group keys), already sorted
+    for row in db.query(day, mode, call_type, ModelUsage.latency_ms).filter(
+        recent, ModelUsage.latency_ms.isnot(None)
+    ).order_by(ModelUsage.latency_ms):
+        by_day_mode[(str(row.day), row.mode)]["latencies"].append(row.latency_ms)
+        by_call_type[(row.call_type,)]["latencies"].append(row.latency_ms)
+
+    def render(b):
+        return {
+            "calls": b["calls"],
+            "input_tokens": b["input_tokens"],
+            "output_tokens": b["output_tokens"],
+            "latency_ms_p50": _percentile(b["latencies"], 0.50),
+            "latency_ms_p95": _percentile(b["latencies"], 0.95),
+            "sessions": b["sessions"],
+            "tokens_per_session_minute": round(b["session_tokens"] / b["session_minutes"], 1) if b["session_minutes"] else None,
+        }
+
+    return {
+        "days": days,
+        "by_day": [{"date": day, "mode": mode, **render(b)} for (day, mode), b in sorted(by_day_mode.items())],
+        "by_call_type": {call_type: render(b) for (call_type,), b in sorted(by_call_type.items())},
+    }
+
+
+# Shared by every model caller in the process
+usage_tracker = UsageTracker(USAGE_FLUSH_BATCH_SIZE, USAGE_FLUSH_INTERVAL_SECONDS)
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolMonitor:
+    """Checkout wait time, saturation and timeouts for one engine's connection pool."""
+
+    def __init__(self, name: str, latency_window: int = 2000):
+        self.name = name
+        self.pool = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self._waits_ms = deque(maxlen=latency_window)
+        self._lock = threading.Lock() # The sync pool is used from worker threads
+
+    def observe(self, pool, waited_seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.pool = pool
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self._waits_ms.append(waited_seconds * 1000)
+            self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+        pool = self.pool
+        capacity = pool.size() + pool._max_overflow if pool is not None else None
+        checked_out = max(0, pool.checkedout()) if pool is not None else 0
+        return {
+            "pool_size": pool.size() if pool is not None else None,
+            "max_overflow": pool._max_overflow if pool is not None else None,
+            "checked_out": checked_out,
+            "idle": pool.checkedin() if pool is not None else None,
+            "saturation": round(checked_out / capacity, 3) if capacity else None,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms": {
+                "p50": round(waits[len(waits) // 2], 2) if waits else None,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+                "max": round(waits[-1], 2) if waits else None,
+            },
+        }
+
+
+def monitored_pool(pool_class, monitor: PoolMonitor):
+    """Subclass of `pool_class` that reports each checkout's wait to `monitor` (create_engine(poolclass=...))."""
+
+    class MonitoredPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except Exception:
+                # Pool timeout (or connect failure): the caller waited and got nothing
+                monitor.observe(self, time.perf_counter() - started, timed_out=True)
+                raise
+            monitor.observe(self, time.perf_counter() - started)
+            return conn
+
+    MonitoredPool.__name__ = f"Monitored{pool_class.__name__}"
+    return MonitoredPool
+
+
+sync_pool_monitor = PoolMonitor("sync")
+async_pool_monitor = PoolMonitor("async")
+
+
+def pool_stats() -> dict:
+    return {"async": async_pool_monitor.stats(), "sync": sync_pool_monitor.stats()}
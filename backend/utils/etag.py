@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from fastapi import Request, Response
+
+# Browsers revalidate every poll (no-cache) and reuse their stored body on 304.
+# Responses differ per patient for the same URL, so the cache must key on the header too.
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "X-Patient-Id"}
+
+
+class EtagStats:
+    """Per-route conditional GET counts: full responses vs 304s."""
+
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, not_modified: bool):
+        with self._lock:
+            stats = self.routes.setdefault(route, {"requests": 0, "not_modified": 0})
+            stats["requests"] += 1
+            stats["not_modified"] += not_modified
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                route: {**s, "hit_rate": round(s["not_modified"] / s["requests"], 3)}
+                for route, s in sorted(self.routes.items())
+            }
+
+
+etag_stats = EtagStats()
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110): proxies may have weakened our tag
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def conditional_get(request: Request, response: Response, *state):
+    """
+    ETag from the request URL (path + query) and `state` (data version, patient, ...).
+    Returns a 304 Response when the client already has it; otherwise sets the ETag on
+    `response` and returns None so the handler builds the full payload.
+    Call it before reading the data, so a concurrent write can only make the tag older.
+    """
+    etag = make_etag(request.url.path, request.url.query, *state)
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else request.url.path
+    if _matches(request.headers.get("if-none-match"), etag):
+        etag_stats.record(route_path, True)
+        return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+    etag_stats.record(route_path, False)
+    response.headers["ETag"] = etag
+    response.headers.update(CACHE_HEADERS)
+    return None
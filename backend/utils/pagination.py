@@ -0,0 +1,73 @@
+import base64
+import datetime
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 200
+MAX_ROW_ID = 2 ** 63 - 1 # BIGINT / SQLite INTEGER range
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: int) -> str:
+    """Opaque cursor for the last row of a page."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(timestamp, id) from a cursor; 400 on anything we didn't issue."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        timestamp, row_id = datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Decodable but not ours (stored timestamps are naive UTC): it would fail in the query instead
+    if timestamp.tzinfo is not None or not 0 < row_id <= MAX_ROW_ID:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, row_id
+
+
+async def keyset_page(db, stmt, timestamp_col, id_col, cursor: str = None, limit: int = 50, key=None):
+    """
+    Newest-first page of the select `stmt` (run on AsyncSession `db`) ordered by (timestamp, id), both descending.
+    Resumes strictly after `cursor` with a row-value comparison, so every page is one
+    index range scan (no OFFSET). `key(row)` -> (timestamp, id) for the cursor of the last row.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        after_ts, after_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(timestamp_col, id_col) < tuple_(after_ts, after_id))
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.execute(stmt.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    timestamp, row_id = key(rows[-1]) if key else (rows[-1].timestamp, rows[-1].id)
+    return rows, encode_cursor(timestamp, row_id)
+
+
+async def ranked_page(db, stmt, order_by, cursor: str = None, limit: int = 50):
+    """
+    Page of a relevance-ranked query (e.g. full-text search), where there is no stable
+    column to seek on. The cursor carries the rank offset; cost grows with the number of
+    matches skipped, not with table size. Returns (rows, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = 0
+    if cursor:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            offset = int(raw.split("rank:", 1)[1])
+        except (ValueError, IndexError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not 0 <= offset <= MAX_ROW_ID:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows = (await db.execute(stmt.order_by(*order_by).offset(offset).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    next_cursor = base64.urlsafe_b64encode(f"rank:{offset + limit}".encode()).decode().rstrip("=")
+    return rows[:limit], next_cursor
@@ -1,11 +1,15 @@
 export const API_BASE_URL = '/api';
 
+// Tenant key sent with every request (backend falls back to the "default" patient)
+export const getPatientId = (): string | null => localStorage.getItem('patient_id');
+
 export async function apiClient<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
   const url = `${API_BASE_URL}${endpoint}`;
   const response = await fetch(url, {
     ...options,
     headers: {
       'Content-Type': 'application/json',
+      ...(getPatientId() ? { 'X-Patient-Id': getPatientId() as string } : {}),
       ...options.headers,
     },
   });
@@ -22,3 +26,48 @@ export async function apiClient<T>(endpoint: string, options: RequestInit = {}):
 
   return response.json();
 }
+
+// POST that answers with Server-Sent Events (EventSource only does GET, without our headers).
+// Calls onEvent(event, parsed data) for each event as it arrives; resolves when the stream ends.
+export async function apiEventStream(
+  endpoint: string,
+  options: RequestInit,
+  onEvent: (event: string, data: any) => void,
+): Promise<void> {
+  const url = `${API_BASE_URL}${endpoint}`;
+  const response = await fetch(url, {
+    ...options,
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      ...(getPatientId() ? { 'X-Patient-Id': getPatientId() as string } : {}),
+      ...options.headers,
+    },
+  });
+
+  if (!response.ok || !response.body) {
+    const errorText = await response.text();
+    throw new Error(`API Error ${response.status}: ${errorText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    // Events are separated by a blank line; keep a trailing partial event for the next read
+    const blocks = buffer.split('\n\n');
+    buffer = done ? '' : blocks.pop() ?? '';
+    for (const block of blocks) {
+      let event = 'message';
+      const data: string[] = [];
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+      }
+      if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+    }
+    if (done) break;
+  }
+}
@@ -1,4 +1,4 @@
-import { apiClient } from './client';
+import { apiClient, apiEventStream } from './client';
 
 export interface ReportResult {
     report_markdown: string;
@@ -11,11 +11,39 @@ export interface ReportResult {
 export interface SessionHistoryItem {
    id: number;
    timestamp: string;
+   session_id: string;
+   activity_name: string;
+   duration_seconds: number | null;
+   rep_count: number | null;
+   safety_flag_count: number | null;
+   summary: string | null;
+}
+
+// Full record from /history/{id}
+export interface SessionHistoryDetail extends SessionHistoryItem {
    transcript: string;
    clinical_notes: string[];
    report_json: ReportResult;
 }
 
+// Keyset-paginated list: pass next_cursor back as ?cursor= for the next (older) page
+export interface Page<T> {
+    items: T[];
+    next_cursor: string | null;
+}
+
+// One week/month bucket from /history/trends (daily_activity rollup)
+export interface ActivityTrend {
+    period_start: string;
+    sessions: number;
+    reps: number;
+    duration_seconds: number;
+    rom_avg: number | null;
+    rom_best: number | null;
+    safety_events: number;
+    active_days: number;
+}
+
 export interface DailyPlan {
     date: string;
     routine: Array<{
@@ -50,8 +78,33 @@ export const sessionApi = {
         });
     },
 
-    getHistory: () => {
-        return apiClient<SessionHistoryItem[]>('/history');
+    // Same report as end(), streamed: onToken receives the markdown as it is generated,
+    // the promise resolves with the full payload once the backend has stored it
+    endStream: async (sessionId: string, onToken?: (text: string) => void) => {
+        let result: ReportResult | null = null;
+        await apiEventStream('/session/end/stream', {
+            method: 'POST',
+            body: JSON.stringify({ session_id: sessionId }),
+        }, (event, data) => {
+            if (event === 'token') onToken?.(data.text);
+            else if (event === 'final') result = data;
+        });
+        if (!result) throw new Error('Report stream ended without a final report');
+        return result as ReportResult;
+    },
+
+    getHistory: (cursor?: string) => {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        return apiClient<Page<SessionHistoryItem>>(`/history${query}`);
+    },
+
+    getTrends: (period: 'week' | 'month' = 'week', count = 12, domain?: string) => {
+        const query = new URLSearchParams({ period, count: String(count), ...(domain ? { domain } : {}) });
+        return apiClient<{ period: string; items: ActivityTrend[] }>(`/history/trends?${query}`);
+    },
+
+    getHistoryReport: (reportId: number) => {
+        return apiClient<SessionHistoryDetail>(`/history/${reportId}`);
     },
     
     analyze: (data: any) => {
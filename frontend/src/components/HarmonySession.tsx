@@ -1,7 +1,7 @@
 
 import { useEffect, useRef, useState } from 'react';
 import { useGeminiLive } from '../hooks/useGeminiLive';
-import { apiClient } from '../api/client';
+import { sessionApi } from '../api/session';
 import { usePoseDetection } from '../hooks/usePoseDetection';
 import { Camera } from 'lucide-react';
 import { AnimatePresence, motion } from 'framer-motion';
@@ -155,10 +155,7 @@ export function HarmonySession({ emotion, onExit }: HarmonySessionProps) {
 
         // 2. Notify Backend to Generate Report
         try {
-            await apiClient('/session/end', {
-                method: 'POST',
-                body: JSON.stringify({ session_id: sessionId })
-            });
+            await sessionApi.endStream(sessionId);
             console.log("Session Finalized Successfully");
         } catch (e) {
             console.error("Failed to finalize session:", e);
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react';
 import { AnalyticsChart } from './AnalyticsChart';
 import { apiClient } from '../api/client';
+import type { Page } from '../api/session';
 import type { SessionLog } from '../types/SessionLog';
 import { PortalModal } from './PortalModal';
 
@@ -12,6 +13,8 @@ interface HistoryViewProps {
 export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
     const [sessions, setSessions] = useState<SessionLog[]>([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [selectedSession, setSelectedSession] = useState<SessionLog | null>(null);
     
     // [NEW] Search & Filter State
@@ -20,8 +23,7 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
     const [startDate, setStartDate] = useState("");
     const [endDate, setEndDate] = useState("");
 
-    useEffect(() => {
-        setLoading(true);
+    const buildQuery = () => {
         // [FIX] Use aggregated history endpoint with filters
         const query = new URLSearchParams();
         if (searchTerm) query.append("search", searchTerm);
@@ -32,10 +34,15 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
 
         if (startDate) query.append("start_date", startDate);
         if (endDate) query.append("end_date", endDate);
+        return query;
+    };
 
-        apiClient(`/session/history?${query.toString()}`)
+    useEffect(() => {
+        setLoading(true);
+        apiClient<Page<SessionLog>>(`/session/history?${buildQuery().toString()}`)
             .then(data => {
-                setSessions(data as SessionLog[]);
+                setSessions(data.items);
+                setNextCursor(data.next_cursor);
                 setLoading(false);
             })
             .catch(err => {
@@ -44,6 +51,28 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
             });
     }, [searchTerm, domainFilter, startDate, endDate, initialDomain]); // Re-fetch on change
 
+    // List rows carry summary columns only; fetch the full report when opened
+    const openReport = (session: SessionLog) => {
+        apiClient<SessionLog>(`/session/logs/${encodeURIComponent(session.id)}`)
+            .then(setSelectedSession)
+            .catch(err => console.error("Failed to load report", err));
+    };
+
+    // Older sessions: continue from the cursor returned with the last page
+    const loadMore = () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        const query = buildQuery();
+        query.append("cursor", nextCursor);
+        apiClient<Page<SessionLog>>(`/session/history?${query.toString()}`)
+            .then(data => {
+                setSessions(prev => [...prev, ...data.items]);
+                setNextCursor(data.next_cursor);
+            })
+            .catch(err => console.error("Failed to load more history", err))
+            .finally(() => setLoadingMore(false));
+    };
+
     return (
         <div className="w-full max-w-6xl mx-auto p-4 pt-24 md:p-8 md:pt-20">
              {/* ... Header and Search code remains same ... */}
@@ -118,7 +147,7 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
                                 </div>
                                 <div>
                                     <button 
-                                        onClick={() => setSelectedSession(session)}
+                                        onClick={() => openReport(session)}
                                         className="bg-cyber-cyan/10 hover:bg-cyber-cyan/20 text-cyber-cyan border border-cyber-cyan/50 px-4 py-2 rounded text-xs font-bold uppercase tracking-widest transition-all"
                                     >
                                         View Report
@@ -128,14 +157,10 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
                             
                             <div className="grid grid-cols-2 gap-4">
                                 <div>
-                                    <h3 className="text-gray-400 text-xs uppercase mb-2">Clinical Notes</h3>
-                                    <ul className="text-sm text-gray-300 list-disc pl-4 space-y-1">
-                                        {session.report_summary?.clinical_notes?.slice(0, 3).map((note: string, i: number) => (
-                                            <li key={i}>{note}</li>
-                                        )) || (
-                                            <li className="text-gray-600 italic">No notes recorded.</li>
-                                        )}
-                                    </ul>
+                                    <h3 className="text-gray-400 text-xs uppercase mb-2">Summary</h3>
+                                    <p className="text-sm text-gray-300">
+                                        {session.summary || <span className="text-gray-600 italic">No summary recorded.</span>}
+                                    </p>
                                 </div>
                                 <div>
                                     <h3 className="text-gray-400 text-xs uppercase mb-2">Metrics</h3>
@@ -143,6 +168,11 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
                                         <span className={`px-2 py-1 rounded text-xs font-bold uppercase ${session.status === 'completed' ? 'bg-green-500/20 text-green-400' : 'bg-yellow-500/20 text-yellow-400'}`}>
                                             {session.status}
                                         </span>
+                                        <div className="mt-2 font-mono text-xs text-gray-400 space-x-3">
+                                            {session.rep_count != null && <span>{session.rep_count} reps</span>}
+                                            {session.duration_seconds != null && <span>{Math.round(session.duration_seconds / 60)} min</span>}
+                                            {!!session.safety_flag_count && <span className="text-red-400">{session.safety_flag_count} safety flags</span>}
+                                        </div>
                                     </div>
                                 </div>
                             </div>
@@ -154,6 +184,16 @@ export function HistoryView({ onBack, initialDomain }: HistoryViewProps) {
                             No sessions recorded yet. Complete a workout to see history.
                         </div>
                     )}
+
+                    {nextCursor && (
+                        <button
+                            onClick={loadMore}
+                            disabled={loadingMore}
+                            className="mx-auto bg-white/5 hover:bg-white/10 px-6 py-2 rounded-full text-sm font-mono border border-white/10 transition-colors disabled:opacity-50"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load older sessions'}
+                        </button>
+                    )}
                 </div>
             )}
 
@@ -184,8 +184,9 @@ export function SessionRunner({ config, onExit, mode = 'BODY' }: SessionRunnerPr
 
            console.log(`[SessionRunner] Finalizing Session Report: ${sessionId}`);
 
-           // Use API Client
-           const data = await sessionApi.end(sessionId);
+           // Stream the markdown into the report view as it is generated
+           setReport(null);
+           const data = await sessionApi.endStream(sessionId, (text) => setReport(prev => (prev || '') + text));
 
            let reportContent = data.report_markdown || (data as any).report;
            let charts = data.chart_config;
@@ -616,10 +616,9 @@ export function useGeminiLive({ mode, exerciseConfig, detectPose, onLandmarks, v
         };
         
         // Fire and Forget (using keepalive if possible, but standard fetch usually works for small payloads)
-        // [FIX] Use absolute path /api/session/chunk
-        fetch('/api/session/chunk', {
+        // [FIX] Through apiClient so the X-Patient-Id header is sent (telemetry is stored per patient)
+        apiClient('/session/chunk', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(payload),
                 keepalive: true // Crucial for requests during unload
         }).catch(e => console.error("Flush Error", e));
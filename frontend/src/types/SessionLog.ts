@@ -13,6 +13,12 @@ export interface SessionLog {
     timestamp: string; // ISO8601
     title: string; // Exercise Name (e.g. "Happy" or "Elbow Flexion")
     status: "started" | "completed" | "abandoned";
-    metrics: SessionMetrics;
-    report_summary?: any; // Full JSON report or summary string
+    metrics?: SessionMetrics;
+    // Summary columns (list endpoints)
+    activity_name?: string;
+    duration_seconds?: number | null;
+    rep_count?: number | null;
+    safety_flag_count?: number | null;
+    summary?: string | null;
+    report_summary?: any; // Full JSON report (detail endpoint /session/logs/{id} only)
 }